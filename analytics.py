@@ -0,0 +1,217 @@
+"""
+Expense aggregation for the /analyze page.
+
+ExpenseAggregator keeps per-month/per-category totals. It is filled either
+from raw rows, parsing each date a single time, or straight from the monthly
+rollups (rollups.py); the current month pie, year-to-date cards and yearly
+trend are derived from its buckets. Totals for arbitrary date windows come
+from the daily prefix sums (daily_index.py) or the columnar cache
+(columnar.py). Amounts and totals are integer fils (see money.py).
+Nothing here depends on Flask.
+"""
+
+import calendar
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+# Formats tried when a date string is not in one of the two shapes we store
+FALLBACK_DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y")
+
+
+@lru_cache(maxsize=8192)
+def _parse_date_string(s):
+    head = s[:10]
+    # Fast paths for YYYY-MM-DD[ HH:MM:SS] and DD-MM-YYYY / DD/MM/YYYY
+    try:
+        if head[4:5] == '-' and head[7:8] == '-':
+            return date(int(head[0:4]), int(head[5:7]), int(head[8:10]))
+        if head[2:3] in ('-', '/') and head[5:6] == head[2:3]:
+            return date(int(head[6:10]), int(head[3:5]), int(head[0:2]))
+    except ValueError:
+        pass
+
+    for fmt in FALLBACK_DATE_FORMATS:
+        try:
+            return datetime.strptime(head, fmt).date()
+        except ValueError:
+            continue
+    # Last resort: parse first token as YYYY-MM-DD
+    try:
+        return datetime.strptime(s.split(' ')[0], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def parse_expense_date(raw_date):
+    """Turn a stored expense_date (date, datetime or string) into a date, or None"""
+    if isinstance(raw_date, datetime):
+        return raw_date.date()
+    if isinstance(raw_date, date):
+        return raw_date
+    if raw_date is None:
+        return None
+    return _parse_date_string(str(raw_date))
+
+
+# Expense dates accepted from forms, imports and date shifts. Keeps the
+# per-day indexes and the monthly trend to a bounded span whatever is sent.
+EARLIEST_EXPENSE_DATE = date(1900, 1, 1)
+LATEST_EXPENSE_DATE = date(2100, 12, 31)
+
+
+def check_expense_date(day):
+    """`day`, or ValueError when it is outside EARLIEST..LATEST_EXPENSE_DATE"""
+    if not EARLIEST_EXPENSE_DATE <= day <= LATEST_EXPENSE_DATE:
+        raise ValueError(f"date {day.isoformat()} is outside {EARLIEST_EXPENSE_DATE.isoformat()}"
+                         f"..{LATEST_EXPENSE_DATE.isoformat()}")
+    return day
+
+
+def add_months(day, months):
+    """`day` moved by whole calendar months, clamped to the end of shorter months"""
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    month += 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def resolve_range(selected_range, start_date_arg, end_date_arg, today):
+    """
+    Turn the ?range= selector into (selected_range, start_date, end_date).
+    Default is year to date; numbers are calendar months back from today.
+    """
+    if selected_range is None:
+        return 'ytd', today.replace(month=1, day=1), today
+
+    try:
+        if selected_range == 'custom' and start_date_arg and end_date_arg:
+            start_date = datetime.strptime(start_date_arg, "%Y-%m-%d").date()
+            end_date = datetime.strptime(end_date_arg, "%Y-%m-%d").date()
+        elif selected_range == 'previous_year':
+            start_date = today.replace(year=today.year - 1, month=1, day=1)
+            end_date = today.replace(year=today.year - 1, month=12, day=31)
+        elif selected_range == 'ytd':
+            start_date = today.replace(month=1, day=1)
+            end_date = today
+        else:
+            # treat numeric as months (use exact calendar months)
+            months = int(selected_range)
+            start_date = add_months(today, -months)
+            end_date = today
+    except Exception:
+        start_date = today.replace(month=1, day=1)
+        end_date = today
+    return selected_range, start_date, end_date
+
+
+def parse_date_span(text):
+    """(start, end) from 'YYYY-MM-DD..YYYY-MM-DD', or None"""
+    try:
+        start, end = text.split('..')
+        return date.fromisoformat(start), date.fromisoformat(end)
+    except (AttributeError, ValueError):
+        return None
+
+
+def comparison_ranges(preset, today, window=30, count=12):
+    """
+    [(label, start_date, end_date)] for a /api/compare preset:
+    month_yoy   this month to date against the same days last year
+    ytd_yoy     year to date against the same part of last year
+    trailing    `count` consecutive `window`-day windows ending today
+    months      the last `count` calendar months (this one to date)
+    Unknown presets give [].
+    """
+    last_year = add_months(today, -12)
+    if preset == 'month_yoy':
+        return [
+            ('This month', today.replace(day=1), today),
+            ('Same period last year', last_year.replace(day=1), last_year),
+        ]
+    if preset == 'ytd_yoy':
+        return [
+            ('Year to date', today.replace(month=1, day=1), today),
+            ('Same period last year', last_year.replace(month=1, day=1), last_year),
+        ]
+    if preset == 'trailing':
+        ranges = []
+        for i in range(count):
+            end = today - timedelta(days=i * window)
+            start = end - timedelta(days=window - 1)
+            ranges.append((f"{window} days to {end.isoformat()}", start, end))
+        return ranges
+    if preset == 'months':
+        ranges = []
+        for i in range(count):
+            start = add_months(today.replace(day=1), -i)
+            end = min(today, add_months(start, 1) - timedelta(days=1))
+            ranges.append((start.strftime('%b %Y'), start, end))
+        return ranges
+    return []
+
+
+def highest(totals):
+    """Category with the largest total, or None when there is nothing"""
+    if not totals:
+        return None
+    return max(totals, key=totals.get)
+
+
+class ExpenseAggregator:
+    """Single-pass totals for one user's expenses"""
+
+    def __init__(self, today):
+        self.today = today
+        # (year, month) -> category -> total
+        self.month_category = defaultdict(lambda: defaultdict(int))
+
+    def add(self, category, amount, expense_date):
+        """Add one expense row (amount in fils); rows with an unusable date are skipped"""
+        d = parse_expense_date(expense_date)
+        if d is None:
+            return
+        self.month_category[(d.year, d.month)][category] += amount
+
+    def add_rollups(self, rows):
+        """Add pre-summed (year, month, category, total) rows from monthly_rollups"""
+        for year, month, category, total in rows:
+            self.month_category[(year, month)][category] += total
+        return self
+
+    def current_month_totals(self):
+        return dict(self.month_category.get((self.today.year, self.today.month), {}))
+
+    def year_totals(self, year=None):
+        """Per-category totals for one calendar year (default: the current one)"""
+        year = self.today.year if year is None else year
+        totals = defaultdict(int)
+        for (y, _), categories in self.month_category.items():
+            if y == year:
+                for category, amount in categories.items():
+                    totals[category] += amount
+        return dict(totals)
+
+    def totals_by_year(self):
+        totals = defaultdict(int)
+        for (y, _), categories in self.month_category.items():
+            totals[y] += sum(categories.values())
+        return dict(totals)
+
+    def monthly_series(self, max_months=None):
+        """
+        Every month from January of the first year to December of the last
+        (zeros included), as a list of (first_of_month, total) pairs. With
+        max_months only that many months up to December of the last year.
+        """
+        if not self.month_category:
+            return []
+        years = [y for y, _ in self.month_category]
+        first, end = min(years) * 12, (max(years) + 1) * 12
+        if max_months is not None:
+            first = max(first, end - max_months)
+        series = []
+        for index in range(first, end):
+            year, month = divmod(index, 12)
+            categories = self.month_category.get((year, month + 1))
+            series.append((date(year, month + 1, 1), sum(categories.values()) if categories else 0))
+        return series
@@ -1,600 +1,1210 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-import matplotlib
-matplotlib.use('Agg')  # Use non-GUI backend for executables
-import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
-from collections import defaultdict
-import os
-import sys
-import pyodbc
-import shutil
-from flask_bcrypt import Bcrypt
-
-# Configure paths for PyInstaller
-def get_base_path():
-    """Get the base path for resources (works for both dev and frozen)"""
-    if getattr(sys, 'frozen', False):
-        # Running as compiled executable
-        return sys._MEIPASS
-    else:
-        # Running as script
-        return os.path.dirname(os.path.abspath(__file__))
-
-def get_user_data_path():
-    """Get path for user data (persistent storage)"""
-    if sys.platform == 'win32':
-        # Windows: Use AppData\Local
-        base = os.path.join(os.environ.get('LOCALAPPDATA', os.path.expanduser('~')), 'ExpenseTracker')
-    else:
-        # Mac/Linux: Use home directory
-        base = os.path.join(os.path.expanduser('~'), '.expensetracker')
-    
-    if not os.path.exists(base):
-        os.makedirs(base)
-    return base
-
-def initialize_database():
-    """
-    Initialize the database for the application.
-    If running as executable, copy template database to user data folder.
-    """
-    if getattr(sys, 'frozen', False):
-        # Running as executable - use persistent user data folder
-        user_data_path = get_user_data_path()
-        db_path = os.path.join(user_data_path, 'expenses.accdb')
-        
-        # If database doesn't exist in user folder, copy template from exe
-        if not os.path.exists(db_path):
-            template_db = os.path.join(sys._MEIPASS, 'Database', 'expenses.accdb')
-            if os.path.exists(template_db):
-                print(f"First run detected. Creating database at: {db_path}")
-                shutil.copy2(template_db, db_path)
-                print("Database initialized successfully!")
-            else:
-                raise FileNotFoundError("Template database not found in executable!")
-        
-        return db_path
-    else:
-        # Running as script - use local Database folder
-        return os.path.join(os.getcwd(), 'Database', 'expenses.accdb')
-
-base_path = get_base_path()
-template_folder = os.path.join(base_path, 'templates')
-static_folder = os.path.join(base_path, 'static')
-
-app = Flask(__name__, template_folder=template_folder, static_folder=static_folder)
-app.secret_key = 'your_secret_key_change_in_production'  # CHANGE THIS IN PRODUCTION
-bcrypt = Bcrypt(app)
-
-# Initialize database path
-DB_PATH = initialize_database()
-
-# Function to connect to the Access database
-def get_db_connection():
-    db_password = 'password'  # Replace with the actual password
-    conn_str = (
-        r"DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};"
-        f"DBQ={DB_PATH};"
-        f"PWD={db_password};"
-    )
-    return pyodbc.connect(conn_str)
-
-# Function to check if a user is logged in
-def is_logged_in():
-    return 'user_id' in session
-
-# Middleware to restrict access to logged-in users
-@app.before_request
-def restrict_access():
-    allowed_routes = ['login', 'signup', 'static']  # Allow login, signup, and static files
-    if not is_logged_in() and request.endpoint not in allowed_routes:
-        return redirect(url_for('login'))
-
-# Route for sign-up
-@app.route('/signup', methods=['GET', 'POST'])
-def signup():
-    if request.method == 'POST':
-        username = request.form['username']
-        password = request.form['password']
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        try:
-            # Insert new user into the database
-            cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed_password))
-            conn.commit()
-            conn.close()
-
-            flash("Account created successfully! Please log in.", "success")
-            return redirect(url_for('login'))
-        except pyodbc.IntegrityError:
-            # Handle duplicate username error
-            flash("Username entered already exists, please choose another one.", "danger")
-            conn.close()
-            return redirect(url_for('signup'))
-
-    return render_template('signup.html')
-
-# Route for login
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        username = request.form['username']
-        password = request.form['password']
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Fetch user from the database
-        cursor.execute("SELECT id, password FROM users WHERE username = ?", (username,))
-        user = cursor.fetchone()
-        conn.close()
-
-        if user and bcrypt.check_password_hash(user[1], password):
-            session['user_id'] = user[0]
-            session['username'] = username
-            flash("Logged in successfully!", "success")
-            return redirect(url_for('index'))
-        else:
-            flash("Invalid username or password.", "danger")
-
-    return render_template('login.html')
-
-# Route for logout
-@app.route('/logout')
-def logout():
-    session.clear()
-    flash("You have been logged out.", "info")
-    return redirect(url_for('login'))
-
-# Route to add expense
-@app.route('/add', methods=['GET', 'POST'])
-def add_expense():
-    if not is_logged_in():
-        flash("Please log in to add expenses.", "warning")
-        return redirect(url_for('login'))
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Fetch existing categories for the dropdown
-    cursor.execute("SELECT DISTINCT category FROM expenses WHERE user_id = ?", (session['user_id'],))
-    categories = [row[0] for row in cursor.fetchall()]
-
-    if request.method == 'POST':
-        raw_date = request.form['date']
-        try:
-            date_obj = datetime.strptime(raw_date, "%Y-%m-%d")
-            date = date_obj.strftime("%d-%m-%Y")
-        except ValueError:
-            date = raw_date
-
-        selected_category = request.form['category']
-        new_category = request.form.get('new_category', '').strip()
-        amount = request.form['amount']
-        rounded_amount = round(float(amount), 3)
-
-        # Use the new category if provided
-        category = new_category if selected_category == 'add_new' else selected_category
-
-        # Insert the expense into the database
-        cursor.execute(
-            "INSERT INTO expenses (expense_date, category, amount, user_id) VALUES (?, ?, ?, ?)",
-            (date, category, rounded_amount, session['user_id'])
-        )
-        conn.commit()
-        conn.close()
-
-        flash("Expense added successfully!", "success")
-        return redirect(url_for('view_expenses'))
-
-    conn.close()
-    return render_template('add.html', categories=categories)
-
-# Route to view expenses
-@app.route('/view')
-def view_expenses():
-    if not is_logged_in():
-        flash("Please log in to view expenses.", "warning")
-        return redirect(url_for('login'))
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Fetch all expenses for the logged-in user
-    cursor.execute("SELECT id, expense_date, category, amount FROM expenses WHERE user_id = ?", (session['user_id'],))
-    rows = cursor.fetchall()
-
-    expenses = []
-    for row in rows:
-        raw_date = row[1]
-        # Normalize date: if it's a datetime object, or a string containing time, format to date-only string
-        try:
-            if isinstance(raw_date, datetime):
-                date_str = raw_date.strftime("%d-%m-%Y")
-            else:
-                # Attempt to parse common datetime string formats and fall back to splitting
-                raw_date_str = str(raw_date)
-                try:
-                    parsed = datetime.strptime(raw_date_str, "%Y-%m-%d %H:%M:%S")
-                    date_str = parsed.strftime("%d-%m-%Y")
-                except Exception:
-                    # If it looks like YYYY-MM-DD, reformat; otherwise take up to first space (drop time)
-                    if len(raw_date_str) >= 10 and raw_date_str[4] == '-' and raw_date_str[7] == '-':
-                        try:
-                            parsed = datetime.strptime(raw_date_str[:10], "%Y-%m-%d")
-                            date_str = parsed.strftime("%d-%m-%Y")
-                        except Exception:
-                            date_str = raw_date_str.split(' ')[0]
-                    else:
-                        date_str = raw_date_str.split(' ')[0]
-        except Exception:
-            date_str = str(raw_date)
-
-        # Format amount to always show 3 decimal places
-        raw_amount = row[3]
-        try:
-            amount_val = float(raw_amount)
-            amount_str = f"{amount_val:.3f}"
-        except Exception:
-            amount_str = str(raw_amount)
-
-        expenses.append({'id': row[0], 'date': date_str, 'category': row[2], 'amount': amount_str})
-
-    conn.close()
-    return render_template('view.html', expenses=expenses)
-
-# Route to analyze expenses
-@app.route('/analyze')
-def analyze_expenses():
-    if not is_logged_in():
-        flash("Please log in to analyze expenses.", "warning")
-        return redirect(url_for('login'))
-
-    # Determine selected range from query params
-    selected_range = request.args.get('range')  # None means default behavior (year-to-date)
-    start_date_arg = request.args.get('start_date')
-    end_date_arg = request.args.get('end_date')
-
-    today = datetime.now().date()
-
-    # Compute current month window for pie chart and current-month stats
-    first_of_month = today.replace(day=1)
-    # compute last day of month by moving to next month and subtracting a day
-    try:
-        if first_of_month.month == 12:
-            next_month = first_of_month.replace(year=first_of_month.year + 1, month=1, day=1)
-        else:
-            next_month = first_of_month.replace(month=first_of_month.month + 1, day=1)
-        last_of_month = next_month - timedelta(days=1)
-    except Exception:
-        last_of_month = today
-
-    # Fetch all user's expenses to compute both current month pie and selected range bar chart
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT category, amount, expense_date FROM expenses WHERE user_id = ?", (session['user_id'],))
-    rows = cursor.fetchall()
-    conn.close()
-
-    # Helper to parse dates robustly
-    def parse_date(raw_date):
-        try:
-            if isinstance(raw_date, datetime):
-                return raw_date.date()
-            s = str(raw_date)
-            # Try common formats first
-            for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y"):
-                try:
-                    return datetime.strptime(s[:10], fmt if '%H' not in fmt else fmt).date()
-                except Exception:
-                    continue
-            # Last resort: parse first token as YYYY-MM-DD
-            try:
-                return datetime.strptime(s.split(' ')[0], "%Y-%m-%d").date()
-            except Exception:
-                return None
-        except Exception:
-            return None
-
-    # Aggregate current month totals for pie and top category
-    current_month_totals = defaultdict(float)
-    for row in rows:
-        cat = row[0]
-        try:
-            amt = float(row[1])
-        except Exception:
-            continue
-        d = parse_date(row[2])
-        if d and first_of_month <= d <= last_of_month:
-            current_month_totals[cat] += amt
-
-    # Generate pie chart for current month only
-    pie_categories = list(current_month_totals.keys())
-    pie_amounts = [current_month_totals[c] for c in pie_categories]
-
-    # Determine selected range window for bar chart
-    # Default: Year to date (resets each year automatically)
-    if selected_range is None:
-        # Year to date
-        start_date = today.replace(month=1, day=1)
-        end_date = today
-        selected_range = 'ytd'
-    else:
-        try:
-            if selected_range == 'custom' and start_date_arg and end_date_arg:
-                start_date = datetime.strptime(start_date_arg, "%Y-%m-%d").date()
-                end_date = datetime.strptime(end_date_arg, "%Y-%m-%d").date()
-            elif selected_range == 'previous_year':
-                start_date = today.replace(year=today.year - 1, month=1, day=1)
-                end_date = today.replace(year=today.year - 1, month=12, day=31)
-            elif selected_range == 'ytd':
-                start_date = today.replace(month=1, day=1)
-                end_date = today
-            else:
-                # treat numeric as months (use exact calendar months)
-                months = int(selected_range)
-                start_date = today - relativedelta(months=months)
-                end_date = today
-        except Exception:
-            start_date = today.replace(month=1, day=1)
-            end_date = today
-
-    # Aggregate totals for bar chart range
-    totals = defaultdict(float)
-    for row in rows:
-        cat = row[0]
-        try:
-            amt = float(row[1])
-        except Exception:
-            continue
-        d = parse_date(row[2])
-        if d and start_date <= d <= end_date:
-            totals[cat] += amt
-
-    bar_categories = list(totals.keys())
-    bar_amounts = [totals[c] for c in bar_categories]
-
-    # Ensure static folder exists for charts
-    if getattr(sys, 'frozen', False):
-        static_path = os.path.join(get_user_data_path(), 'static')
-    else:
-        static_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
-    if not os.path.exists(static_path):
-        os.makedirs(static_path)
-
-    pie_file = None
-    bar_chart_file = None
-
-    if pie_categories and sum(pie_amounts) > 0:
-        plt.figure(figsize=(6, 6))
-        plt.pie(pie_amounts, labels=pie_categories, autopct='%1.1f%%', startangle=140, textprops={'color': 'white'})
-        plt.title('Current Month Breakdown', color='white')
-        plt.gca().set_facecolor('#121212')
-        plt.gcf().set_facecolor('#121212')
-        pie_file = os.path.join(static_path, 'chart.png')
-        plt.savefig(pie_file, dpi=300, bbox_inches='tight')
-        plt.close()
-
-    if bar_categories and sum(bar_amounts) > 0:
-        plt.figure(figsize=(8, 5))
-        plt.bar(bar_categories, bar_amounts, color='skyblue')
-        plt.title('Selected Period Spending', color='white')
-        plt.xlabel('Category', color='white')
-        plt.ylabel('Amount', color='white')
-        plt.gca().set_facecolor('#121212')
-        plt.gcf().set_facecolor('#121212')
-        plt.xticks(color='white')
-        plt.yticks(color='white')
-        bar_chart_file = os.path.join(static_path, 'bar_chart.png')
-        plt.savefig(bar_chart_file, dpi=300, bbox_inches='tight')
-        plt.close()
-
-    # Compute year-to-date totals (current calendar year)
-    year_totals = defaultdict(float)
-    totals_by_year = defaultdict(float)
-    for row in rows:
-        cat = row[0]
-        try:
-            amt = float(row[1])
-        except Exception:
-            continue
-        d = parse_date(row[2])
-        if not d:
-            continue
-        totals_by_year[d.year] += amt
-        if d.year == today.year:
-            year_totals[cat] += amt
-
-    year_categories = list(year_totals.keys())
-    year_amounts = [year_totals[c] for c in year_categories]
-    year_total = sum(year_amounts)
-    year_highest = None
-    if year_categories:
-        year_highest = max(year_categories, key=lambda c: year_amounts[year_categories.index(c)])
-
-    # If we have more than one year of data, generate a monthly trend line chart
-    # that includes every month in the range (zeros included) so fluctuations are visible.
-    yearly_trend_file = None
-    if len(totals_by_year) > 1:
-        # Build month-level totals keyed by the first day of the month
-        month_totals = defaultdict(float)
-        min_year = min(totals_by_year.keys())
-        max_year = max(totals_by_year.keys())
-
-        # Use start = Jan of min_year, end = Dec of max_year (show full years)
-        start_month = datetime(min_year, 1, 1).date()
-        end_month = datetime(max_year, 12, 1).date()
-
-        # Initialize months list (every month between start and end inclusive)
-        months = []
-        cur = start_month
-        while cur <= end_month:
-            months.append(cur)
-            cur = (cur + relativedelta(months=1))
-
-        # Aggregate amounts into months
-        for row in rows:
-            try:
-                amt = float(row[1])
-            except Exception:
-                continue
-            d = parse_date(row[2])
-            if not d:
-                continue
-            m_first = d.replace(day=1)
-            month_totals[m_first] += amt
-
-        month_vals = [month_totals.get(m, 0.0) for m in months]
-        labels = [m.strftime('%b %Y') for m in months]
-
-        plt.figure(figsize=(12, 4))
-        plt.plot(range(len(months)), month_vals, marker='o', color='skyblue')
-        plt.title('Monthly Spending Trend', color='white')
-        plt.xlabel('Month', color='white')
-        plt.ylabel('Total Spend', color='white')
-        plt.gca().set_facecolor('#121212')
-        plt.gcf().set_facecolor('#121212')
-        # Show every month label (rotate for readability)
-        plt.xticks(range(len(months)), labels, rotation=45, color='white')
-        plt.yticks(color='white')
-        yearly_trend_file = os.path.join(static_path, 'yearly_trend.png')
-        plt.tight_layout()
-        plt.savefig(yearly_trend_file, dpi=300, bbox_inches='tight')
-        plt.close()
-
-    # Compute current month totals and highest category
-    current_month_total = sum(pie_amounts)
-    current_month_highest = None
-    if pie_categories:
-        current_month_highest = max(pie_categories, key=lambda c: pie_amounts[pie_categories.index(c)])
-
-    display_start = start_date.strftime("%d-%m-%Y")
-    display_end = end_date.strftime("%d-%m-%Y")
-
-    return render_template(
-        'analyze.html',
-        chart=os.path.basename(pie_file) if pie_file else None,
-        bar_chart=os.path.basename(bar_chart_file) if bar_chart_file else None,
-        total_period=sum(bar_amounts),
-        highest_period=max(bar_categories, key=lambda c: bar_amounts[bar_categories.index(c)]) if bar_categories else None,
-        start_date=display_start,
-        end_date=display_end,
-        selected_range=selected_range,
-        current_month_total=current_month_total,
-        current_month_highest=current_month_highest,
-        year_total=year_total,
-        year_highest=year_highest,
-        yearly_trend=os.path.basename(yearly_trend_file) if yearly_trend_file else None
-    )
-
-# Route to serve chart images when running as executable
-@app.route('/static/<path:filename>')
-def serve_static(filename):
-    if getattr(sys, 'frozen', False):
-        # When running as executable, serve from user data folder
-        static_path = os.path.join(get_user_data_path(), 'static')
-        from flask import send_from_directory
-        return send_from_directory(static_path, filename)
-    else:
-        # When running as script, use default Flask static handling
-        return app.send_static_file(filename)
-
-# Route to edit expense
-@app.route('/edit/<int:expense_id>', methods=['GET', 'POST'])
-def edit_expense(expense_id):
-    if not is_logged_in():
-        flash("Please log in to edit expenses.", "warning")
-        return redirect(url_for('login'))
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Fetch the expense to edit
-    cursor.execute("SELECT expense_date, category, amount FROM expenses WHERE id = ? AND user_id = ?", (expense_id, session['user_id']))
-    expense = cursor.fetchone()
-
-    if not expense:
-        conn.close()
-        flash("Expense not found.", "danger")
-        return redirect(url_for('view_expenses'))
-
-    if request.method == 'POST':
-        date = request.form['date']
-        category = request.form['category']
-        amount = request.form['amount']
-
-        # Normalize and format date like add_expense (store as DD-MM-YYYY when possible)
-        try:
-            date_obj = datetime.strptime(date, "%Y-%m-%d")
-            date_to_store = date_obj.strftime("%d-%m-%Y")
-        except Exception:
-            date_to_store = date
-
-        # Round amount to 3 decimal places before storing
-        try:
-            amount_to_store = round(float(amount), 3)
-        except Exception:
-            amount_to_store = amount
-
-        # Update the expense in the database
-        cursor.execute(
-            "UPDATE expenses SET expense_date = ?, category = ?, amount = ? WHERE id = ? AND user_id = ?",
-            (date_to_store, category, amount_to_store, expense_id, session['user_id'])
-        )
-        conn.commit()
-        conn.close()
-
-        flash("Expense updated successfully!", "success")
-        return redirect(url_for('view_expenses'))
-
-    conn.close()
-    return render_template('edit.html', expense=expense)
-
-# Route to delete expense
-@app.route('/delete/<int:expense_id>', methods=['DELETE'])
-def delete_expense(expense_id):
-    if not is_logged_in():
-        return {"error": "Unauthorized"}, 401
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Delete the expense from the database
-    cursor.execute("DELETE FROM expenses WHERE id = ? AND user_id = ?", (expense_id, session['user_id']))
-    conn.commit()
-    conn.close()
-
-    return {"success": True}, 200
-
-# Home page
-@app.route('/')
-def index():
-    return render_template('index.html')
-
-if __name__ == '__main__':
-    # For executable, you might want to automatically open the browser
-    if getattr(sys, 'frozen', False):
-        import webbrowser
-        import threading
-        
-        def open_browser():
-            import time
-            time.sleep(1.5)
-            webbrowser.open('http://127.0.0.1:5000')
-        
-        threading.Thread(target=open_browser).start()
-    
-    print("=" * 60)
-    print("Expense Tracker Starting...")
-    print("=" * 60)
-    if getattr(sys, 'frozen', False):
-        print(f"Database location: {DB_PATH}")
-        print(f"Your data is safely stored at: {get_user_data_path()}")
-    print("Open your browser and navigate to: http://127.0.0.1:5000")
-    print("Press Ctrl+C to stop the server")
-    print("=" * 60)
-    
+from flask import Flask, render_template, request, redirect, url_for, session, flash, g, jsonify, Response, stream_with_context, has_request_context
+from datetime import datetime
+import atexit
+import functools
+import io
+import os
+import sys
+import threading
+import storage
+import pool
+import analytics
+import commands
+import ledger
+import rollups
+import charts
+import chart_cache
+import render_worker
+import pagination
+import importer
+import export
+import hashing
+import category_index
+import daily_index
+import data_versions
+import metrics
+import money
+import sharding
+import write_behind
+
+# Configure paths for PyInstaller
+def get_base_path():
+    """Get the base path for resources (works for both dev and frozen)"""
+    if getattr(sys, 'frozen', False):
+        # Running as compiled executable
+        return sys._MEIPASS
+    else:
+        # Running as script
+        return os.path.dirname(os.path.abspath(__file__))
+
+def get_user_data_path():
+    """Get path for user data (persistent storage)"""
+    if sys.platform == 'win32':
+        # Windows: Use AppData\Local
+        base = os.path.join(os.environ.get('LOCALAPPDATA', os.path.expanduser('~')), 'ExpenseTracker')
+    else:
+        # Mac/Linux: Use home directory
+        base = os.path.join(os.path.expanduser('~'), '.expensetracker')
+    
+    if not os.path.exists(base):
+        os.makedirs(base)
+    return base
+
+def create_database_backend():
+    """
+    Pick the storage backend (EXPENSE_DB_BACKEND=sqlite|access, EXPENSE_DB_PATH to
+    override the file). Nothing is opened yet; see initialize_database().
+    If running as executable, the database lives in the user data folder.
+    """
+    backend_name = os.environ.get('EXPENSE_DB_BACKEND', storage.DEFAULT_BACKEND)
+    if getattr(sys, 'frozen', False):
+        # Running as executable - use persistent user data folder
+        data_dir = get_user_data_path()
+        template_dir = os.path.join(sys._MEIPASS, 'Database')
+    else:
+        # Running as script - use local Database folder
+        data_dir = os.path.join(os.getcwd(), 'Database')
+        template_dir = None
+
+    return storage.create_backend(
+        backend_name,
+        data_dir,
+        db_path=os.environ.get('EXPENSE_DB_PATH'),
+        template_dir=template_dir,
+    )
+
+def initialize_database(backend):
+    """Make sure the backend's database file and schema exist and are up to date"""
+    backend.initialize()
+
+    conn = backend.connect()
+    try:
+        # Amounts used to be floating point dinars; the rollups are rebuilt below
+        if not backend.has_integer_amounts(conn):
+            print("Converting expense amounts to integer fils...")
+            backend.migrate_amounts_to_fils(conn)
+        if not backend.has_native_dates(conn):
+            print("Warning: expense dates are still stored as text.")
+            print("Run 'flask --app app migrate-dates' to convert them to a DATE column.")
+        # Databases created before the rollup table existed get it filled once
+        if rollups.needs_rebuild(conn.cursor()):
+            print("Building monthly rollups from existing expenses...")
+            rollups.rebuild(conn)
+        if daily_index.needs_rebuild(conn.cursor()):
+            print("Building daily totals from existing expenses...")
+            daily_index.rebuild(conn)
+        if category_index.needs_rebuild(conn.cursor()):
+            print("Counting categories of existing expenses...")
+            category_index.rebuild(conn)
+    finally:
+        conn.close()
+
+base_path = get_base_path()
+template_folder = os.path.join(base_path, 'templates')
+static_folder = os.path.join(base_path, 'static')
+
+app = Flask(__name__, template_folder=template_folder, static_folder=static_folder)
+app.secret_key = 'your_secret_key_change_in_production'  # CHANGE THIS IN PRODUCTION
+
+# Database backend (SQLite or Access, see storage.py). The schema is created on
+# the first request rather than at import, so starting the app stays quick.
+db_backend = create_database_backend()
+DB_PATH = db_backend.db_path
+_db_ready = False
+_db_ready_lock = threading.Lock()
+
+def ensure_database():
+    global _db_ready
+    if _db_ready:
+        return
+    with _db_ready_lock:
+        if not _db_ready:
+            initialize_database(db_backend)
+            conn = db_backend.connect()
+            try:
+                if app.config['SHARDS']:
+                    sharding.pin_existing_users(conn)
+                elif sharding.stranded_users(conn.cursor()):
+                    print("Warning: some users' expenses are in shard databases, which EXPENSE_SHARDS=0 does not read.")
+                    print("Start with EXPENSE_SHARDS set and run 'flask --app app rebalance-shards --home' first.")
+            finally:
+                conn.close()
+            _db_ready = True
+
+# Optional sharding of users' expenses over several database files (see
+# sharding.py): EXPENSE_SHARDS=N or 'user'; 0 keeps everything in DB_PATH
+app.config['SHARDS'] = sharding.parse_mode(os.environ.get('EXPENSE_SHARDS'))
+app.config['SHARD_POOL_SIZE'] = int(os.environ.get('EXPENSE_SHARD_POOL_SIZE', 3))
+app.config['SHARD_MAX_OPEN'] = int(os.environ.get('EXPENSE_SHARD_MAX_OPEN', 64))
+# Seconds a user's shard is trusted without a directory lookup
+app.config['SHARD_CACHE_TTL'] = float(os.environ.get('EXPENSE_SHARD_CACHE_TTL', 2))
+
+# Per-phase request timings (Server-Timing header and /metrics, see metrics.py).
+# EXPENSE_SLOW_REQUEST_MS > 0 also samples the stacks of requests slower than that.
+app.config['METRICS'] = os.environ.get('EXPENSE_METRICS', '1') != '0'
+app.config['SLOW_REQUEST_MS'] = float(os.environ.get('EXPENSE_SLOW_REQUEST_MS', 0))
+app.config['PROFILE_INTERVAL_MS'] = float(os.environ.get('EXPENSE_PROFILE_INTERVAL_MS', 5))
+slow_request_profiler = None
+if app.config['METRICS']:
+    if app.config['SLOW_REQUEST_MS'] > 0:
+        slow_request_profiler = metrics.SlowRequestProfiler(
+            app.config['SLOW_REQUEST_MS'] / 1000,
+            interval=app.config['PROFILE_INTERVAL_MS'] / 1000,
+            logger=app.logger,
+        )
+    metrics.init_app(app, slow_request_profiler)
+
+# Password hashing runs on a bounded bcrypt worker pool (see hashing.py).
+# Changing EXPENSE_BCRYPT_ROUNDS rehashes each account on its next login.
+# Each hash parks its request thread until it is done, so the hashes in flight
+# (workers + queue) are kept below the server's thread count
+# (EXPENSE_SERVER_THREADS, as in serve.py): by default half of the threads
+# may wait on bcrypt and the rest keep serving every other route.
+app.config['BCRYPT_ROUNDS'] = int(os.environ.get('EXPENSE_BCRYPT_ROUNDS', 12))
+app.config['SERVER_THREADS'] = int(os.environ.get('EXPENSE_SERVER_THREADS', 8))
+_hash_threads = max(app.config['SERVER_THREADS'] - 1, 1)
+app.config['HASH_WORKERS'] = min(int(os.environ.get('EXPENSE_HASH_WORKERS', 2)), _hash_threads)
+app.config['HASH_QUEUE'] = min(
+    int(os.environ.get('EXPENSE_HASH_QUEUE', max(app.config['SERVER_THREADS'] // 2 - app.config['HASH_WORKERS'], 0))),
+    _hash_threads - app.config['HASH_WORKERS'],
+)
+
+password_hasher = hashing.PasswordHasher(
+    rounds=app.config['BCRYPT_ROUNDS'],
+    workers=app.config['HASH_WORKERS'],
+    max_queue=app.config['HASH_QUEUE'],
+)
+
+# Connection pool settings (override with environment variables)
+app.config['DB_POOL_SIZE'] = int(os.environ.get('EXPENSE_DB_POOL_SIZE', 5))
+app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('EXPENSE_DB_POOL_TIMEOUT', 10))
+
+db_pool = pool.ConnectionPool(
+    db_backend.connect,
+    size=app.config['DB_POOL_SIZE'],
+    timeout=app.config['DB_POOL_TIMEOUT'],
+    health_check=db_backend.ping,
+)
+
+shard_router = None
+if app.config['SHARDS']:
+    shard_router = sharding.ShardRouter(
+        db_backend, db_pool, app.config['SHARDS'], initialize_database,
+        pool_size=app.config['SHARD_POOL_SIZE'],
+        pool_timeout=app.config['DB_POOL_TIMEOUT'],
+        max_open=app.config['SHARD_MAX_OPEN'],
+        cache_ttl=app.config['SHARD_CACHE_TTL'],
+    )
+
+# Maintenance commands (flask --app app migrate-dates)
+commands.register_commands(app, db_backend, ensure_database, router=shard_router)
+
+# Routes that work on the users table rather than the logged-in user's expenses
+DIRECTORY_ENDPOINTS = ['login', 'signup']
+
+# Pool of the database holding the current user's expenses
+def route_db_pool():
+    if shard_router is None or not has_request_context() or request.endpoint in DIRECTORY_ENDPOINTS:
+        return db_pool
+    return shard_router.pool_for(session.get('user_id'))
+
+# Function to get the database connection for the current request.
+# The first call checks a connection out of the pool; it is returned on teardown.
+# With metrics on, the request sees it through a wrapper timing every query.
+def get_db_connection():
+    if 'db_conn' not in g:
+        with metrics.phase('db_connect'):
+            ensure_database()
+            g.db_pool = route_db_pool()
+            g.db_conn = g.db_pool.acquire()
+        g.db_timed = metrics.TimedConnection(g.db_conn) if app.config['METRICS'] else g.db_conn
+    return g.db_timed
+
+# Also called directly by views that are done with the database early
+@app.teardown_appcontext
+def release_db_connection(exception):
+    g.pop('db_timed', None)
+    conn = g.pop('db_conn', None)
+    conn_pool = g.pop('db_pool', db_pool)
+    if conn is not None:
+        conn_pool.release(conn)
+
+# All connections busy for longer than DB_POOL_TIMEOUT
+@app.errorhandler(pool.PoolTimeout)
+def handle_pool_timeout(error):
+    return "The server is busy, please try again shortly.", 503
+
+# A write routed to the shard a user was being moved out of; the retry goes to the new one
+@app.errorhandler(data_versions.UserMoved)
+def handle_user_moved(error):
+    if shard_router is not None and 'user_id' in session:
+        shard_router.forget(session['user_id'])
+    return "The server is busy, please try again shortly.", 503, {'Retry-After': '1'}
+
+# Write-behind queue full, or a queued insert not committed in time (and
+# withdrawn, so retrying cannot store it twice)
+@app.errorhandler(write_behind.WriteBehindBusy)
+def handle_write_behind_busy(error):
+    return "The server is busy, please try again shortly.", 503, {'Retry-After': '1'}
+
+# A queued insert already being written when its wait ran out: it may still be
+# saved, so the client is told not to send it again
+@app.errorhandler(write_behind.WriteBehindPending)
+def handle_write_behind_pending(error):
+    return "Your expense was accepted and is still being saved; check your expenses before adding it again.", 202
+
+# Too many logins/signups already waiting for a bcrypt worker
+@app.errorhandler(hashing.HashingBusy)
+def handle_hashing_busy(error):
+    return "The server is busy, please try again shortly.", 503, {'Retry-After': '1'}
+
+# Folder charts are written to (the bundled static folder is read-only when frozen)
+def get_chart_static_path():
+    if getattr(sys, 'frozen', False):
+        return os.path.join(get_user_data_path(), 'static')
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+# Rendered chart cache, bounded by EXPENSE_CHART_CACHE_MB (see chart_cache.py)
+CHART_CACHE_DIR = 'charts'
+app.config['CHART_CACHE_MB'] = int(os.environ.get('EXPENSE_CHART_CACHE_MB', 100))
+chart_store = chart_cache.ChartCache(
+    os.path.join(get_chart_static_path(), CHART_CACHE_DIR),
+    max_bytes=app.config['CHART_CACHE_MB'] * 1024 * 1024,
+)
+
+# Charts missing from the cache are rendered by EXPENSE_RENDER_WORKERS background
+# processes (0 renders inline on the request thread)
+app.config['RENDER_WORKERS'] = int(os.environ.get('EXPENSE_RENDER_WORKERS', 2))
+render_queue = render_worker.RenderQueue(chart_store, workers=app.config['RENDER_WORKERS'],
+                                         on_render=metrics.registry.record_render)
+
+# Cached chart filename or None once queued; inline renders count towards the 'charts' phase.
+# Jobs belong to the logged-in user, whose /analyze ETag changes once one is forgotten
+def request_chart(key, render, *args):
+    with metrics.phase('charts'):
+        return render_queue.request(key, render, *args, owner=session.get('user_id'))
+
+# Template reference for a chart: its URL once rendered, otherwise the key to poll
+def chart_ref(key, name):
+    src = url_for('static', filename=f"{CHART_CACHE_DIR}/{name}") if name else None
+    return {'key': key, 'src': src}
+
+# Chart images: EXPENSE_CHART_FORMAT=auto sends SVG or WebP to clients that list
+# it in Accept and PNG to the rest; png, webp or svg pick one for everybody, and
+# ?format= overrides either. /analyze shows EXPENSE_CHART_THUMB_DPI thumbnails
+# that open the EXPENSE_CHART_DPI rendering when clicked.
+app.config['CHART_FORMAT'] = os.environ.get('EXPENSE_CHART_FORMAT', 'auto')
+app.config['CHART_DPI'] = int(os.environ.get('EXPENSE_CHART_DPI', 300))
+app.config['CHART_THUMB_DPI'] = int(os.environ.get('EXPENSE_CHART_THUMB_DPI', 100))
+
+def chart_format():
+    """Image format for this request's charts"""
+    fmt = request.args.get('format') or app.config['CHART_FORMAT']
+    if fmt == 'auto':
+        # Only types the client names itself count: */* says nothing about WebP
+        listed = {value for value, _ in request.accept_mimetypes}
+        fmt = next((f for f in ('svg', 'webp') if charts.FORMATS[f] in listed), 'png')
+    return fmt if fmt in charts.available_formats() else 'png'
+
+# Thumbnail and full-size references for chart `key`. Only the thumbnail is
+# queued for rendering; the full-size image is drawn the first time its link
+# is opened (see serve_static), which most page views never do.
+def chart_refs(key, render, *args):
+    fmt = chart_format()
+    thumb_key = chart_cache.variant_name(key, fmt, app.config['CHART_THUMB_DPI'])
+    full_key = chart_cache.variant_name(key, fmt, app.config['CHART_DPI'])
+    thumb = chart_ref(thumb_key, request_chart(thumb_key, render, *args, app.config['CHART_THUMB_DPI']))
+    if full_key == thumb_key:
+        return thumb | {'full_key': thumb_key, 'full': thumb['src']}
+    render_queue.remember(full_key, render, *args, app.config['CHART_DPI'], owner=session.get('user_id'))
+    return thumb | {'full_key': full_key, 'full': url_for('static', filename=f"{CHART_CACHE_DIR}/{full_key}")}
+
+# Months shown at most by the yearly trend chart (/analyze and /api/analyze)
+app.config['TREND_MONTHS'] = int(os.environ.get('EXPENSE_TREND_MONTHS', 120))
+
+# Rows per page on /view and /api/expenses
+app.config['VIEW_PAGE_SIZE'] = int(os.environ.get('EXPENSE_VIEW_PAGE_SIZE', 50))
+
+# Per-user category lists for the dropdowns, dropped on every local write.
+# The TTL bounds how long writes from other processes (CLI import) go unseen.
+app.config['CATEGORY_CACHE_TTL'] = float(os.environ.get('EXPENSE_CATEGORY_CACHE_TTL', 300))
+category_cache = category_index.CategoryCache(ttl=app.config['CATEGORY_CACHE_TTL'])
+
+# In-memory prefix sums of each user's daily totals (see daily_index.py), for
+# range totals on /analyze and /api/compare; users and megabytes kept before
+# LRU eviction
+app.config['DAILY_INDEX_USERS'] = int(os.environ.get('EXPENSE_DAILY_INDEX_USERS', 256))
+app.config['DAILY_INDEX_MB'] = int(os.environ.get('EXPENSE_DAILY_INDEX_MB', 32))
+prefix_index = daily_index.PrefixIndex(max_users=app.config['DAILY_INDEX_USERS'],
+                                       max_bytes=app.config['DAILY_INDEX_MB'] * 1024 * 1024)
+
+# Optional NumPy columnar copy of each user's expenses for /analyze
+# (see columnar.py); 0 disables it
+app.config['COLUMNAR_CACHE_MB'] = int(os.environ.get('EXPENSE_COLUMNAR_CACHE_MB', 64))
+_columnar_store = None
+_columnar_lock = threading.Lock()
+
+def get_columnar_store():
+    """The columnar cache, or None when it is disabled or NumPy is not installed"""
+    global _columnar_store
+    if _columnar_store is None and app.config['COLUMNAR_CACHE_MB'] > 0:
+        with _columnar_lock:
+            if _columnar_store is None:
+                try:
+                    import columnar
+                except ImportError:
+                    app.config['COLUMNAR_CACHE_MB'] = 0
+                    return None
+                _columnar_store = columnar.ColumnarStore(max_bytes=app.config['COLUMNAR_CACHE_MB'] * 1024 * 1024)
+    return _columnar_store
+
+# Bring the in-process caches in line with a committed expense write.
+# removed/added are (expense_date, category, amount) rows and version the
+# user's data version read inside the write's transaction; bulk writes
+# (imports) just drop the user's cached columns
+def expenses_changed(user_id, removed=(), added=(), bulk=False, version=None):
+    category_cache.invalidate(user_id)
+    if _columnar_store is not None:
+        if bulk or version is None:
+            _columnar_store.invalidate(user_id)
+        else:
+            _columnar_store.apply(user_id, version, removed, added)
+
+# Categories of the logged-in user, most used first
+def get_user_categories():
+    user_id = session['user_id']
+    return category_cache.get(user_id, lambda: category_index.fetch(get_db_connection().cursor(), user_id))
+
+# Conditional GETs: pages and JSON built from the user's expenses carry an ETag
+# of their data version (see data_versions.py), the endpoint, the query string
+# and the day (the default ranges move with it). Started-up-at is mixed in so
+# a new release never answers 304 with pages rendered by the old templates.
+ETAG_SALT = datetime.now().isoformat()
+
+def data_etag(*parts):
+    user_id = session['user_id']
+    version = data_versions.fetch(get_db_connection().cursor(), user_id)
+    return data_versions.etag(
+        user_id, version, request.endpoint, sorted(request.args.items(multi=True)),
+        datetime.now().date(), ETAG_SALT, *parts
+    )
+
+def conditional_on_data(view=None, vary=(), parts=None):
+    """
+    Answer If-None-Match with 304 while the user's data version is unchanged.
+    Views can set g.no_etag for responses that must not be reused
+    (an /analyze page still waiting for its charts).
+
+    vary: request headers the response depends on; their values go into the
+          ETag and they are listed in Vary on the 200 and the 304 alike
+    parts: optional parts() -> anything else the ETag has to change with
+    """
+    if view is None:
+        return functools.partial(conditional_on_data, vary=vary, parts=parts)
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_logged_in():
+            return view(*args, **kwargs)
+        extra = [request.headers.get(header, '') for header in vary]
+        if parts is not None:
+            extra.append(parts())
+        etag = data_etag(*extra)
+        if etag in request.if_none_match:
+            response = Response(status=304)
+            response.vary.update(vary)
+        else:
+            response = app.make_response(view(*args, **kwargs))
+            response.vary.update(vary)
+            if response.status_code != 200 or g.get('no_etag'):
+                return response
+        response.set_etag(etag)
+        # Cached copies may be kept but have to be revalidated every time
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
+
+# Opt-in group commit for /add (see write_behind.py): inserts arriving within
+# EXPENSE_WRITE_BEHIND_WINDOW_MS share one transaction of up to
+# EXPENSE_WRITE_BEHIND_BATCH rows; each request still waits for its commit
+app.config['WRITE_BEHIND'] = os.environ.get('EXPENSE_WRITE_BEHIND', '0') == '1'
+app.config['WRITE_BEHIND_WINDOW_MS'] = float(os.environ.get('EXPENSE_WRITE_BEHIND_WINDOW_MS', 10))
+app.config['WRITE_BEHIND_BATCH'] = int(os.environ.get('EXPENSE_WRITE_BEHIND_BATCH', 100))
+
+def create_write_queue():
+    def connect(shard=sharding.HOME):
+        ensure_database()
+        return (shard_router.backend(shard) if shard_router is not None else db_backend).connect()
+    return write_behind.WriteBehindQueue(
+        connect,
+        window=app.config['WRITE_BEHIND_WINDOW_MS'] / 1000,
+        max_batch=app.config['WRITE_BEHIND_BATCH'],
+        on_commit=lambda user_id, rows, version: expenses_changed(user_id, added=rows, version=version),
+        route=shard_router.shard_of if shard_router is not None else None,
+    )
+
+write_queue = create_write_queue() if app.config['WRITE_BEHIND'] else None
+if write_queue is not None:
+    # Commit whatever is still queued when the process exits
+    atexit.register(write_queue.close)
+
+# Rows inserted per transaction by the CSV import
+app.config['IMPORT_BATCH_SIZE'] = int(os.environ.get('EXPENSE_IMPORT_BATCH_SIZE', 1000))
+
+# Amounts are integer fils everywhere (see money.py); templates format them with |fils
+@app.template_filter('fils')
+def fils_filter(fils):
+    return money.format_fils(fils)
+
+# Date inputs offer the range check_expense_date accepts
+app.jinja_env.globals['earliest_expense_date'] = analytics.EARLIEST_EXPENSE_DATE.isoformat()
+app.jinja_env.globals['latest_expense_date'] = analytics.LATEST_EXPENSE_DATE.isoformat()
+
+# Function to check if a user is logged in
+def is_logged_in():
+    return 'user_id' in session
+
+# Middleware to restrict access to logged-in users
+@app.before_request
+def restrict_access():
+    allowed_routes = ['login', 'signup', 'static', 'metrics_endpoint']  # Allow login, signup, static files and the metrics scrape
+    if not is_logged_in() and request.endpoint not in allowed_routes:
+        return redirect(url_for('login'))
+
+# Route for sign-up
+@app.route('/signup', methods=['GET', 'POST'])
+def signup():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+        hashed_password = password_hasher.hash(password)
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        try:
+            # Insert new user into the database
+            cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, hashed_password))
+            conn.commit()
+
+            flash("Account created successfully! Please log in.", "success")
+            return redirect(url_for('login'))
+        except db_backend.IntegrityError:
+            # Handle duplicate username error
+            flash("Username entered already exists, please choose another one.", "danger")
+            return redirect(url_for('signup'))
+
+    return render_template('signup.html')
+
+# Route for login
+@app.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        # Fetch user from the database
+        cursor.execute("SELECT id, password FROM users WHERE username = ?", (username,))
+        user = cursor.fetchone()
+
+        if user and password_hasher.verify(password, user[1]):
+            # Bring hashes made with an older cost factor up to date
+            if password_hasher.needs_rehash(user[1]):
+                try:
+                    cursor.execute("UPDATE users SET password = ? WHERE id = ?", (password_hasher.rehash(password), user[0]))
+                    conn.commit()
+                except hashing.HashingBusy:
+                    pass  # try again on the next login
+
+            session['user_id'] = user[0]
+            session['username'] = username
+            flash("Logged in successfully!", "success")
+            return redirect(url_for('index'))
+        else:
+            flash("Invalid username or password.", "danger")
+
+    return render_template('login.html')
+
+# Route for logout
+@app.route('/logout')
+def logout():
+    session.clear()
+    flash("You have been logged out.", "info")
+    return redirect(url_for('login'))
+
+# Route to add expense
+@app.route('/add', methods=['GET', 'POST'])
+def add_expense():
+    if not is_logged_in():
+        flash("Please log in to add expenses.", "warning")
+        return redirect(url_for('login'))
+
+    if request.method == 'POST':
+        raw_date = request.form['date']
+        try:
+            expense_date = analytics.check_expense_date(datetime.strptime(raw_date, "%Y-%m-%d").date())
+        except ValueError:
+            flash(f"Please enter a valid date between {analytics.EARLIEST_EXPENSE_DATE.year} "
+                  f"and {analytics.LATEST_EXPENSE_DATE.year}.", "danger")
+            return redirect(url_for('add_expense'))
+
+        selected_category = request.form['category']
+        new_category = request.form.get('new_category', '').strip()
+        # Amounts are stored as integer fils (rounded to 3 decimal places)
+        try:
+            amount = money.parse_amount(request.form['amount'])
+        except ValueError:
+            flash("Please enter a valid amount.", "danger")
+            return redirect(url_for('add_expense'))
+
+        # Use the new category if provided
+        category = new_category if selected_category == 'add_new' else selected_category
+
+        if write_queue is not None:
+            # Grouped with other requests' inserts; returns once committed. No
+            # pooled connection is held while waiting, or batches could never
+            # outgrow the pool
+            release_db_connection(None)
+            write_queue.insert(session['user_id'], expense_date, category, amount)
+        else:
+            # Insert the expense (and update the monthly rollups) in one transaction
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            ledger.insert_expense(cursor, session['user_id'], expense_date, category, amount)
+            version = data_versions.fetch(cursor, session['user_id'])
+            conn.commit()
+            expenses_changed(session['user_id'], added=[(expense_date, category, amount)], version=version)
+
+        flash("Expense added successfully!", "success")
+        return redirect(url_for('view_expenses'))
+
+    # Existing categories for the dropdown, most used first
+    return render_template('add.html', categories=get_user_categories())
+
+# Route to import expenses from a CSV file
+@app.route('/import', methods=['GET', 'POST'])
+def import_expenses():
+    if not is_logged_in():
+        flash("Please log in to import expenses.", "warning")
+        return redirect(url_for('login'))
+
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash("Please choose a CSV file to import.", "danger")
+            return redirect(url_for('import_expenses'))
+
+        # Werkzeug spools large uploads to disk; read them back line by line
+        lines = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', errors='replace', newline='')
+        result = importer.import_expenses(
+            get_db_connection(), session['user_id'], lines,
+            batch_size=app.config['IMPORT_BATCH_SIZE'],
+            on_commit=lambda: expenses_changed(session['user_id'], bulk=True)
+        )
+
+    return render_template('import.html', result=result)
+
+# Display form of an expense row (id, expense_date, category, amount); the
+# amount stays in fils for the template's |fils filter
+def expense_to_dict(row):
+    # Format date as DD-MM-YYYY for display
+    expense_date = analytics.parse_expense_date(row[1])
+    date_str = expense_date.strftime("%d-%m-%Y") if expense_date else str(row[1])
+    return {'id': row[0], 'date': date_str, 'category': row[2], 'amount': row[3]}
+
+# Route to view expenses (first page; later pages come from /api/expenses)
+@app.route('/view')
+@conditional_on_data
+def view_expenses():
+    if not is_logged_in():
+        flash("Please log in to view expenses.", "warning")
+        return redirect(url_for('login'))
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    # Fetch one page of expenses matching the filters
+    filters = pagination.parse_filters(request.args)
+    rows, next_cursor = pagination.fetch_page(
+        cursor, db_backend, session['user_id'], filters,
+        after=request.args.get('after'), page_size=app.config['VIEW_PAGE_SIZE']
+    )
+
+    # Categories for the filter dropdown
+    categories = sorted(get_user_categories())
+
+    return render_template(
+        'view.html',
+        expenses=[expense_to_dict(row) for row in rows],
+        next_cursor=next_cursor,
+        filters=filters,
+        categories=categories
+    )
+
+# JSON page of expenses for infinite scroll on /view
+@app.route('/api/expenses')
+@conditional_on_data
+def api_expenses():
+    if not is_logged_in():
+        return {"error": "Unauthorized"}, 401
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    filters = pagination.parse_filters(request.args)
+    rows, next_cursor = pagination.fetch_page(
+        cursor, db_backend, session['user_id'], filters,
+        after=request.args.get('after'), page_size=app.config['VIEW_PAGE_SIZE']
+    )
+
+    expenses = []
+    for row in rows:
+        expense = expense_to_dict(row)
+        expense['amount'] = money.format_fils(expense['amount'])
+        expense['edit_url'] = url_for('edit_expense', expense_id=expense['id'])
+        expenses.append(expense)
+    return jsonify({'expenses': expenses, 'next_cursor': next_cursor})
+
+# Aggregates behind /analyze and /api/analyze for the logged-in user
+def build_analysis(selected_range, start_date_arg, end_date_arg):
+    today = datetime.now().date()
+    selected_range, start_date, end_date = analytics.resolve_range(selected_range, start_date_arg, end_date_arg, today)
+
+    user_id = session['user_id']
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    # Aggregation time (the queries inside are counted as 'db')
+    with metrics.phase('aggregate'):
+        store = get_columnar_store()
+        if store is not None:
+            # Month buckets and range totals from the user's in-memory columns
+            month_rows, range_totals = store.query(
+                cursor, user_id,
+                lambda columns: (columns.month_rows(), columns.category_totals(start_date, end_date))
+            )
+        else:
+            # Month-level figures come from the monthly rollups (a few dozen rows per user)
+            month_rows = rollups.fetch(cursor, user_id)
+            # Selected range totals: two lookups per category in the daily prefix sums
+            range_totals = prefix_index.get(cursor, user_id).category_totals(start_date, end_date)
+        summary = analytics.ExpenseAggregator(today).add_rollups(month_rows)
+
+        # The monthly trend is only shown once there is more than one year of data;
+        # it includes every month in the range (zeros included) so fluctuations are
+        # visible, up to the last EXPENSE_TREND_MONTHS so a stray date cannot make
+        # the chart (and its render job) arbitrarily long
+        if len(summary.totals_by_year()) > 1:
+            monthly_series = summary.monthly_series(app.config['TREND_MONTHS'])
+        else:
+            monthly_series = []
+
+    return {
+        'user_id': user_id,
+        'today': today,
+        'selected_range': selected_range,
+        'start_date': start_date,
+        'end_date': end_date,
+        'current_month_totals': summary.current_month_totals(),
+        'range_totals': range_totals,
+        'year_totals': summary.year_totals(),
+        'monthly_series': monthly_series,
+    }
+
+# Streaming exports: /export.csv and /export.jsonl
+@app.route('/export.<fmt>')
+def export_expenses(fmt):
+    if not is_logged_in():
+        flash("Please log in to export expenses.", "warning")
+        return redirect(url_for('login'))
+    if fmt not in ('csv', 'jsonl'):
+        return {"error": "Unknown export format"}, 404
+
+    filters = pagination.parse_filters(request.args)
+    if request.args.get('aggregates'):
+        # Same groupings as /analyze; explicit dates select a custom range
+        selected_range = request.args.get('range')
+        if filters['start_date'] and filters['end_date']:
+            selected_range = 'custom'
+        analysis = build_analysis(selected_range, request.args.get('start_date'), request.args.get('end_date'))
+        header = export.AGGREGATE_HEADER
+        rows = export.iter_aggregates(analysis, filters['category'])
+        filename = 'expense-aggregates'
+    else:
+        header = export.CSV_HEADER
+        rows = export.iter_expenses(get_db_connection().cursor(), session['user_id'], filters)
+        filename = 'expenses'
+
+    if fmt == 'csv':
+        lines, mimetype = export.csv_lines(header, rows), 'text/csv'
+    else:
+        lines, mimetype = export.jsonl_lines(header, rows), 'application/x-ndjson'
+    # stream_with_context keeps the request (and its pooled connection) alive until the last row
+    return Response(
+        stream_with_context(lines),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}.{fmt}'}
+    )
+
+# Route to analyze expenses
+# Chart formats follow Accept; the page links chart images that are only
+# rendered again while the render queue still remembers their jobs, so the
+# ETag also counts this user's forgotten jobs
+@app.route('/analyze')
+@conditional_on_data(vary=('Accept',), parts=lambda: render_queue.generation(session['user_id']))
+def analyze_expenses():
+    if not is_logged_in():
+        flash("Please log in to analyze expenses.", "warning")
+        return redirect(url_for('login'))
+
+    # Determine selected range from query params
+    selected_range = request.args.get('range')  # None means default behavior (year-to-date)
+    start_date_arg = request.args.get('start_date')
+    end_date_arg = request.args.get('end_date')
+    # render=client draws the charts in the browser from /api/analyze instead of PNGs
+    client_charts = request.args.get('render') == 'client'
+
+    analysis = build_analysis(selected_range, start_date_arg, end_date_arg)
+    user_id = analysis['user_id']
+    selected_range = analysis['selected_range']
+    start_date = analysis['start_date']
+    end_date = analysis['end_date']
+
+    # Current month totals for the pie chart
+    current_month_totals = analysis['current_month_totals']
+    pie_categories = list(current_month_totals.keys())
+    pie_amounts = list(current_month_totals.values())
+
+    # Selected range totals for the bar chart
+    range_totals = analysis['range_totals']
+    bar_categories = list(range_totals.keys())
+    bar_amounts = list(range_totals.values())
+
+    # Charts are cached per user under a fingerprint of the plotted numbers, so
+    # unchanged data is served without running matplotlib; anything else is
+    # queued for the render workers and loaded by the page when ready
+    range_key = (selected_range, start_date.isoformat(), end_date.isoformat())
+    pie_file = None
+    bar_chart_file = None
+
+    if pie_categories and sum(pie_amounts) > 0:
+        if client_charts:
+            pie_file = chart_ref(None, None)
+        else:
+            key = chart_cache.chart_key(user_id, 'pie', analysis['today'].strftime('%Y-%m'), [pie_categories, pie_amounts])
+            pie_file = chart_refs(key, charts.render_pie, pie_categories, [money.to_dinars(a) for a in pie_amounts])
+
+    if bar_categories and sum(bar_amounts) > 0:
+        if client_charts:
+            bar_chart_file = chart_ref(None, None)
+        else:
+            key = chart_cache.chart_key(user_id, 'bar', range_key, [bar_categories, bar_amounts])
+            bar_chart_file = chart_refs(key, charts.render_bar, bar_categories, [money.to_dinars(a) for a in bar_amounts])
+
+    # Compute year-to-date totals (current calendar year)
+    year_totals = analysis['year_totals']
+    year_total = sum(year_totals.values())
+    year_highest = analytics.highest(year_totals)
+
+    yearly_trend_file = None
+    series = analysis['monthly_series']
+    if series:
+        if client_charts:
+            yearly_trend_file = chart_ref(None, None)
+        else:
+            month_vals = [money.to_dinars(total) for _, total in series]
+            labels = [m.strftime('%b %Y') for m, _ in series]
+            key = chart_cache.chart_key(user_id, 'trend', None, [labels, month_vals])
+            yearly_trend_file = chart_refs(key, charts.render_trend, labels, month_vals)
+
+    # A page still polling for queued charts must not be served from cache later
+    for ref in (pie_file, bar_chart_file, yearly_trend_file):
+        if ref and ref['key'] and not ref['src']:
+            g.no_etag = True
+
+    # Compute current month totals and highest category
+    current_month_total = sum(pie_amounts)
+    current_month_highest = analytics.highest(current_month_totals)
+
+    display_start = start_date.strftime("%d-%m-%Y")
+    display_end = end_date.strftime("%d-%m-%Y")
+
+    return render_template(
+        'analyze.html',
+        chart=pie_file,
+        bar_chart=bar_chart_file,
+        total_period=sum(bar_amounts),
+        highest_period=analytics.highest(range_totals),
+        start_date=display_start,
+        end_date=display_end,
+        selected_range=selected_range,
+        current_month_total=current_month_total,
+        current_month_highest=current_month_highest,
+        year_total=year_total,
+        year_highest=year_highest,
+        yearly_trend=yearly_trend_file,
+        client_charts=client_charts
+    )
+
+# JSON version of /analyze: the same aggregates, for client-side charts
+@app.route('/api/analyze')
+@conditional_on_data
+def api_analyze():
+    if not is_logged_in():
+        return {"error": "Unauthorized"}, 401
+
+    analysis = build_analysis(request.args.get('range'), request.args.get('start_date'), request.args.get('end_date'))
+
+    def totals_block(totals):
+        return {
+            'total': money.to_dinars(sum(totals.values())),
+            'highest': analytics.highest(totals),
+            'categories': {category: money.to_dinars(amount) for category, amount in totals.items()},
+        }
+
+    range_totals = analysis['range_totals']
+    top_categories = sorted(range_totals.items(), key=lambda item: item[1], reverse=True)[:5]
+    return jsonify({
+        'range': {
+            'selected': analysis['selected_range'],
+            'start_date': analysis['start_date'].isoformat(),
+            'end_date': analysis['end_date'].isoformat(),
+        },
+        'current_month': totals_block(analysis['current_month_totals']),
+        'period': totals_block(range_totals),
+        'year_to_date': totals_block(analysis['year_totals']),
+        'top_categories': [{'category': category, 'total': money.to_dinars(amount)} for category, amount in top_categories],
+        'monthly': [{'month': m.strftime('%Y-%m'), 'label': m.strftime('%b %Y'), 'total': money.to_dinars(total)}
+                    for m, total in analysis['monthly_series']],
+    })
+
+# Totals for many date ranges in one call, from the daily prefix sums.
+# ?range=YYYY-MM-DD..YYYY-MM-DD (repeatable) and/or ?preset=month_yoy|ytd_yoy|
+# trailing|months with ?window=<days> and ?count=<n>; ?category= limits it to one.
+MAX_COMPARE_RANGES = 120
+# Longest ?window= in days (about ten years)
+MAX_COMPARE_WINDOW = 3660
+
+@app.route('/api/compare')
+@conditional_on_data
+def api_compare():
+    if not is_logged_in():
+        return {"error": "Unauthorized"}, 401
+
+    today = datetime.now().date()
+    ranges = []
+    for text in request.args.getlist('range'):
+        span = analytics.parse_date_span(text)
+        if span is None:
+            return {"error": f"Bad range {text!r}, expected YYYY-MM-DD..YYYY-MM-DD"}, 400
+        ranges.append((text, span[0], span[1]))
+    try:
+        window = int(request.args.get('window', 30))
+        count = int(request.args.get('count', 12))
+    except ValueError:
+        return {"error": "window and count must be whole numbers"}, 400
+    # Checked before any date arithmetic: huge values would overflow it
+    if not 1 <= window <= MAX_COMPARE_WINDOW:
+        return {"error": f"window must be between 1 and {MAX_COMPARE_WINDOW} days"}, 400
+    if not 1 <= count <= MAX_COMPARE_RANGES:
+        return {"error": f"count must be between 1 and {MAX_COMPARE_RANGES}"}, 400
+    for preset in request.args.getlist('preset'):
+        try:
+            preset_ranges = analytics.comparison_ranges(preset, today, window, count)
+        except (OverflowError, ValueError):
+            return {"error": f"Preset {preset!r} reaches outside the supported dates"}, 400
+        if not preset_ranges:
+            return {"error": f"Unknown preset {preset!r}"}, 400
+        ranges.extend(preset_ranges)
+    if not ranges:
+        return {"error": "Give at least one range or preset"}, 400
+    if len(ranges) > MAX_COMPARE_RANGES:
+        return {"error": f"At most {MAX_COMPARE_RANGES} ranges per request"}, 400
+
+    sums = prefix_index.get(get_db_connection().cursor(), session['user_id'])
+    category = request.args.get('category') or None
+    results = []
+    for label, start_date, end_date in ranges:
+        result = {
+            'label': label,
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'total': money.to_dinars(sums.total(start_date, end_date, category)),
+        }
+        if category is None:
+            result['categories'] = {name: money.to_dinars(amount)
+                                    for name, amount in sums.category_totals(start_date, end_date).items()}
+        results.append(result)
+    return jsonify({'category': category, 'ranges': results})
+
+# Polled by analyze.html until a queued chart is rendered.
+# ?wait=N long-polls for up to N seconds.
+@app.route('/analyze/charts/<key>')
+def chart_status(key):
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), 25)
+    except ValueError:
+        wait = 0
+    status, name = render_queue.status(key, wait=wait)
+    if status == 'missing':
+        return jsonify({'status': status}), 404
+    return jsonify(chart_ref(key, name) | {'status': status})
+
+# Chart cache and render worker statistics
+@app.route('/stats/charts')
+def chart_stats():
+    stats = chart_store.stats()
+    stats['render'] = render_queue.stats()
+    return jsonify(stats)
+
+# Static files and cached charts. This replaces Flask's own static view, which
+# would otherwise shadow it: charts live outside the bundled static folder when
+# frozen, and their content-addressed names make better ETags than the mtime,
+# which the cache touches on every hit. SVG charts are sent gzipped to clients
+# that accept it, from the copy the cache made when storing them. A chart that
+# was evicted is rendered again (waiting up to EXPENSE_CHART_WAIT seconds) while
+# the render queue remembers its job.
+app.config['CHART_WAIT'] = float(os.environ.get('EXPENSE_CHART_WAIT', 20))
+
+def serve_static(filename):
+    folder, _, name = filename.partition('/')
+    if folder == CHART_CACHE_DIR and name and '/' not in name:
+        from flask import send_from_directory
+        status, _ = render_queue.status(name, wait=app.config['CHART_WAIT'])
+        if status == 'pending':
+            return "The chart is still being rendered, please try again shortly.", 503, {'Retry-After': '2'}
+        if status == 'missing':
+            return "Chart not found.", 404
+        etag = os.path.splitext(name)[0]
+        compressed = chart_store.compressed(name)
+        if compressed is None:
+            return send_from_directory(chart_store.directory, name, etag=etag)
+        if 'gzip' in request.accept_encodings:
+            response = send_from_directory(chart_store.directory, compressed, etag=etag + '-gz',
+                                           mimetype=charts.FORMATS['svg'])
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = send_from_directory(chart_store.directory, name, etag=etag)
+        response.vary.add('Accept-Encoding')
+        return response
+    return app.send_static_file(filename)
+
+app.view_functions['static'] = serve_static
+
+# Route to edit expense
+@app.route('/edit/<int:expense_id>', methods=['GET', 'POST'])
+def edit_expense(expense_id):
+    if not is_logged_in():
+        flash("Please log in to edit expenses.", "warning")
+        return redirect(url_for('login'))
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    # Fetch the expense to edit
+    cursor.execute("SELECT expense_date, category, amount FROM expenses WHERE id = ? AND user_id = ?", (expense_id, session['user_id']))
+    expense = cursor.fetchone()
+
+    if not expense:
+        flash("Expense not found.", "danger")
+        return redirect(url_for('view_expenses'))
+
+    if request.method == 'POST':
+        raw_date = request.form['date']
+        category = request.form['category']
+        amount = request.form['amount']
+
+        # Parse the date input (YYYY-MM-DD) into a date for the DATE column
+        try:
+            date_to_store = analytics.check_expense_date(datetime.strptime(raw_date, "%Y-%m-%d").date())
+        except ValueError:
+            flash(f"Please enter a valid date between {analytics.EARLIEST_EXPENSE_DATE.year} "
+                  f"and {analytics.LATEST_EXPENSE_DATE.year}.", "danger")
+            return redirect(url_for('edit_expense', expense_id=expense_id))
+
+        # Amounts are stored as integer fils (rounded to 3 decimal places)
+        try:
+            amount_to_store = money.parse_amount(amount)
+        except ValueError:
+            flash("Please enter a valid amount.", "danger")
+            return redirect(url_for('edit_expense', expense_id=expense_id))
+
+        # Update the expense (and the monthly rollups) in one transaction
+        old = ledger.update_expense(cursor, session['user_id'], expense_id, date_to_store, category, amount_to_store)
+        version = data_versions.fetch(cursor, session['user_id'])
+        conn.commit()
+        if old:
+            expenses_changed(session['user_id'], removed=[old], added=[(date_to_store, category, amount_to_store)],
+                             version=version)
+
+        flash("Expense updated successfully!", "success")
+        return redirect(url_for('view_expenses'))
+
+    # The date input expects YYYY-MM-DD
+    expense_date = analytics.parse_expense_date(expense[0])
+    expense = (expense_date.isoformat() if expense_date else expense[0], expense[1], expense[2])
+    return render_template('edit.html', expense=expense)
+
+# Route to delete expense
+@app.route('/delete/<int:expense_id>', methods=['DELETE'])
+def delete_expense(expense_id):
+    if not is_logged_in():
+        return {"error": "Unauthorized"}, 401
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    # Delete the expense (and update the monthly rollups) in one transaction
+    old = ledger.delete_expense(cursor, session['user_id'], expense_id)
+    version = data_versions.fetch(cursor, session['user_id'])
+    conn.commit()
+    if old:
+        expenses_changed(session['user_id'], removed=[old], version=version)
+
+    return {"success": True}, 200
+
+# Selection for the bulk endpoints: {"ids": [...]} or {"filters": {"category": ...,
+# "start_date": ..., "end_date": ...}} for every expense matching the /view filters.
+# Returns (ids, filters) with one of them None, or an error message.
+def parse_bulk_selection(payload):
+    if isinstance(payload.get('ids'), list):
+        try:
+            ids = [int(expense_id) for expense_id in payload['ids']]
+        except (TypeError, ValueError):
+            return "ids must be a list of expense ids"
+        if not ids:
+            return "ids must name at least one expense"
+        return ids, None
+    if isinstance(payload.get('filters'), dict):
+        filters = pagination.parse_filters(payload['filters'])
+        # Empty (or unparseable) filters would select every expense
+        if not (filters['category'] or filters['start_date'] or filters['end_date']):
+            return "filters must set a category, start_date or end_date"
+        return None, filters
+    return "Send either ids or filters"
+
+# Largest date shift accepted (about a century either way)
+MAX_SHIFT_DAYS = 36500
+
+# Bulk delete / re-categorise / date shift, each in one transaction.
+# Body is JSON: the selection plus "category" or "days" for the last two.
+@app.route('/api/expenses/<action>', methods=['POST'])
+def bulk_update_expenses(action):
+    if not is_logged_in():
+        return {"error": "Unauthorized"}, 401
+    if action not in ('delete', 'recategorize', 'shift-dates'):
+        return {"error": "Unknown bulk action"}, 404
+
+    payload = request.get_json(silent=True) or {}
+    selection = parse_bulk_selection(payload)
+    if isinstance(selection, str):
+        return {"error": selection}, 400
+    ids, filters = selection
+
+    user_id = session['user_id']
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    if action == 'delete':
+        changed = ledger.delete_expenses(cursor, user_id, ids, filters)
+    elif action == 'recategorize':
+        category = str(payload.get('category') or '').strip()
+        if not category:
+            return {"error": "category is required"}, 400
+        changed, _ = ledger.recategorize_expenses(cursor, user_id, category, ids, filters)
+    else:
+        try:
+            days = int(payload.get('days'))
+        except (TypeError, ValueError):
+            return {"error": "days must be a whole number"}, 400
+        if abs(days) > MAX_SHIFT_DAYS:
+            return {"error": f"days must be between -{MAX_SHIFT_DAYS} and {MAX_SHIFT_DAYS}"}, 400
+        try:
+            changed, _ = ledger.shift_expenses(cursor, user_id, days, ids, filters)
+        except ValueError as e:
+            conn.rollback()
+            return {"error": str(e)}, 400
+    conn.commit()
+    if changed:
+        expenses_changed(user_id, bulk=True)
+
+    return {"success": True, "changed": len(changed)}, 200
+
+# Connection pool statistics, used to size DB_POOL_SIZE
+@app.route('/stats/pool')
+def pool_stats():
+    return jsonify(db_pool.stats())
+
+@app.route('/stats/columnar')
+def columnar_stats():
+    store = get_columnar_store()
+    return jsonify(store.stats() if store is not None else {'enabled': False})
+
+@app.route('/stats/daily-index')
+def daily_index_stats():
+    return jsonify(prefix_index.stats())
+
+@app.route('/stats/categories')
+def category_stats():
+    return jsonify(category_cache.stats())
+
+@app.route('/stats/shards')
+def shard_stats():
+    if shard_router is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, 'users': shard_router.shards(), **shard_router.stats()})
+
+@app.route('/stats/write-behind')
+def write_behind_stats():
+    return jsonify(write_queue.stats() if write_queue is not None else {'enabled': False})
+
+@app.route('/stats/hashing')
+def hashing_stats():
+    return jsonify(password_hasher.stats())
+
+# Prometheus scrape endpoint: request counts, latency and per-phase histograms
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.registry.render_text(), mimetype='text/plain; version=0.0.4')
+
+# Stack samples of the most recent requests over EXPENSE_SLOW_REQUEST_MS
+@app.route('/stats/slow-requests')
+def slow_request_stats():
+    if slow_request_profiler is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, 'threshold_ms': app.config['SLOW_REQUEST_MS'],
+                    'requests': list(slow_request_profiler.slow)})
+
+# Home page
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+if __name__ == '__main__':
+    # Render worker processes re-launch the executable; let them start up properly
+    import multiprocessing
+    multiprocessing.freeze_support()
+
+    # For executable, you might want to automatically open the browser
+    if getattr(sys, 'frozen', False):
+        import webbrowser
+        
+        def open_browser():
+            import time
+            time.sleep(1.5)
+            webbrowser.open('http://127.0.0.1:5000')
+        
+        threading.Thread(target=open_browser).start()
+    
+    print("=" * 60)
+    print("Expense Tracker Starting...")
+    print("=" * 60)
+    if getattr(sys, 'frozen', False):
+        print(f"Database location: {DB_PATH}")
+        print(f"Your data is safely stored at: {get_user_data_path()}")
+    print("Open your browser and navigate to: http://127.0.0.1:5000")
+    print("Press Ctrl+C to stop the server")
+    print("=" * 60)
+    
     app.run(debug=False, host='127.0.0.1', port=5000)
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+Chart output formats: bytes and render time.
+
+Renders the three /analyze charts from fixed sample data in every format
+this install can write, at the thumbnail and full-size DPI for the raster
+formats (SVG has no DPI), and reports the median render time, the file size
+and the gzipped size (what the chart route sends for SVG). The 300 dpi PNG
+row is what every page view used to download.
+
+    python benchmarks/chart_formats.py [--repeat 5] [--thumb-dpi 100] [--dpi 300]
+                                       [--json FILE]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def sample_charts(charts):
+    """(name, render function, args) for each chart on /analyze"""
+    categories = ['Groceries', 'Rent', 'Transport', 'Dining', 'Utilities', 'Health', 'Travel', 'Gifts']
+    amounts = [412.5, 350.0, 96.75, 180.25, 64.0, 45.5, 220.0, 30.125]
+    months = [f"{name} {year}" for year in (2025, 2026) for name in
+              ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')]
+    totals = [900 + 40 * (i % 7) + 15 * i for i in range(len(months))]
+    return [
+        ('pie', charts.render_pie, (categories, amounts)),
+        ('bar', charts.render_bar, (categories, amounts)),
+        ('trend', charts.render_trend, (months, totals)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help="renders per chart and variant")
+    parser.add_argument('--thumb-dpi', type=int, default=100)
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    import charts
+
+    variants = []
+    for fmt in charts.available_formats():
+        if fmt == 'svg':
+            variants.append((fmt, None))
+        else:
+            variants.extend([(fmt, args.thumb_dpi), (fmt, args.dpi)])
+
+    tmp = tempfile.mkdtemp(prefix='expense-charts-')
+    # The first render pays for importing matplotlib
+    charts.render_pie(os.path.join(tmp, 'warmup.png'), ['a'], [1])
+
+    results = []
+    print(f"{'chart':<6} {'format':<6} {'dpi':>4} {'render ms':>10} {'bytes':>9} {'gzipped':>9}")
+    for name, render, render_args in sample_charts(charts):
+        for fmt, dpi in variants:
+            path = os.path.join(tmp, f"{name}-{dpi}.{fmt}")
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                render(path, *render_args, dpi)
+                timings.append(time.perf_counter() - start)
+            with open(path, 'rb') as f:
+                data = f.read()
+            result = {
+                'chart': name,
+                'format': fmt,
+                'dpi': dpi,
+                'render_ms': round(statistics.median(timings) * 1000, 1),
+                'bytes': len(data),
+                'gzip_bytes': len(gzip.compress(data, compresslevel=9)),
+            }
+            results.append(result)
+            print(f"{name:<6} {fmt:<6} {dpi or '-':>4} {result['render_ms']:>10.1f} "
+                  f"{result['bytes']:>9} {result['gzip_bytes']:>9}")
+
+    # Bytes a page view downloads for all three charts, per variant
+    print()
+    baseline = sum(r['bytes'] for r in results if r['format'] == 'png' and r['dpi'] == args.dpi)
+    for fmt, dpi in variants:
+        rows = [r for r in results if r['format'] == fmt and r['dpi'] == dpi]
+        sent = sum(r['gzip_bytes'] if fmt == 'svg' else r['bytes'] for r in rows)
+        label = f"{fmt} {dpi} dpi" if dpi else fmt
+        print(f"{label:<14} {sent:>9} bytes per page ({sent / baseline:.0%} of {args.dpi} dpi PNG)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'repeat': args.repeat, 'thumb_dpi': args.thumb_dpi, 'dpi': args.dpi, 'results': results},
+                      f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Concurrency check for chart rendering under a multi-threaded server.
+
+Starts the app on the serve.py server (waitress or werkzeug threads) with
+charts rendered inline on the request threads, creates several users with
+different expenses and then fires their /analyze requests in parallel,
+several rounds over an empty chart cache each time. Every chart produced
+concurrently must be byte-identical to the one rendered for the same user
+when requests ran one at a time; with the old pyplot code figures from
+different requests would bleed into each other.
+
+    python benchmarks/concurrency_check.py [--users 8] [--rounds 5] [--threads 8]
+
+Exits with status 1 if any chart differs.
+"""
+
+import argparse
+import http.cookiejar
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP = tempfile.mkdtemp(prefix='expense-concurrency-')
+os.environ['EXPENSE_DB_BACKEND'] = 'sqlite'
+os.environ['EXPENSE_DB_PATH'] = os.path.join(TMP, 'concurrency.db')
+os.environ['EXPENSE_RENDER_WORKERS'] = '0'  # render on the request threads
+sys.path.insert(0, ROOT)
+
+import app as expense_app  # noqa: E402
+import chart_cache  # noqa: E402
+from serve import Server  # noqa: E402
+
+CATEGORIES = ['Food', 'Rent', 'Fuel', 'Grocery', 'Fun', 'Travel']
+
+
+class Client:
+    """One logged-in user talking to the server over HTTP"""
+
+    def __init__(self, base_url, username):
+        self.base_url = base_url
+        self.username = username
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def get(self, path):
+        with self.opener.open(self.base_url + path) as response:
+            return response.read().decode('utf-8')
+
+    def post(self, path, data):
+        body = urllib.parse.urlencode(data).encode('utf-8')
+        with self.opener.open(self.base_url + path, data=body) as response:
+            return response.read().decode('utf-8')
+
+
+def seed_user(client, index):
+    """Sign up and add expenses that differ from every other user's"""
+    client.post('/signup', {'username': client.username, 'password': 'pw'})
+    client.post('/login', {'username': client.username, 'password': 'pw'})
+    today = date.today()
+    for month_back in range(14):
+        year, month = divmod(today.year * 12 + today.month - 1 - month_back, 12)
+        day = date(year, month + 1, min(today.day, 28))
+        for offset, category in enumerate(CATEGORIES[:2 + index % 4]):
+            amount = (index + 1) * 10 + offset * 3 + month_back
+            client.post('/add', {'date': day.isoformat(), 'category': category, 'amount': str(amount)})
+
+
+def analyze(client):
+    """{chart filename: image bytes} for one /analyze page"""
+    page = client.get('/analyze?range=12')
+    names = re.findall(r'src="/static/charts/([0-9a-f]+(?:-\d+)?\.png)"', page)
+    cache = expense_app.render_queue.cache
+    images = {}
+    for name in names:
+        with open(os.path.join(cache.directory, name), 'rb') as f:
+            images[name] = f.read()
+    return images
+
+
+def analyze_or_error(client):
+    try:
+        return analyze(client)
+    except OSError as e:  # includes HTTP errors
+        return f"request failed: {e}"
+
+
+def fresh_cache():
+    directory = tempfile.mkdtemp(dir=TMP)
+    expense_app.render_queue.cache = chart_cache.ChartCache(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    server = Server(expense_app.app, '127.0.0.1', 0, threads=args.threads)
+    threading.Thread(target=server.run, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.port}'
+    print(f"Serving on {base_url} with {server.kind}")
+
+    clients = [Client(base_url, f'user{index}') for index in range(args.users)]
+    for index, client in enumerate(clients):
+        seed_user(client, index)
+
+    # Reference charts, one request at a time
+    fresh_cache()
+    expected = {}
+    for client in clients:
+        expected[client.username] = analyze(client)
+    chart_count = sum(len(images) for images in expected.values())
+    print(f"Rendered {chart_count} reference charts for {len(clients)} users")
+
+    mismatches = 0
+    with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+        for round_number in range(1, args.rounds + 1):
+            fresh_cache()
+            start = time.perf_counter()
+            results = list(executor.map(analyze_or_error, clients))
+            elapsed = time.perf_counter() - start
+            for client, images in zip(clients, results):
+                if isinstance(images, str):
+                    mismatches += 1
+                    print(f"  round {round_number}: {client.username} {images}")
+                elif images != expected[client.username]:
+                    mismatches += 1
+                    print(f"  round {round_number}: charts for {client.username} differ from the reference")
+            print(f"Round {round_number}: {len(clients)} parallel /analyze requests in {elapsed:.2f}s")
+
+    server.close()
+    if mismatches:
+        print(f"FAILED: {mismatches} users got wrong charts")
+        sys.exit(1)
+    print(f"OK: every parallel chart matched its reference ({args.rounds} rounds)")
+
+
+if __name__ == '__main__':
+    main()
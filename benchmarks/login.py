@@ -0,0 +1,161 @@
+"""
+Login throughput and latency benchmark.
+
+Seeds a throwaway SQLite database with users, starts the production server
+(serve.Server: waitress, or werkzeug's threaded server) and sends bursts of
+parallel POST /login requests over HTTP while another client keeps
+requesting a cheap page. Reports logins per second, login latency
+percentiles, how many logins were turned away with 503, and the latency of
+the cheap page during the burst. That page should stay fast: the bcrypt
+queue is sized below the server's thread count, so a burst of logins cannot
+park every server thread (the Flask test client has no thread limit and
+would not show that).
+
+    python benchmarks/login.py [--users 16] [--concurrency 32] [--logins 200]
+                               [--rounds 10] [--threads 8] [--workers 2]
+                               [--queue N] [--json FILE]
+
+--rounds sets the bcrypt cost; --threads the server threads; --workers and
+--queue size the hashing pool (the queue defaults to what app.py derives
+from the thread count).
+"""
+
+import argparse
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def request(port, method, path, data=None):
+    """Status code of one request on a fresh connection (redirects are not followed)"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        body = urllib.parse.urlencode(data) if data is not None else None
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if data is not None else {}
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=16)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=10, help="bcrypt cost factor")
+    parser.add_argument('--threads', type=int, default=8, help="server threads")
+    parser.add_argument('--workers', type=int, default=2, help="hashing worker threads")
+    parser.add_argument('--queue', type=int, help="hashes allowed to wait before 503")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='expense-login-')
+    os.environ['EXPENSE_DB_BACKEND'] = 'sqlite'
+    os.environ['EXPENSE_DB_PATH'] = os.path.join(tmp, 'login.db')
+    os.environ['EXPENSE_BCRYPT_ROUNDS'] = str(args.rounds)
+    os.environ['EXPENSE_SERVER_THREADS'] = str(args.threads)
+    os.environ['EXPENSE_HASH_WORKERS'] = str(args.workers)
+    if args.queue is not None:
+        os.environ['EXPENSE_HASH_QUEUE'] = str(args.queue)
+    os.environ.setdefault('EXPENSE_DB_POOL_SIZE', str(args.threads + 4))
+    sys.path.insert(0, ROOT)
+    import app as expense_app
+    from serve import Server
+
+    app = expense_app.app
+    for index in range(args.users):
+        app.test_client().post('/signup', data={'username': f'user{index}', 'password': 'pw'})
+
+    server = Server(app, '127.0.0.1', 0, threads=args.threads)
+    threading.Thread(target=server.run, daemon=True).start()
+    port = server.port
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def login(index):
+        start = time.perf_counter()
+        status = request(port, 'POST', '/login', {'username': f'user{index % args.users}', 'password': 'pw'})
+        elapsed = time.perf_counter() - start
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 302:
+                latencies.append(elapsed)
+
+    # A cheap page requested throughout the burst
+    page_latencies = []
+    burst_running = threading.Event()
+
+    def browse():
+        while burst_running.is_set():
+            start = time.perf_counter()
+            request(port, 'GET', '/login')
+            page_latencies.append(time.perf_counter() - start)
+            time.sleep(0.01)
+
+    burst_running.set()
+    browser = threading.Thread(target=browse)
+    browser.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(login, range(args.logins)))
+    elapsed = time.perf_counter() - start
+    burst_running.clear()
+    browser.join()
+    server.close()
+    expense_app.password_hasher.shutdown()
+
+    results = {
+        'bcrypt_rounds': args.rounds,
+        'server': server.kind,
+        'server_threads': args.threads,
+        'hash_workers': app.config['HASH_WORKERS'],
+        'hash_queue': app.config['HASH_QUEUE'],
+        'concurrency': args.concurrency,
+        'logins': args.logins,
+        'seconds': elapsed,
+        'logins_per_second': len(latencies) / elapsed if elapsed else 0.0,
+        'status_counts': statuses,
+        'login_p50_ms': percentile(latencies, 0.50) * 1000,
+        'login_p95_ms': percentile(latencies, 0.95) * 1000,
+        'login_max_ms': max(latencies, default=0.0) * 1000,
+        'page_p50_ms': percentile(page_latencies, 0.50) * 1000,
+        'page_p95_ms': percentile(page_latencies, 0.95) * 1000,
+        'page_requests': len(page_latencies),
+    }
+
+    print(f"{server.kind}, bcrypt cost {args.rounds}, {results['hash_workers']} hashing workers, "
+          f"queue {results['hash_queue']}, {args.concurrency} clients")
+    print(f"  {len(latencies)} successful logins in {elapsed:.2f}s ({results['logins_per_second']:.1f}/s)")
+    print(f"  responses: {', '.join(f'{code}: {count}' for code, count in sorted(statuses.items()))}")
+    print(f"  login latency  p50 {results['login_p50_ms']:.0f} ms  p95 {results['login_p95_ms']:.0f} ms"
+          f"  max {results['login_max_ms']:.0f} ms")
+    print(f"  /login GET during burst  p50 {results['page_p50_ms']:.1f} ms  p95 {results['page_p95_ms']:.1f} ms"
+          f"  ({len(page_latencies)} requests)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
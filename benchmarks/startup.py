@@ -0,0 +1,126 @@
+"""
+Startup-time benchmark for Expense Tracker.
+
+Measures, in fresh processes each run:
+  import        time to `import app` and to serve the first page through the
+                test client, plus whether matplotlib got loaded on the way
+  script        launching `python app.py` until http://127.0.0.1:5000/login answers
+  frozen        the same for a built executable (pass --exe dist/ExpenseTracker/ExpenseTracker.exe)
+
+Every run uses a throwaway SQLite database, so your own data is never touched.
+
+    python benchmarks/startup.py [--runs 5] [--exe PATH] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+URL = 'http://127.0.0.1:5000/login'
+
+# Runs inside a fresh interpreter and prints its timings as JSON
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+client.get('/login')
+first_page = time.perf_counter()
+client.post('/login', data={'username': 'nobody', 'password': 'x'})
+first_db = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - start,
+    'first_response_s': first_page - start,
+    'first_db_response_s': first_db - start,
+    'matplotlib_loaded': 'matplotlib' in sys.modules,
+}))
+"""
+
+
+def fresh_env(tmp):
+    env = dict(os.environ)
+    env['EXPENSE_DB_BACKEND'] = 'sqlite'
+    env['EXPENSE_DB_PATH'] = os.path.join(tmp, 'startup.db')
+    return env
+
+
+def run_import_probe():
+    with tempfile.TemporaryDirectory() as tmp:
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT_PROBE],
+            cwd=ROOT, env=fresh_env(tmp), capture_output=True, text=True, check=True
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def time_to_first_response(command, timeout=60):
+    """Seconds from launching `command` until URL answers"""
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=ROOT, env=fresh_env(tmp),
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while time.perf_counter() - start < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"{command[0]} exited with code {process.returncode}")
+                try:
+                    with urllib.request.urlopen(URL, timeout=1) as response:
+                        response.read()
+                    return time.perf_counter() - start
+                except OSError:
+                    time.sleep(0.02)
+            raise RuntimeError(f"no response from {URL} within {timeout}s")
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def summarize(samples):
+    return {'median': statistics.median(samples), 'min': min(samples), 'max': max(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--exe', help="built executable to measure in frozen mode")
+    parser.add_argument('--skip-server', action='store_true', help="only run the in-process import probe")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+
+    probes = [run_import_probe() for _ in range(args.runs)]
+    for name in ('import_s', 'first_response_s', 'first_db_response_s'):
+        results[f'import.{name}'] = summarize([probe[name] for probe in probes])
+    matplotlib_loaded = any(probe['matplotlib_loaded'] for probe in probes)
+
+    if not args.skip_server:
+        samples = [time_to_first_response([sys.executable, 'app.py']) for _ in range(args.runs)]
+        results['script.first_response_s'] = summarize(samples)
+    if args.exe:
+        samples = [time_to_first_response([os.path.abspath(args.exe)]) for _ in range(args.runs)]
+        results['frozen.first_response_s'] = summarize(samples)
+
+    print(f"{'measurement':<32}{'median':>10}{'min':>10}{'max':>10}")
+    for name, stats in results.items():
+        print(f"{name:<32}{stats['median']:>10.3f}{stats['min']:>10.3f}{stats['max']:>10.3f}")
+    print(f"matplotlib imported before the first chart: {'yes' if matplotlib_loaded else 'no'}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'runs': args.runs, 'results': results, 'matplotlib_loaded': matplotlib_loaded}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+"""
+Benchmark suite: every route and the analytics engine on synthetic data.
+
+Seeds a SQLite database with one user per --sizes entry (see synthetic.py),
+then for each user times:
+
+  routes   /view (plain, filtered, second page), /analyze for every range
+           option, /api/analyze, /add, /edit and /delete
+  engine   the aggregation steps behind /analyze on their own (rollups,
+           range totals, the daily prefix sums, the raw-row aggregator, the
+           columnar cache)
+  charts   rendering the pie, bar and trend charts for that user's numbers
+
+Results (milliseconds: min / median / mean / p95 per measurement) are written
+to a JSON file; pass --compare to print the change against an earlier run.
+
+    python benchmarks/suite.py [--sizes 1000,10000,100000] [--repeat 5] [--seed 42]
+                               [--db bench.db] [--output results.json] [--compare old.json]
+
+The database is rebuilt unless --db points at one seeded with the same sizes
+and seed, so the 1M-row case only has to be generated once.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RANGES = [None, 'ytd', 'previous_year', '3', '6', '12', 'custom']
+CUSTOM_RANGE = {'start_date': '2023-03-15', 'end_date': '2025-09-10'}
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'min_ms': ordered[0] * 1000,
+        'median_ms': statistics.median(ordered) * 1000,
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000,
+        'runs': len(ordered),
+    }
+
+
+def measure(func, repeat, warmup=1):
+    """Time func(i) for i in range(repeat) after `warmup` untimed calls"""
+    for i in range(warmup):
+        func(-1 - i)
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def check(response, *expected):
+    if response.status_code not in expected:
+        raise RuntimeError(f"{response.request.path} returned {response.status_code}")
+    return response
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_routes(app, user_id, repeat):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['username'] = 'bench'
+
+    results = {}
+    results['view'] = measure(lambda i: check(client.get('/view'), 200), repeat)
+    results['view_category'] = measure(lambda i: check(client.get('/view?category=Groceries'), 200), repeat)
+    first_page = check(client.get('/api/expenses'), 200).get_json()
+    after = first_page['next_cursor'] or ''
+    results['view_next_page'] = measure(lambda i: check(client.get(f'/api/expenses?after={after}'), 200), repeat)
+
+    for selected_range in RANGES:
+        params = {'render': 'client'}
+        if selected_range:
+            params['range'] = selected_range
+        if selected_range == 'custom':
+            params.update(CUSTOM_RANGE)
+        results[f'analyze[{selected_range or "default"}]'] = measure(
+            lambda i: check(client.get('/analyze', query_string=params), 200), repeat)
+    results['api_analyze'] = measure(lambda i: check(client.get('/api/analyze?range=12'), 200), repeat)
+
+    # Writes: add fresh rows, edit them, then delete them again so the data set stays the same size
+    added = []
+
+    def add(i):
+        check(client.post('/add', data={'date': '2026-05-17', 'category': 'Groceries', 'amount': '12.345'}), 302)
+
+    results['add'] = measure(add, repeat)
+    with app.app_context():
+        cursor = app_module.get_db_connection().cursor()
+        cursor.execute("SELECT id FROM expenses WHERE user_id = ? AND expense_date = ? AND amount = ?",
+                       (user_id, date(2026, 5, 17), 12345))
+        added = [row[0] for row in cursor.fetchall()]
+
+    def edit(i):
+        expense_id = added[i % len(added)]
+        check(client.post(f'/edit/{expense_id}', data={'date': '2026-05-18', 'category': 'Food', 'amount': str(10 + i)}), 302)
+
+    def delete(i):
+        check(client.delete(f'/delete/{added.pop()}'), 200)
+
+    results['edit'] = measure(edit, repeat)
+    results['delete'] = measure(delete, min(repeat, len(added) - 1), warmup=1)
+    for expense_id in added:
+        client.delete(f'/delete/{expense_id}')
+    return results
+
+
+def sql_range_totals(cursor, user_id, start_date, end_date):
+    """Per-category totals for start_date..end_date summed by the database from raw expenses"""
+    cursor.execute(
+        "SELECT category, SUM(amount) FROM expenses "
+        "WHERE user_id = ? AND expense_date BETWEEN ? AND ? GROUP BY category",
+        (user_id, start_date, end_date)
+    )
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def rollup_range_totals(cursor, user_id, start_date, end_date):
+    """
+    Per-category totals for start_date..end_date the way /analyze computed
+    them before the daily prefix sums: whole months from the rollups, the
+    partial months at either end summed from raw expenses.
+    """
+    import analytics
+
+    if start_date > end_date:
+        return {}
+    first_full = start_date if start_date.day == 1 else analytics.add_months(start_date.replace(day=1), 1)
+    after_end = end_date + timedelta(days=1)
+    # Day after the last whole month in the range
+    full_end = after_end if after_end.day == 1 else after_end.replace(day=1)
+    if first_full >= full_end:
+        return sql_range_totals(cursor, user_id, start_date, end_date)
+
+    totals = defaultdict(int)
+    last_full = analytics.add_months(full_end, -1)
+    cursor.execute(
+        "SELECT category, SUM(total) FROM monthly_rollups "
+        "WHERE user_id = ? AND [year] * 12 + [month] BETWEEN ? AND ? GROUP BY category",
+        (user_id, first_full.year * 12 + first_full.month, last_full.year * 12 + last_full.month)
+    )
+    for category, total in cursor.fetchall():
+        totals[category] += total
+
+    edges = []
+    if start_date < first_full:
+        edges.append((start_date, first_full - timedelta(days=1)))
+    if full_end <= end_date:
+        edges.append((full_end, end_date))
+    for edge_start, edge_end in edges:
+        for category, total in sql_range_totals(cursor, user_id, edge_start, edge_end).items():
+            totals[category] += total
+    return dict(totals)
+
+
+def bench_engine(backend, user_id, repeat):
+    import analytics
+    import rollups
+
+    conn = backend.connect()
+    cursor = conn.cursor()
+    today = datetime.now().date()
+    start, end = analytics.add_months(today, -12), today
+    results = {}
+
+    def rollup_summary(i):
+        summary = analytics.ExpenseAggregator(today).add_rollups(rollups.fetch(cursor, user_id))
+        summary.current_month_totals(), summary.year_totals(), summary.monthly_series()
+
+    results['rollup_summary'] = measure(rollup_summary, repeat)
+    results['range_totals_rollups'] = measure(lambda i: rollup_range_totals(cursor, user_id, start, end), repeat)
+    import daily_index
+    results['prefix_build'] = measure(lambda i: daily_index.PrefixIndex().get(cursor, user_id), max(1, repeat // 2), warmup=0)
+    prefix = daily_index.PrefixIndex()
+    results['range_totals_prefix'] = measure(lambda i: prefix.get(cursor, user_id).category_totals(start, end), repeat)
+    results['range_totals_sql'] = measure(lambda i: sql_range_totals(cursor, user_id, start, end), repeat)
+
+    def raw_aggregator(i):
+        # Month buckets and the range totals in one pass over the raw rows
+        cursor.execute("SELECT category, amount, expense_date FROM expenses WHERE user_id = ?", (user_id,))
+        aggregator = analytics.ExpenseAggregator(today)
+        range_totals = defaultdict(int)
+        for category, amount, expense_date in cursor.fetchall():
+            aggregator.add(category, amount, expense_date)
+            d = analytics.parse_expense_date(expense_date)
+            if d is not None and start <= d <= end:
+                range_totals[category] += amount
+        aggregator.monthly_series()
+
+    results['raw_row_aggregator'] = measure(raw_aggregator, max(1, repeat // 2))
+
+    try:
+        import columnar
+    except ImportError:
+        columnar = None
+    if columnar is not None:
+        query = lambda columns: (columns.month_rows(), columns.category_totals(start, end))
+        results['columnar_load'] = measure(
+            lambda i: columnar.ColumnarStore().query(cursor, user_id, query), max(1, repeat // 2), warmup=0)
+        store = columnar.ColumnarStore()
+        results['columnar_query'] = measure(lambda i: store.query(cursor, user_id, query), repeat)
+    conn.close()
+    return results
+
+
+def bench_charts(backend, user_id, repeat):
+    import analytics
+    import charts
+    import rollups
+
+    conn = backend.connect()
+    cursor = conn.cursor()
+    today = datetime.now().date()
+    summary = analytics.ExpenseAggregator(today).add_rollups(rollups.fetch(cursor, user_id))
+    range_totals = sql_range_totals(cursor, user_id, analytics.add_months(today, -12), today)
+    conn.close()
+    pie = summary.year_totals() or range_totals
+    series = summary.monthly_series()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'chart.png')
+        results['pie'] = measure(lambda i: charts.render_pie(path, list(pie), list(pie.values())), repeat)
+        results['bar'] = measure(lambda i: charts.render_bar(path, list(range_totals), list(range_totals.values())), repeat)
+        results['trend'] = measure(lambda i: charts.render_trend(
+            path, [m.strftime('%b %Y') for m, _ in series], [total for _, total in series]), repeat)
+    return results
+
+
+def print_results(results, previous=None):
+    for user, groups in results.items():
+        print(f"\n{user}")
+        for group, measurements in groups.items():
+            for name, stats in measurements.items():
+                line = f"  {group + '.' + name:<40}{stats['median_ms']:>10.2f} ms  (p95 {stats['p95_ms']:.2f})"
+                old = (previous or {}).get(user, {}).get(group, {}).get(name)
+                if old and old['median_ms']:
+                    line += f"  {stats['median_ms'] / old['median_ms']:.2f}x vs previous"
+                print(line)
+
+
+def main():
+    global app_module
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000', help="expenses per user, comma separated (up to 1000000)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--db', help="SQLite file to seed (or reuse); default is a temporary file")
+    parser.add_argument('--skip-charts', action='store_true')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='expense-bench-'), 'bench.db')
+    marker = f"{db_path}.seed.json"
+    fingerprint = {'sizes': sizes, 'seed': args.seed, 'years': args.years}
+    reuse = os.path.exists(db_path) and os.path.exists(marker) and json.load(open(marker)) == fingerprint
+    if not reuse:
+        for suffix in ('', '-wal', '-shm', '.seed.json'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    os.environ['EXPENSE_DB_BACKEND'] = 'sqlite'
+    os.environ['EXPENSE_DB_PATH'] = db_path
+    os.environ['EXPENSE_RENDER_WORKERS'] = '0'
+    import app as app_module
+    import synthetic
+
+    app_module.ensure_database()
+    backend = app_module.db_backend
+    conn = backend.connect()
+    if reuse:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, username FROM users WHERE username LIKE 'bench_%' ORDER BY id")
+        users = [(row[0], row[1], int(row[1].rsplit('_', 1)[1])) for row in cursor.fetchall()]
+        print(f"Reusing {db_path}")
+    else:
+        start = time.perf_counter()
+        users = synthetic.seed_database(conn, sizes, seed=args.seed, years=args.years,
+                                        progress=lambda name, size: print(f"  seeded {name}"))
+        print(f"Seeded {sum(sizes)} expenses in {time.perf_counter() - start:.1f}s into {db_path}")
+        with open(marker, 'w') as f:
+            json.dump(fingerprint, f)
+    conn.close()
+
+    results = {}
+    for user_id, username, size in users:
+        print(f"Benchmarking {username} ({size} expenses)...")
+        groups = {
+            'routes': bench_routes(app_module.app, user_id, args.repeat),
+            'engine': bench_engine(backend, user_id, args.repeat),
+        }
+        if not args.skip_charts:
+            groups['charts'] = bench_charts(backend, user_id, max(1, args.repeat // 2))
+        results[f"{size} expenses"] = groups
+    app_module.render_queue.shutdown()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)['results']
+    print_results(results, previous)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'sizes': sizes,
+            'seed': args.seed,
+            'years': args.years,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
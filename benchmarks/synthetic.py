@@ -0,0 +1,71 @@
+"""
+Seeded synthetic expense data for the benchmarks.
+
+generate_expenses() yields (expense_date, category, amount) rows for one user:
+dates spread over several years back from a fixed end date, a few dozen
+categories with a skewed (Zipf-like) popularity, and log-normal amounts
+in integer fils like the app stores them. The same seed always
+produces the same rows, so runs on different commits see identical data.
+
+seed_database() creates the users and loads their rows through
+ledger.insert_expenses, so the monthly rollups and category counts are
+filled exactly as they would be by the app.
+"""
+
+import random
+from datetime import date, timedelta
+
+import ledger
+
+CATEGORIES = [
+    'Groceries', 'Food', 'Rent', 'Fuel', 'Transport', 'Utilities', 'Internet', 'Phone',
+    'Entertainment', 'Extra-Curriculars', 'Miscellaneous', 'Clothing', 'Health', 'Pharmacy',
+    'Gym', 'Books', 'Gifts', 'Charity', 'Travel', 'Hotels', 'Flights', 'Insurance',
+    'Car Service', 'Parking', 'Coffee', 'Snacks', 'Delivery', 'Electronics', 'Furniture',
+    'Home Repair', 'Pets', 'Subscriptions', 'Education', 'Childcare', 'Beauty', 'Sports',
+    'Music', 'Games', 'Stationery', 'Taxes',
+]
+
+# Fixed so the data does not change from one day to the next
+END_DATE = date(2026, 6, 30)
+
+
+def generate_expenses(rng, count, years=5, categories=CATEGORIES, end_date=END_DATE):
+    """`count` (expense_date, category, amount) rows drawn from `rng`"""
+    span = (end_date - end_date.replace(year=end_date.year - years)).days
+    weights = [1 / (rank + 1) for rank in range(len(categories))]
+    for category in rng.choices(categories, weights=weights, k=count):
+        day = end_date - timedelta(days=rng.randrange(span))
+        amount = int(round(min(rng.lognormvariate(1.5, 1.0), 5000) * 1000))
+        yield day, category, amount
+
+
+def seed_database(conn, sizes, seed=42, years=5, password_hash='x', batch_size=5000, progress=None):
+    """
+    Create one user per entry in `sizes` (named bench_<index>_<size>) with
+    that many expenses. Returns [(user_id, username, size)].
+    """
+    rng = random.Random(seed)
+    cursor = conn.cursor()
+    users = []
+    for index, size in enumerate(sizes):
+        username = f"bench_{index}_{size}"
+        cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password_hash))
+        cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
+        user_id = cursor.fetchone()[0]
+        conn.commit()
+
+        batch = []
+        for row in generate_expenses(rng, size, years):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                ledger.insert_expenses(cursor, user_id, batch)
+                conn.commit()
+                batch.clear()
+        if batch:
+            ledger.insert_expenses(cursor, user_id, batch)
+            conn.commit()
+        if progress:
+            progress(username, size)
+        users.append((user_id, username, size))
+    return users
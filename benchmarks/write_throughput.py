@@ -0,0 +1,159 @@
+"""
+Expense insert throughput: synchronous commits against write-behind grouping.
+
+Seeds a throwaway SQLite database with one user per client, then has every
+client POST /add as fast as it can through the Flask test client, first with
+the default one-transaction-per-request path and then with the write-behind
+queue (write_behind.py). Reports inserts per second, request latency
+percentiles and, for the grouped run, how many rows shared each commit.
+Afterwards the rollups are checked against the raw rows.
+
+    python benchmarks/write_throughput.py [--clients 16] [--writes 100]
+                                          [--window-ms 10] [--batch 100]
+                                          [--synchronous FULL] [--json FILE]
+
+--synchronous sets SQLite's PRAGMA synchronous for every connection. The app
+uses NORMAL, which skips the fsync on commit in WAL mode; FULL syncs every
+commit, which is closer to what each commit costs on Access.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_clients(app, user_ids, writes):
+    """Every user posts `writes` expenses from its own thread; returns (seconds, latencies, statuses)"""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    start_line = threading.Barrier(len(user_ids) + 1)
+
+    def client_loop(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+            session['username'] = f'writer{user_id}'
+        start_line.wait()
+        for i in range(writes):
+            day = date(2026, 1, 1) + timedelta(days=i % 180)
+            started = time.perf_counter()
+            response = client.post('/add', data={'date': day.isoformat(), 'category': f'Cat{i % 7}', 'amount': f'{i % 50}.125'})
+            elapsed = time.perf_counter() - started
+            with lock:
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client_loop, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    start_line.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies, statuses
+
+
+def summarize(name, seconds, latencies, statuses):
+    inserted = statuses.get(302, 0)
+    result = {
+        'mode': name,
+        'inserted': inserted,
+        'seconds': round(seconds, 3),
+        'inserts_per_second': round(inserted / seconds, 1) if seconds else 0,
+        'latency_p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+        'latency_p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'statuses': statuses,
+    }
+    print(f"{name:>9}: {inserted} inserts in {seconds:.2f}s = {result['inserts_per_second']:.0f}/s, "
+          f"p50 {result['latency_p50_ms']:.1f} ms, p95 {result['latency_p95_ms']:.1f} ms, statuses {statuses}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--writes', type=int, default=100, help="inserts per client and mode")
+    parser.add_argument('--window-ms', type=float, default=10)
+    parser.add_argument('--batch', type=int, default=100)
+    parser.add_argument('--synchronous', default='NORMAL', choices=['OFF', 'NORMAL', 'FULL'])
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='expense-writes-')
+    os.environ['EXPENSE_DB_BACKEND'] = 'sqlite'
+    os.environ['EXPENSE_DB_PATH'] = os.path.join(tmp, 'writes.db')
+    os.environ['EXPENSE_WRITE_BEHIND'] = '0'
+    os.environ['EXPENSE_WRITE_BEHIND_WINDOW_MS'] = str(args.window_ms)
+    os.environ['EXPENSE_WRITE_BEHIND_BATCH'] = str(args.batch)
+    sys.path.insert(0, ROOT)
+    import app as expense_app
+    import rollups
+
+    backend = expense_app.db_backend
+    connect = backend.connect
+
+    def connect_with_sync():
+        conn = connect()
+        conn.execute(f"PRAGMA synchronous = {args.synchronous}")
+        return conn
+
+    backend.connect = connect_with_sync
+    expense_app.db_pool._connect = connect_with_sync
+    expense_app.ensure_database()
+
+    conn = backend.connect()
+    cursor = conn.cursor()
+    user_ids = []
+    for index in range(args.clients):
+        cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", (f'writer{index}', 'x'))
+        cursor.execute("SELECT id FROM users WHERE username = ?", (f'writer{index}',))
+        user_ids.append(cursor.fetchone()[0])
+    conn.commit()
+
+    print(f"{args.clients} clients x {args.writes} inserts, synchronous={args.synchronous}")
+    results = [summarize('sync', *run_clients(expense_app.app, user_ids, args.writes))]
+
+    expense_app.write_queue = expense_app.create_write_queue()
+    grouped = summarize('grouped', *run_clients(expense_app.app, user_ids, args.writes))
+    expense_app.write_queue.close()
+    grouped['queue'] = expense_app.write_queue.stats()
+    expense_app.write_queue = None
+    print(f"           {grouped['queue']['batches']} commits, {grouped['queue']['mean_batch']:.1f} rows each "
+          f"(largest {grouped['queue']['largest_batch']})")
+    results.append(grouped)
+
+    if results[0]['inserts_per_second']:
+        print(f"Grouped commit: {grouped['inserts_per_second'] / results[0]['inserts_per_second']:.2f}x the synchronous rate")
+
+    cursor.execute("SELECT COUNT(*) FROM expenses")
+    expected = sum(result['inserted'] for result in results)
+    stored = cursor.fetchone()[0]
+    drift = rollups.diff(cursor)
+    conn.close()
+    print(f"{stored} rows stored (expected {expected}), {len(drift)} rollup rows drifted")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'clients': args.clients, 'writes': args.writes, 'synchronous': args.synchronous,
+                       'window_ms': args.window_ms, 'batch': args.batch, 'results': results}, f, indent=2)
+    if stored != expected or drift:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
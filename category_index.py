@@ -0,0 +1,144 @@
+"""
+Per-user category list with usage counts.
+
+categories(user_id, category, usage_count) holds one row per category a user
+has expenses in, with the number of those expenses. ledger.py keeps it up to
+date in the same transaction as every expense write, so the /add and /view
+dropdowns no longer need SELECT DISTINCT over the user's whole history, and
+can list the most used categories first.
+
+On top of the table, CategoryCache keeps each user's list in memory. Routes
+invalidate a user's entry after committing a write; the TTL covers writes
+made by another process (flask import-expenses, a second server process).
+"""
+
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+def apply(cursor, user_id, changes):
+    """Apply {category: change in expense count} for one user; the caller commits"""
+    for category, change in changes.items():
+        if not change:
+            continue
+        cursor.execute(
+            "UPDATE categories SET usage_count = usage_count + ? WHERE user_id = ? AND category = ?",
+            (change, user_id, category)
+        )
+        if cursor.rowcount == 0:
+            cursor.execute(
+                "INSERT INTO categories (user_id, category, usage_count) VALUES (?, ?, ?)",
+                (user_id, category, change)
+            )
+    # Drop categories whose last expense was removed or recategorised
+    if any(change < 0 for change in changes.values()):
+        cursor.execute("DELETE FROM categories WHERE user_id = ? AND usage_count <= 0", (user_id,))
+
+
+def fetch(cursor, user_id):
+    """The user's categories, most used first"""
+    cursor.execute(
+        "SELECT category FROM categories WHERE user_id = ? ORDER BY usage_count DESC, category",
+        (user_id,)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def compute_from_expenses(cursor):
+    """{(user_id, category): count} recomputed from the raw expenses table"""
+    cursor.execute("SELECT user_id, category, COUNT(*) FROM expenses GROUP BY user_id, category")
+    return {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+
+
+def diff(cursor):
+    """
+    Compare the stored counts with a fresh computation. Returns a list of
+    ((user_id, category), stored, expected) with None for a missing row.
+    """
+    expected = compute_from_expenses(cursor)
+    cursor.execute("SELECT user_id, category, usage_count FROM categories")
+    stored = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+    return [(key, stored.get(key), expected.get(key))
+            for key in sorted(set(stored) | set(expected), key=lambda k: (k[0], str(k[1])))
+            if stored.get(key) != expected.get(key)]
+
+
+def rebuild(conn):
+    """Replace the category counts with a fresh computation in one transaction"""
+    cursor = conn.cursor()
+    computed = compute_from_expenses(cursor)
+    cursor.execute("DELETE FROM categories")
+    cursor.executemany(
+        "INSERT INTO categories (user_id, category, usage_count) VALUES (?, ?, ?)",
+        [(user_id, category, count) for (user_id, category), count in computed.items()]
+    )
+    conn.commit()
+    return len(computed)
+
+
+def needs_rebuild(cursor):
+    """True when there are expenses but no category rows yet (e.g. an upgraded database)"""
+    cursor.execute("SELECT COUNT(*) FROM categories")
+    if cursor.fetchone()[0]:
+        return False
+    cursor.execute("SELECT COUNT(*) FROM expenses")
+    return cursor.fetchone()[0] > 0
+
+
+def count_changes(rows, sign=1):
+    """{category: change} for (expense_date, category, amount) rows being added or removed"""
+    changes = defaultdict(int)
+    for row in rows:
+        changes[row[1]] += sign
+    return changes
+
+
+class CategoryCache:
+    def __init__(self, ttl=300, max_users=1024):
+        """
+        ttl: seconds an entry is trusted without a local write
+        max_users: entries kept before the least recently used is dropped
+        """
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries = OrderedDict()  # user_id -> (loaded_at, categories)
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by invalidate()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, user_id, load):
+        """The user's categories (most used first), calling load() on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and now - entry[0] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return list(entry[1])
+            self._stats['misses'] += 1
+            generation = self._generation
+
+        categories = load()
+        with self._lock:
+            # A write committed while loading may not be in `categories`; don't keep it
+            if generation != self._generation:
+                return categories
+            self._entries[user_id] = (now, list(categories))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return categories
+
+    def invalidate(self, user_id):
+        """Forget the user's list; call after committing a write"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generation += 1
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['users'] = len(self._entries)
+        return stats
@@ -0,0 +1,167 @@
+"""
+On-disk cache of rendered chart images.
+
+Charts are stored under a key made from the user, the chart type, the
+selected range and a fingerprint of the numbers being plotted, so a request
+whose data has not changed is served without running matplotlib, and two
+users never overwrite each other's images. The directory is bounded by total
+size and evicts the least recently used files first.
+
+Each chart can exist in several variants (format and resolution, see
+variant_name); every variant is a cache entry of its own. SVG files get a
+gzipped copy next to them when they are stored, counted with the entry, so
+they can be sent compressed without compressing on every request.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def chart_key(user_id, chart_type, range_key, data):
+    """Content address for one chart: sha256 of everything that affects the image"""
+    payload = json.dumps([user_id, chart_type, range_key, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def variant_name(key, fmt, dpi=None):
+    """Cache key of one rendering of chart `key`: 'key-100.webp', or 'key.svg' (no dpi)"""
+    if fmt == 'svg' or dpi is None:
+        return f"{key}.{fmt}"
+    return f"{key}-{int(dpi)}.{fmt}"
+
+
+class ChartCache:
+    def __init__(self, directory, max_bytes=100 * 1024 * 1024, extensions=('.png', '.webp', '.svg'),
+                 compress=('.svg',)):
+        """
+        Cache keys are file names with one of `extensions`; files ending in
+        one of `compress` also get a '.gz' copy.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.extensions = tuple(extensions)
+        self.compress = tuple(compress)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # filename -> size, least recently used first
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._load()
+
+    def _load(self):
+        # Pick up files from a previous run, oldest access first
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(self.extensions) and not name.startswith('.'):
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime, name, stat.st_size + self._compressed_size(name)))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._bytes += size
+        self._evict()
+
+    def filename(self, key):
+        # Keys are variant names, which already carry their extension
+        return key
+
+    def compressed(self, name):
+        """Filename of the gzipped copy of `name`, or None"""
+        if name.endswith(self.compress) and os.path.exists(os.path.join(self.directory, name + '.gz')):
+            return name + '.gz'
+        return None
+
+    def _compressed_size(self, name):
+        try:
+            return os.path.getsize(os.path.join(self.directory, name + '.gz')) if name.endswith(self.compress) else 0
+        except OSError:
+            return 0
+
+    def get(self, key):
+        """Filename of a cached chart (and mark it recently used), or None"""
+        name = self.filename(key)
+        with self._lock:
+            if name not in self._entries:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(name)
+            self._stats['hits'] += 1
+        try:
+            # Persist recency so the LRU order survives a restart
+            os.utime(os.path.join(self.directory, name))
+        except OSError:
+            with self._lock:
+                self._forget(name)
+            return None
+        return name
+
+    def temp_path(self, key):
+        """
+        Private file to render into before adopt(), so readers never see a
+        half-written image. It keeps the extension because matplotlib picks
+        the output format from it.
+        """
+        name = self.filename(key)
+        return os.path.join(self.directory, f".tmp-{os.getpid()}-{threading.get_ident()}-{name}")
+
+    def adopt(self, key, tmp_path):
+        """Move a finished render into the cache and return its filename"""
+        name = self.filename(key)
+        path = os.path.join(self.directory, name)
+        if name.endswith(self.compress):
+            # Compressed copy first, so a listed file always has it
+            with open(tmp_path, 'rb') as f:
+                data = gzip.compress(f.read(), compresslevel=9, mtime=0)
+            with open(tmp_path + '.gz', 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path + '.gz', path + '.gz')
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path) + self._compressed_size(name)
+        with self._lock:
+            self._forget(name)
+            self._entries[name] = size
+            self._bytes += size
+            self._evict()
+        return name
+
+    def put(self, key, render):
+        """Render into the cache with render(path) and return the filename"""
+        tmp_path = self.temp_path(key)
+        try:
+            render(tmp_path)
+            return self.adopt(key, tmp_path)
+        except Exception:
+            for path in (tmp_path, tmp_path + '.gz'):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+            stats['max_bytes'] = self.max_bytes
+        return stats
+
+    def _forget(self, name):
+        # Caller holds the lock
+        size = self._entries.pop(name, None)
+        if size is not None:
+            self._bytes -= size
+
+    def _evict(self):
+        # Caller holds the lock; never evicts the most recent entry
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self._stats['evictions'] += 1
+            for filename in (name, name + '.gz') if name.endswith(self.compress) else (name,):
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
@@ -0,0 +1,106 @@
+"""
+Chart rendering for the /analyze page.
+
+Each function draws one chart from already-aggregated numbers and saves it to
+`path`. They are plain module-level functions so the chart cache can call
+them only on a miss.
+
+Charts are drawn on their own matplotlib Figure objects instead of through
+pyplot, which keeps a single global "current figure". Nothing is shared
+between calls, so charts can be rendered from several request threads at once.
+
+matplotlib takes longer to import than the rest of the app put together, so
+it is only loaded by the first chart that is actually drawn (normally inside
+a render worker process).
+
+The output format follows the extension of `path`: PNG, WebP (through Pillow,
+lossless since charts are flat colours and text) or SVG (text kept as text,
+which is both smaller and sharper than glyph outlines). `dpi` only matters
+for the raster formats.
+"""
+
+import os
+
+# Dark theme shared by every chart
+THEME = {
+    'background': '#121212',
+    'text': 'white',
+    'accent': 'skyblue',
+    'dpi': 300,
+}
+
+FORMATS = {
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'svg': 'image/svg+xml',
+}
+
+_available = None
+
+
+def available_formats():
+    """Formats this install can write; WebP needs a Pillow built with libwebp"""
+    global _available
+    if _available is None:
+        formats = ['png', 'svg']
+        try:
+            from PIL import features
+            if features.check('webp'):
+                formats.insert(1, 'webp')
+        except ImportError:
+            pass
+        _available = formats
+    return _available
+
+
+def _new_figure(width, height):
+    # Figure() attaches an Agg canvas on its own; no pyplot state is involved
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(width, height), facecolor=THEME['background'])
+    ax = fig.add_subplot()
+    ax.set_facecolor(THEME['background'])
+    return fig, ax
+
+
+def _style_axes(ax, title, xlabel=None, ylabel=None):
+    ax.set_title(title, color=THEME['text'])
+    if xlabel:
+        ax.set_xlabel(xlabel, color=THEME['text'])
+    if ylabel:
+        ax.set_ylabel(ylabel, color=THEME['text'])
+    ax.tick_params(colors=THEME['text'])
+
+
+def _save(fig, path, dpi=None):
+    from matplotlib import rc_context
+    options = {'dpi': dpi or THEME['dpi'], 'bbox_inches': 'tight', 'facecolor': THEME['background']}
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.webp':
+        options['pil_kwargs'] = {'lossless': True}
+    # No timestamps or random ids, so identical charts give identical files
+    with rc_context({'svg.fonttype': 'none', 'svg.hashsalt': 'expense-tracker'}):
+        fig.savefig(path, metadata={'Date': None} if ext == '.svg' else None, **options)
+
+
+def render_pie(path, categories, amounts, dpi=None):
+    fig, ax = _new_figure(6, 6)
+    ax.pie(amounts, labels=categories, autopct='%1.1f%%', startangle=140, textprops={'color': THEME['text']})
+    ax.set_title('Current Month Breakdown', color=THEME['text'])
+    _save(fig, path, dpi)
+
+
+def render_bar(path, categories, amounts, dpi=None):
+    fig, ax = _new_figure(8, 5)
+    ax.bar(categories, amounts, color=THEME['accent'])
+    _style_axes(ax, 'Selected Period Spending', 'Category', 'Amount')
+    _save(fig, path, dpi)
+
+
+def render_trend(path, labels, values, dpi=None):
+    fig, ax = _new_figure(12, 4)
+    ax.plot(range(len(labels)), values, marker='o', color=THEME['accent'])
+    _style_axes(ax, 'Monthly Spending Trend', 'Month', 'Total Spend')
+    # Show every month label (rotate for readability)
+    ax.set_xticks(range(len(labels)), labels, rotation=45)
+    fig.tight_layout()
+    _save(fig, path, dpi)
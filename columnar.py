@@ -0,0 +1,229 @@
+"""
+In-memory columnar copy of each user's expenses for /analyze.
+
+A user's expenses are loaded once into three NumPy columns:
+
+    days        int32  days since 1970-01-01
+    amounts     int64  fils, as stored (see money.py), so sums are exact
+    codes       int32  index into the user's category list
+
+Range, month and category totals are then a boolean mask plus np.bincount
+instead of a Python loop over rows. ColumnarStore keeps the users' columns
+under a memory cap (least recently used users are dropped first). Columns
+are tagged with the user's data version (see data_versions.py), like
+daily_index.PrefixIndex, and reloaded when it has moved on. app.py applies
+each committed local write to a resident user together with the version the
+write committed at: the change is only applied to columns exactly one version
+behind it, columns already at (or past) it include the write, and anything
+else (a write from another process in between) drops the user so the next
+query reloads.
+
+NumPy is optional: app.py only imports this module when it is installed and
+the cache is enabled.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+
+import analytics
+import data_versions
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Initial column capacity; columns double when full
+MIN_CAPACITY = 64
+
+
+class UserColumns:
+    def __init__(self, capacity=MIN_CAPACITY, version=0):
+        self.version = version
+        self.size = 0
+        self.days = np.zeros(capacity, dtype=np.int32)
+        self.amounts = np.zeros(capacity, dtype=np.int64)
+        self.codes = np.zeros(capacity, dtype=np.int32)
+        self.categories = []  # code -> category name
+        self._code_of = {}
+
+    @classmethod
+    def from_rows(cls, rows, version=0):
+        """Columns for (expense_date, category, amount) rows; unparseable dates are skipped"""
+        rows = list(rows)
+        columns = cls(max(MIN_CAPACITY, len(rows)), version)
+        for expense_date, category, amount in rows:
+            columns.append(expense_date, category, amount)
+        return columns
+
+    @property
+    def nbytes(self):
+        return self.days.nbytes + self.amounts.nbytes + self.codes.nbytes
+
+    def _code(self, category):
+        code = self._code_of.get(category)
+        if code is None:
+            code = self._code_of[category] = len(self.categories)
+            self.categories.append(category)
+        return code
+
+    def _grow(self):
+        capacity = max(MIN_CAPACITY, len(self.days) * 2)
+        for name in ('days', 'amounts', 'codes'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def append(self, expense_date, category, amount):
+        d = analytics.parse_expense_date(expense_date)
+        if d is None:
+            return
+        if self.size == len(self.days):
+            self._grow()
+        i = self.size
+        self.days[i] = d.toordinal() - EPOCH_ORDINAL
+        self.amounts[i] = amount
+        self.codes[i] = self._code(category)
+        self.size += 1
+
+    def remove(self, expense_date, category, amount):
+        """Remove one matching expense (the last row takes its place); False if none matches"""
+        d = analytics.parse_expense_date(expense_date)
+        code = self._code_of.get(category)
+        if d is None or code is None:
+            return False
+        n = self.size
+        matches = np.flatnonzero(
+            (self.days[:n] == d.toordinal() - EPOCH_ORDINAL)
+            & (self.codes[:n] == code)
+            & (self.amounts[:n] == amount)
+        )
+        if not len(matches):
+            return False
+        i, last = matches[0], n - 1
+        self.days[i], self.amounts[i], self.codes[i] = self.days[last], self.amounts[last], self.codes[last]
+        self.size = last
+        return True
+
+    def category_totals(self, start_date=None, end_date=None):
+        """{category: total} for expenses dated start_date..end_date (inclusive)"""
+        n = self.size
+        codes, amounts = self.codes[:n], self.amounts[:n]
+        if start_date is not None or end_date is not None:
+            days = self.days[:n]
+            mask = np.ones(n, dtype=bool)
+            if start_date is not None:
+                mask &= days >= start_date.toordinal() - EPOCH_ORDINAL
+            if end_date is not None:
+                mask &= days <= end_date.toordinal() - EPOCH_ORDINAL
+            codes, amounts = codes[mask], amounts[mask]
+
+        width = len(self.categories)
+        counts = np.bincount(codes, minlength=width)
+        # bincount adds in float64, which is exact for whole fils below 2**53
+        sums = np.bincount(codes, weights=amounts, minlength=width)
+        return {self.categories[code]: int(sums[code]) for code in np.flatnonzero(counts)}
+
+    def month_rows(self):
+        """(year, month, category, total) rows, the same shape as rollups.fetch()"""
+        n = self.size
+        if not n:
+            return []
+        # Months since 1970-01 for every row, then one bucket per (month, category)
+        months = self.days[:n].astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        first = int(months.min())
+        width = len(self.categories)
+        buckets = (months - first) * width + self.codes[:n]
+        counts = np.bincount(buckets)
+        sums = np.bincount(buckets, weights=self.amounts[:n])
+
+        rows = []
+        for bucket in np.flatnonzero(counts):
+            month_index, code = divmod(int(bucket), width)
+            year, month = divmod(first + month_index, 12)
+            rows.append((1970 + year, month + 1, self.categories[code], int(sums[bucket])))
+        return rows
+
+
+class ColumnarStore:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._users = OrderedDict()  # user_id -> UserColumns, least recently used first
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'loads': 0, 'reloads': 0, 'unsettled': 0, 'evictions': 0, 'writes': 0, 'dropped': 0}
+
+    def query(self, cursor, user_id, func):
+        """
+        func(columns) for the user's columns, loading them with `cursor` when
+        absent or their data version has changed. func runs under the store
+        lock so writes can't change the columns halfway through.
+        """
+        version = data_versions.fetch(cursor, user_id)
+        with self._lock:
+            columns = self._users.get(user_id)
+            if columns is not None and columns.version == version:
+                self._users.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return func(columns)
+
+        cursor.execute("SELECT expense_date, category, amount FROM expenses WHERE user_id = ?", (user_id,))
+        fresh = UserColumns.from_rows(cursor.fetchall(), version)
+        # The rows may include writes committed after the version was read;
+        # only columns known to be exactly that version can take apply() later
+        if data_versions.fetch(cursor, user_id) != version:
+            with self._lock:
+                self._stats['unsettled'] += 1
+                return func(fresh)
+        with self._lock:
+            self._stats['reloads' if columns is not None else 'loads'] += 1
+            self._users[user_id] = fresh
+            self._users.move_to_end(user_id)
+            self._evict()
+            return func(fresh)
+
+    def _evict(self):
+        # Caller holds the lock; the user just loaded is always kept
+        used = sum(columns.nbytes for columns in self._users.values())
+        while used > self.max_bytes and len(self._users) > 1:
+            _, columns = self._users.popitem(last=False)
+            used -= columns.nbytes
+            self._stats['evictions'] += 1
+
+    def apply(self, user_id, version, removed=(), added=()):
+        """
+        Apply a write that committed at data version `version` to a resident
+        user: `removed` and `added` are (expense_date, category, amount) rows.
+        Users not in memory are skipped.
+        """
+        with self._lock:
+            columns = self._users.get(user_id)
+            if columns is None or columns.version >= version:
+                # Not loaded, or loaded after this write committed
+                return
+            if columns.version != version - 1:
+                # Another write landed in between; load again on next use
+                del self._users[user_id]
+                self._stats['dropped'] += 1
+                return
+            self._stats['writes'] += 1
+            for row in removed:
+                if not columns.remove(*row):
+                    # Out of step; load again on next use
+                    del self._users[user_id]
+                    return
+            for row in added:
+                columns.append(*row)
+            columns.version = version
+            self._evict()
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['users'] = len(self._users)
+            stats['bytes'] = sum(columns.nbytes for columns in self._users.values())
+            stats['max_bytes'] = self.max_bytes
+        return stats
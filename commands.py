@@ -0,0 +1,190 @@
+"""
+Maintenance commands, run through the Flask CLI:
+
+    flask --app app migrate-dates [--dry-run]
+    flask --app app rebuild-rollups [--verify]
+    flask --app app import-expenses FILE --user USERNAME [--batch-size N]
+    flask --app app move-user USERNAME SHARD
+    flask --app app rebalance-shards [--home] [--dry-run]
+
+With sharding on (see sharding.py) migrate-dates and rebuild-rollups run
+over every shard database, and import-expenses writes to the user's shard.
+"""
+
+import click
+
+import analytics
+import category_index
+import daily_index
+import importer
+import rollups
+import sharding
+import storage
+
+
+def register_commands(app, backend, prepare=None, router=None):
+    """
+    Attach the maintenance commands to `app`, operating on `backend`.
+    prepare() is called before a command opens the database (schema creation).
+    router is the ShardRouter when sharding is on.
+    """
+
+    def connect():
+        if prepare is not None:
+            prepare()
+        return backend.connect()
+
+    def databases():
+        """[(label, backend)] of every database holding expenses"""
+        if prepare is not None:
+            prepare()
+        if router is None:
+            return [('', backend)]
+        return [(f"[{shard}] ", router.backend(shard)) for shard in router.shards()]
+
+    def require_router():
+        if router is None:
+            click.echo("⚠ Sharding is off; set EXPENSE_SHARDS first")
+            raise SystemExit(1)
+
+    @app.cli.command('migrate-dates')
+    @click.option('--dry-run', is_flag=True, help="Only report rows that cannot be converted.")
+    def migrate_dates(dry_run):
+        """Convert text expense dates into a native DATE column."""
+        for label, db in databases():
+            conn = db.connect()
+            try:
+                if db.has_native_dates(conn):
+                    click.echo(f"{label}✓ expense_date is already a DATE column, nothing to do")
+                    continue
+
+                cursor = conn.cursor()
+                cursor.execute("SELECT id, user_id, expense_date FROM expenses")
+                rows = cursor.fetchall()
+                unparseable = [row for row in rows if analytics.parse_expense_date(row[2]) is None]
+                for row in unparseable:
+                    click.echo(f"  cannot parse expense {row[0]} (user {row[1]}): {row[2]!r}")
+
+                if dry_run:
+                    click.echo(f"{label}{len(rows) - len(unparseable)} of {len(rows)} rows can be converted")
+                    continue
+
+                converted, rejected = db.migrate_expense_dates(conn, analytics.parse_expense_date)
+                click.echo(f"{label}✓ Converted {converted} expense dates")
+                if rejected:
+                    click.echo(f"{label}⚠ {len(rejected)} rows could not be parsed and were moved to {storage.REJECTED_TABLE}")
+            finally:
+                conn.close()
+
+    @app.cli.command('rebuild-rollups')
+    @click.option('--verify', is_flag=True, help="Only compare the derived tables with the raw expenses and report drift.")
+    def rebuild_rollups(verify):
+        """Recompute monthly_rollups, daily_rollups and the category counts from the expenses table."""
+        drifted = False
+        for label, db in databases():
+            conn = db.connect()
+            try:
+                drift = rollups.diff(conn.cursor())
+                for (user_id, year, month, category), stored, expected in drift:
+                    click.echo(f"  user {user_id} {year}-{month:02d} {category}: stored {stored}, expected {expected}")
+                daily_drift = daily_index.diff(conn.cursor())
+                for (user_id, day, category), stored, expected in daily_drift:
+                    click.echo(f"  user {user_id} {day} {category}: stored {stored}, expected {expected}")
+                category_drift = category_index.diff(conn.cursor())
+                for (user_id, category), stored, expected in category_drift:
+                    click.echo(f"  user {user_id} category {category}: stored {stored} uses, expected {expected}")
+                if verify:
+                    if drift or daily_drift or category_drift:
+                        click.echo(f"{label}⚠ {len(drift)} rollup rows, {len(daily_drift)} daily rows and "
+                                   f"{len(category_drift)} category counts drifted from the raw expenses")
+                        drifted = True
+                    else:
+                        click.echo(f"{label}✓ Rollups, daily totals and category counts match the raw expenses")
+                    continue
+
+                count = rollups.rebuild(conn)
+                click.echo(f"{label}✓ Rebuilt {count} rollup rows ({len(drift)} had drifted)")
+                count = daily_index.rebuild(conn)
+                click.echo(f"{label}✓ Rebuilt {count} daily rows ({len(daily_drift)} had drifted)")
+                count = category_index.rebuild(conn)
+                click.echo(f"{label}✓ Rebuilt {count} category counts ({len(category_drift)} had drifted)")
+            finally:
+                conn.close()
+        if drifted:
+            raise SystemExit(1)
+
+    @app.cli.command('import-expenses')
+    @click.argument('file', type=click.File('r', encoding='utf-8-sig', lazy=False))
+    @click.option('--user', 'username', required=True, help="Username the expenses belong to.")
+    @click.option('--batch-size', default=1000, show_default=True, help="Rows inserted per transaction.")
+    def import_expenses(file, username, batch_size):
+        """Import DD-MM-YYYY,Category,amount lines from FILE ('-' for stdin)."""
+        conn = connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
+            row = cursor.fetchone()
+            if not row:
+                click.echo(f"⚠ No user named {username!r}")
+                raise SystemExit(1)
+
+            def progress(result):
+                click.echo(f"  {result.inserted} rows imported ({result.rejected} rejected)")
+
+            if router is not None:
+                conn.close()
+                conn = router.backend(router.shard_of(row[0])).connect()
+            result = importer.import_expenses(conn, row[0], file, batch_size=batch_size, progress=progress)
+            for line_number, text, reason in result.rejected_lines:
+                click.echo(f"  line {line_number}: {reason}: {text!r}")
+            if result.rejected > len(result.rejected_lines):
+                click.echo(f"  ... and {result.rejected - len(result.rejected_lines)} more")
+            click.echo(f"✓ Imported {result.inserted} expenses in {result.batches} batches")
+            if result.rejected:
+                click.echo(f"⚠ {result.rejected} lines were rejected")
+        finally:
+            conn.close()
+
+    def find_user(username):
+        conn = connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
+            row = cursor.fetchone()
+        finally:
+            conn.close()
+        if not row:
+            click.echo(f"⚠ No user named {username!r}")
+            raise SystemExit(1)
+        return row[0]
+
+    @app.cli.command('move-user')
+    @click.argument('username')
+    @click.argument('shard')
+    def move_user(username, shard):
+        """Move USERNAME's expenses to SHARD ('home', 'shard-N' or 'user-ID') while the app keeps running."""
+        require_router()
+        user_id = find_user(username)
+        try:
+            sharding.check_target(shard, router.mode, user_id)
+        except ValueError as e:
+            click.echo(f"⚠ {e}")
+            raise SystemExit(1)
+        source = router.shard_of(user_id)
+        moved = router.move_user(user_id, shard)
+        click.echo(f"✓ Moved {moved} expenses of {username} from {source} to {shard}")
+
+    @app.cli.command('rebalance-shards')
+    @click.option('--home', is_flag=True, help="Move everyone back into the home database (before turning sharding off).")
+    @click.option('--dry-run', is_flag=True, help="Only list the moves.")
+    def rebalance_shards(home, dry_run):
+        """Move every user who is not on the shard EXPENSE_SHARDS places them on."""
+        require_router()
+        moves = router.misplaced(sharding.HOME if home else None)
+        for user_id, username, source, target in moves:
+            if dry_run:
+                click.echo(f"  {username} (user {user_id}): {source} -> {target}")
+                continue
+            moved = router.move_user(user_id, target)
+            click.echo(f"  {username} (user {user_id}): {source} -> {target}, {moved} expenses")
+        click.echo(f"✓ {len(moves)} users {'to move' if dry_run else 'moved'}")
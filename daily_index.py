@@ -0,0 +1,216 @@
+"""
+Per-user daily totals and prefix sums for arbitrary date ranges.
+
+daily_rollups(user_id, expense_date, category, total, count) is updated by
+ledger.py in the same transaction as every expense write, like the monthly
+rollups but one bucket per day.
+
+PrefixIndex turns a user's daily rows into cumulative totals, overall and per
+category, kept in memory as int64 fils (see money.py) so differences are
+exact. Only days that have expenses are stored, as sorted day numbers next to
+their running totals, so the size follows the number of active days rather
+than the span between the first and last date. The total for any start..end
+range is then two binary searches and a subtraction, whatever the length of
+the range. The index is bounded by users and by bytes.
+Entries are tagged with the user's data version (see data_versions.py) and
+rebuilt from the daily rows when it has moved on, which also covers writes
+made by other processes.
+"""
+
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, defaultdict
+from itertools import accumulate
+
+import analytics
+import data_versions
+
+
+def new_deltas():
+    """Accumulator of (day, category) -> [total, count] changes"""
+    return defaultdict(lambda: [0, 0])
+
+
+def add_delta(deltas, expense_date, category, amount, sign=1):
+    """Record one expense being added (sign=1) or removed (sign=-1)"""
+    d = analytics.parse_expense_date(expense_date)
+    if d is None:
+        return
+    delta = deltas[(d, category)]
+    delta[0] += sign * amount
+    delta[1] += sign
+
+
+def apply(cursor, user_id, deltas):
+    """Apply accumulated deltas for one user; the caller commits"""
+    for (day, category), (total, count) in deltas.items():
+        if not count and not total:
+            continue
+        cursor.execute(
+            "UPDATE daily_rollups SET total = total + ?, [count] = [count] + ? "
+            "WHERE user_id = ? AND expense_date = ? AND category = ?",
+            (total, count, user_id, day, category)
+        )
+        if cursor.rowcount == 0:
+            cursor.execute(
+                "INSERT INTO daily_rollups (user_id, expense_date, category, total, [count]) VALUES (?, ?, ?, ?, ?)",
+                (user_id, day, category, total, count)
+            )
+    if any(count < 0 for _, count in deltas.values()):
+        cursor.execute("DELETE FROM daily_rollups WHERE user_id = ? AND [count] <= 0", (user_id,))
+
+
+def compute_from_expenses(cursor):
+    """{(user_id, day, category): [total, count]} recomputed from the raw expenses table"""
+    cursor.execute(
+        "SELECT user_id, expense_date, category, SUM(amount), COUNT(*) FROM expenses "
+        "GROUP BY user_id, expense_date, category"
+    )
+    computed = defaultdict(lambda: [0, 0])
+    for user_id, expense_date, category, total, count in cursor.fetchall():
+        d = analytics.parse_expense_date(expense_date)
+        if d is None:
+            continue
+        bucket = computed[(user_id, d, category)]
+        bucket[0] += total
+        bucket[1] += count
+    return computed
+
+
+def diff(cursor):
+    """
+    Compare the stored daily rows with a fresh computation. Returns a list of
+    ((user_id, day, category), stored, expected) with (total, count) or None.
+    """
+    expected = compute_from_expenses(cursor)
+    cursor.execute("SELECT user_id, expense_date, category, total, [count] FROM daily_rollups")
+    stored = {(r[0], analytics.parse_expense_date(r[1]), r[2]): (r[3], r[4]) for r in cursor.fetchall()}
+
+    drift = []
+    for key in sorted(set(stored) | set(expected), key=lambda k: tuple(str(part) for part in k)):
+        have = stored.get(key)
+        want = tuple(expected[key]) if key in expected else None
+        if have is None or want is None or have != want:
+            drift.append((key, have, want))
+    return drift
+
+
+def rebuild(conn):
+    """Replace the daily rows with a fresh computation in one transaction"""
+    cursor = conn.cursor()
+    computed = compute_from_expenses(cursor)
+    cursor.execute("DELETE FROM daily_rollups")
+    cursor.executemany(
+        "INSERT INTO daily_rollups (user_id, expense_date, category, total, [count]) VALUES (?, ?, ?, ?, ?)",
+        [(user_id, day, category, total, count) for (user_id, day, category), (total, count) in computed.items()]
+    )
+    conn.commit()
+    return len(computed)
+
+
+def needs_rebuild(cursor):
+    """True when there are expenses but no daily rows yet (e.g. an upgraded database)"""
+    cursor.execute("SELECT COUNT(*) FROM daily_rollups")
+    if cursor.fetchone()[0]:
+        return False
+    cursor.execute("SELECT COUNT(*) FROM expenses")
+    return cursor.fetchone()[0] > 0
+
+
+class UserPrefixSums:
+    """Cumulative daily totals for one user, from their (day, category, total) rows"""
+
+    def __init__(self, rows, version):
+        self.version = version
+        by_day = defaultdict(lambda: defaultdict(int))  # category -> {day ordinal: total}
+        overall = defaultdict(int)
+        for expense_date, category, total in rows:
+            d = analytics.parse_expense_date(expense_date)
+            if d is not None:
+                by_day[category][d.toordinal()] += total
+                overall[d.toordinal()] += total
+
+        # Only days with expenses are kept: (days, cum) where cum[i] is the
+        # total of the first i of those days, so cum[0] == 0
+        self.by_category = {category: self._cumulative(days) for category, days in by_day.items()}
+        self.overall = self._cumulative(overall)
+
+    @staticmethod
+    def _cumulative(totals):
+        days = sorted(totals)
+        return array('l', days), array('q', accumulate((totals[day] for day in days), initial=0))
+
+    @property
+    def nbytes(self):
+        return sum(days.itemsize * len(days) + cum.itemsize * len(cum)
+                   for days, cum in [self.overall, *self.by_category.values()])
+
+    @staticmethod
+    def _range(sums, start_date, end_date):
+        # Sum of the days in start_date..end_date: two binary searches
+        days, cum = sums
+        lo = bisect_left(days, start_date.toordinal())
+        hi = bisect_right(days, end_date.toordinal())
+        return cum[hi] - cum[lo] if hi > lo else 0
+
+    def total(self, start_date, end_date, category=None):
+        """Total for start_date..end_date (inclusive), overall or for one category"""
+        sums = self.overall if category is None else self.by_category.get(category)
+        if sums is None:
+            return 0
+        return self._range(sums, start_date, end_date)
+
+    def category_totals(self, start_date, end_date):
+        """{category: total} for start_date..end_date, categories with expenses only"""
+        totals = {}
+        for category, sums in self.by_category.items():
+            total = self._range(sums, start_date, end_date)
+            if total:
+                totals[category] = total
+        return totals
+
+
+class PrefixIndex:
+    def __init__(self, max_users=256, max_bytes=32 * 1024 * 1024):
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self._users = OrderedDict()  # user_id -> UserPrefixSums, least recently used first
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'builds': 0, 'evictions': 0}
+
+    def get(self, cursor, user_id):
+        """The user's prefix sums, rebuilt with `cursor` when their data version has changed"""
+        # Read the version first: rows read afterwards are at least that new
+        version = data_versions.fetch(cursor, user_id)
+        with self._lock:
+            sums = self._users.get(user_id)
+            if sums is not None and sums.version == version:
+                self._users.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return sums
+
+        cursor.execute("SELECT expense_date, category, total FROM daily_rollups WHERE user_id = ?", (user_id,))
+        sums = UserPrefixSums(cursor.fetchall(), version)
+        with self._lock:
+            self._stats['builds'] += 1
+            self._users[user_id] = sums
+            self._users.move_to_end(user_id)
+            self._evict()
+        return sums
+
+    def _evict(self):
+        # Caller holds the lock; the user just built is always kept
+        used = sum(sums.nbytes for sums in self._users.values())
+        while (len(self._users) > self.max_users or used > self.max_bytes) and len(self._users) > 1:
+            _, sums = self._users.popitem(last=False)
+            used -= sums.nbytes
+            self._stats['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['users'] = len(self._users)
+            stats['bytes'] = sum(sums.nbytes for sums in self._users.values())
+            stats['max_bytes'] = self.max_bytes
+        return stats
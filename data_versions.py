@@ -0,0 +1,47 @@
+"""
+Per-user data version, for conditional GETs.
+
+data_versions(user_id, version) is bumped by ledger.py in the same
+transaction as every expense write (the routes, imports and the CLI all go
+through it). app.py builds the ETags of /view, /analyze and the JSON
+endpoints from the user's version plus the request's arguments, so a
+browser revalidating an unchanged page gets a 304 after a single primary
+key lookup instead of the queries, aggregation and template rendering.
+
+When sharding moves a user to another database (see sharding.py), the old
+database keeps a MOVED tombstone for them. A write that was already routed
+there before the move fails with UserMoved instead of landing in a database
+nobody reads any more.
+"""
+
+import hashlib
+import json
+
+MOVED = -1
+
+
+class UserMoved(Exception):
+    """Raised when writing to a database a user has been moved out of"""
+
+
+def bump(cursor, user_id):
+    """Mark the user's expenses as changed; the caller commits"""
+    cursor.execute("UPDATE data_versions SET version = version + 1 WHERE user_id = ? AND version >= 0", (user_id,))
+    if cursor.rowcount == 0:
+        cursor.execute("SELECT version FROM data_versions WHERE user_id = ?", (user_id,))
+        if cursor.fetchone() is not None:
+            raise UserMoved(f"user {user_id} has been moved to another database")
+        cursor.execute("INSERT INTO data_versions (user_id, version) VALUES (?, ?)", (user_id, 1))
+
+
+def fetch(cursor, user_id):
+    """The user's current version (0 before their first write)"""
+    cursor.execute("SELECT version FROM data_versions WHERE user_id = ?", (user_id,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def etag(user_id, version, *parts):
+    """Opaque ETag value for a response derived from `version` and `parts`"""
+    payload = json.dumps([user_id, version, parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
@@ -0,0 +1,77 @@
+"""
+Streaming exports of a user's expenses.
+
+The generators here are handed straight to a Flask Response: rows are pulled
+from the database cursor with fetchmany and written out one line at a time,
+so an export never holds more than one chunk of history in memory.
+Amounts are written as exact decimal strings ('12.345', see money.py) in
+both CSV and JSON Lines, never through a float.
+"""
+
+import csv
+import io
+import json
+
+import analytics
+import money
+import pagination
+
+CSV_HEADER = ('id', 'date', 'category', 'amount')
+AGGREGATE_HEADER = ('section', 'period', 'category', 'total')
+
+
+def iter_expenses(cursor, user_id, filters, chunk_size=500):
+    """The user's expenses matching `filters` as (id, date, category, amount), oldest first"""
+    where, params = pagination.filter_clause(user_id, filters)
+    cursor.execute(
+        "SELECT id, expense_date, category, amount FROM expenses "
+        f"WHERE {' AND '.join(where)} ORDER BY expense_date, id",
+        params
+    )
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for row in rows:
+            expense_date = analytics.parse_expense_date(row[1])
+            yield row[0], expense_date.isoformat() if expense_date else str(row[1]), row[2], money.format_fils(row[3])
+
+
+def iter_aggregates(analysis, category=None):
+    """
+    Rows of (section, period, category, total) with the groupings shown on
+    /analyze: current month, selected period and year to date per category,
+    plus the monthly trend. `category` limits the per-category sections.
+    """
+    today = analysis['today']
+    period = f"{analysis['start_date'].isoformat()}..{analysis['end_date'].isoformat()}"
+    sections = (
+        ('current_month', today.strftime('%Y-%m'), analysis['current_month_totals']),
+        ('period', period, analysis['range_totals']),
+        ('year_to_date', str(today.year), analysis['year_totals']),
+    )
+    for section, label, totals in sections:
+        for name, total in sorted(totals.items()):
+            if category is None or name == category:
+                yield section, label, name, money.format_fils(total)
+    for month, total in analysis['monthly_series']:
+        yield 'monthly', month.strftime('%Y-%m'), '', money.format_fils(total)
+
+
+def csv_lines(header, rows):
+    """CSV text for `header` and `rows`, one line per chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue()
+
+
+def jsonl_lines(header, rows):
+    """One JSON object per row, keyed by `header`"""
+    for row in rows:
+        yield json.dumps(dict(zip(header, row))) + '\n'
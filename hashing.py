@@ -0,0 +1,114 @@
+"""
+Password hashing off the request threads.
+
+bcrypt is slow on purpose (a few hundred milliseconds of CPU per hash at the
+default cost), so a burst of logins used to tie up every request thread.
+PasswordHasher runs the hashes on a small, fixed set of worker threads (bcrypt
+releases the GIL while it works) and refuses new work with HashingBusy once
+`max_queue` hashes are already waiting, which app.py turns into a 503. The
+request thread still waits for its hash, so app.py keeps workers + max_queue
+below the number of server threads.
+
+Hashes are standard "$2b$<cost>$..." strings, the same ones Flask-Bcrypt
+produced, so existing accounts keep working. needs_rehash() tells login when a
+stored hash was made with a different cost than the configured one.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full"""
+
+
+def _hash(password, rounds):
+    import bcrypt
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _verify(password, hashed):
+    import bcrypt
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    except ValueError:
+        # Not a bcrypt hash
+        return False
+
+
+def hash_cost(hashed):
+    """The cost factor a "$2b$12$..." hash was made with, or None"""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    def __init__(self, rounds=12, workers=2, max_queue=2, timeout=30):
+        """
+        rounds: bcrypt cost factor for new hashes (each step doubles the work)
+        workers: hashes computed at the same time
+        max_queue: hashes allowed to wait for a worker before HashingBusy
+        timeout: seconds a request waits for its hash
+        """
+        if workers < 1:
+            raise ValueError("At least one hashing worker is needed")
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._stats = {'hashed': 0, 'verified': 0, 'rejected': 0, 'rehashed': 0}
+
+    def _run(self, stat, func, *args):
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self._stats['rejected'] += 1
+                raise HashingBusy()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+            self._in_flight += 1
+            self._stats[stat] += 1
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(self._done)
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            raise HashingBusy()
+
+    def _done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def hash(self, password):
+        return self._run('hashed', _hash, password, self.rounds)
+
+    def verify(self, password, hashed):
+        return self._run('verified', _verify, password, hashed)
+
+    def needs_rehash(self, hashed):
+        return hash_cost(hashed) != self.rounds
+
+    def rehash(self, password):
+        """A new hash at the configured cost for a password that just verified"""
+        with self._lock:
+            self._stats['rehashed'] += 1
+        return self.hash(password)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = self._in_flight
+            stats['workers'] = self.workers
+            stats['max_queue'] = self.max_queue
+            stats['rounds'] = self.rounds
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
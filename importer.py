@@ -0,0 +1,88 @@
+"""
+Streaming CSV import of expenses.
+
+Files use the same layout as expenses.txt, one expense per line:
+
+    DD-MM-YYYY,Category,amount
+
+(YYYY-MM-DD and DD/MM/YYYY dates are accepted too, and a header line is
+skipped). The input is read line by line, so large bank exports never have to
+fit in memory; valid rows are inserted with executemany in batches, each batch
+in its own transaction together with its rollup updates.
+"""
+
+import csv
+
+import analytics
+import ledger
+import money
+
+# Rejected lines kept for the report; the count keeps going past this
+MAX_REPORTED_REJECTS = 100
+
+
+class ImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.rejected_lines = []  # (line_number, text, reason)
+
+    def reject(self, line_number, fields, reason):
+        self.rejected += 1
+        if len(self.rejected_lines) < MAX_REPORTED_REJECTS:
+            self.rejected_lines.append((line_number, ','.join(fields), reason))
+
+
+def parse_row(fields):
+    """(expense_date, category, amount) from CSV fields, or ValueError with the reason"""
+    if len(fields) != 3:
+        raise ValueError(f"expected 3 fields, got {len(fields)}")
+    raw_date, category, raw_amount = (field.strip() for field in fields)
+
+    expense_date = analytics.parse_expense_date(raw_date)
+    if expense_date is None:
+        raise ValueError(f"unrecognised date '{raw_date}'")
+    analytics.check_expense_date(expense_date)
+    if not category:
+        raise ValueError("missing category")
+    return expense_date, category, money.parse_amount(raw_amount)
+
+
+def import_expenses(conn, user_id, lines, batch_size=1000, progress=None, on_commit=None):
+    """
+    Import expenses for `user_id` from an iterable of CSV text lines.
+    on_commit() and then progress(result) are called after every committed batch.
+    """
+    result = ImportResult()
+    cursor = conn.cursor()
+    batch = []
+
+    def flush():
+        ledger.insert_expenses(cursor, user_id, batch)
+        conn.commit()
+        if on_commit:
+            on_commit()
+        result.inserted += len(batch)
+        result.batches += 1
+        batch.clear()
+        if progress:
+            progress(result)
+
+    for line_number, fields in enumerate(csv.reader(lines), start=1):
+        if not fields or not ''.join(fields).strip():
+            continue
+        try:
+            batch.append(parse_row(fields))
+        except ValueError as e:
+            # A first line that is not an expense is taken to be a header
+            if line_number == 1 and analytics.parse_expense_date(fields[0].strip()) is None:
+                continue
+            result.reject(line_number, fields, str(e))
+            continue
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+    return result
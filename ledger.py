@@ -0,0 +1,175 @@
+"""
+Expense write path.
+
+Routes change expenses only through these functions so that everything
+derived from the expenses table (the monthly and daily rollups, the
+per-user category counts and the user's data version) is updated with the
+same cursor, inside the same transaction. The caller commits.
+
+The bulk functions act on a list of ids or on every expense matching
+/view-style filters. They read the affected rows once (for the rollup and
+category deltas) and write them with a single executemany, always scoped to
+the user's own rows.
+"""
+
+from datetime import timedelta
+
+import analytics
+import category_index
+import daily_index
+import data_versions
+import pagination
+import rollups
+
+# Ids per SELECT ... IN (...) when reading the rows of a bulk change
+SELECT_CHUNK = 500
+
+
+def _apply_changes(cursor, user_id, removed, added):
+    # Everything derived from the expenses, for (expense_date, category, amount) rows
+    deltas = rollups.new_deltas()
+    daily = daily_index.new_deltas()
+    changes = category_index.count_changes(removed, sign=-1)
+    for expense_date, category, amount in removed:
+        rollups.add_delta(deltas, expense_date, category, amount, sign=-1)
+        daily_index.add_delta(daily, expense_date, category, amount, sign=-1)
+    for expense_date, category, amount in added:
+        rollups.add_delta(deltas, expense_date, category, amount)
+        daily_index.add_delta(daily, expense_date, category, amount)
+        changes[category] += 1
+    rollups.apply(cursor, user_id, deltas)
+    daily_index.apply(cursor, user_id, daily)
+    category_index.apply(cursor, user_id, changes)
+    data_versions.bump(cursor, user_id)
+
+
+def insert_expense(cursor, user_id, expense_date, category, amount):
+    cursor.execute(
+        "INSERT INTO expenses (expense_date, category, amount, user_id) VALUES (?, ?, ?, ?)",
+        (expense_date, category, amount, user_id)
+    )
+    _apply_changes(cursor, user_id, [], [(expense_date, category, amount)])
+
+
+def insert_expenses(cursor, user_id, rows):
+    """Insert many (expense_date, category, amount) rows with one executemany"""
+    cursor.executemany(
+        "INSERT INTO expenses (expense_date, category, amount, user_id) VALUES (?, ?, ?, ?)",
+        [(expense_date, category, amount, user_id) for expense_date, category, amount in rows]
+    )
+    _apply_changes(cursor, user_id, [], rows)
+
+
+def update_expense(cursor, user_id, expense_id, expense_date, category, amount):
+    """
+    Returns the previous (expense_date, category, amount), or None when the
+    expense does not exist or belongs to another user
+    """
+    cursor.execute(
+        "SELECT expense_date, category, amount FROM expenses WHERE id = ? AND user_id = ?",
+        (expense_id, user_id)
+    )
+    old = cursor.fetchone()
+    if not old:
+        return None
+
+    cursor.execute(
+        "UPDATE expenses SET expense_date = ?, category = ?, amount = ? WHERE id = ? AND user_id = ?",
+        (expense_date, category, amount, expense_id, user_id)
+    )
+    _apply_changes(cursor, user_id, [tuple(old)], [(expense_date, category, amount)])
+    return tuple(old)
+
+
+def delete_expense(cursor, user_id, expense_id):
+    """
+    Returns the deleted (expense_date, category, amount), or None when the
+    expense does not exist or belongs to another user
+    """
+    cursor.execute(
+        "SELECT expense_date, category, amount FROM expenses WHERE id = ? AND user_id = ?",
+        (expense_id, user_id)
+    )
+    old = cursor.fetchone()
+    if not old:
+        return None
+
+    cursor.execute("DELETE FROM expenses WHERE id = ? AND user_id = ?", (expense_id, user_id))
+    _apply_changes(cursor, user_id, [tuple(old)], [])
+    return tuple(old)
+
+
+def select_expenses(cursor, user_id, ids=None, filters=None):
+    """
+    The user's (id, expense_date, category, amount) rows with the given ids,
+    or matching `filters` (see pagination.parse_filters) when ids is None.
+    Ids of other users' expenses are silently ignored.
+    """
+    if ids is None:
+        where, params = pagination.filter_clause(user_id, filters)
+        cursor.execute(f"SELECT id, expense_date, category, amount FROM expenses WHERE {' AND '.join(where)}", params)
+        return cursor.fetchall()
+
+    ids = list(dict.fromkeys(ids))
+    rows = []
+    for i in range(0, len(ids), SELECT_CHUNK):
+        chunk = ids[i:i + SELECT_CHUNK]
+        cursor.execute(
+            "SELECT id, expense_date, category, amount FROM expenses "
+            f"WHERE user_id = ? AND id IN ({', '.join('?' * len(chunk))})",
+            [user_id] + chunk
+        )
+        rows.extend(cursor.fetchall())
+    return rows
+
+
+def delete_expenses(cursor, user_id, ids=None, filters=None):
+    """Delete the selected expenses; returns their (expense_date, category, amount) rows"""
+    rows = select_expenses(cursor, user_id, ids, filters)
+    if not rows:
+        return []
+    cursor.executemany("DELETE FROM expenses WHERE id = ? AND user_id = ?", [(row[0], user_id) for row in rows])
+    removed = [tuple(row[1:]) for row in rows]
+    _apply_changes(cursor, user_id, removed, [])
+    return removed
+
+
+def recategorize_expenses(cursor, user_id, category, ids=None, filters=None):
+    """Move the selected expenses to `category`; returns (old rows, new rows) of those that changed"""
+    rows = [row for row in select_expenses(cursor, user_id, ids, filters) if row[2] != category]
+    if not rows:
+        return [], []
+    cursor.executemany(
+        "UPDATE expenses SET category = ? WHERE id = ? AND user_id = ?",
+        [(category, row[0], user_id) for row in rows]
+    )
+    removed = [tuple(row[1:]) for row in rows]
+    added = [(row[1], category, row[3]) for row in rows]
+    _apply_changes(cursor, user_id, removed, added)
+    return removed, added
+
+
+def shift_expenses(cursor, user_id, days, ids=None, filters=None):
+    """
+    Move the selected expenses `days` days (negative is earlier); returns
+    (old rows, new rows). Dates that cannot be parsed are left alone.
+    Raises ValueError, before writing anything, when a shifted date would
+    fall outside the accepted range (see analytics.check_expense_date).
+    """
+    updates, removed, added = [], [], []
+    for expense_id, expense_date, category, amount in select_expenses(cursor, user_id, ids, filters):
+        d = analytics.parse_expense_date(expense_date)
+        if d is None or not days:
+            continue
+        try:
+            new_date = analytics.check_expense_date(d + timedelta(days=days))
+        except (OverflowError, ValueError):
+            raise ValueError(f"Shifting {d.isoformat()} by {days} days leaves the supported date range")
+        updates.append((new_date, expense_id, user_id))
+        removed.append((expense_date, category, amount))
+        added.append((new_date, category, amount))
+    if not updates:
+        return [], []
+    cursor.executemany("UPDATE expenses SET expense_date = ? WHERE id = ? AND user_id = ?", updates)
+    _apply_changes(cursor, user_id, removed, added)
+    return removed, added
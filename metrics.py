@@ -0,0 +1,287 @@
+"""
+Request instrumentation.
+
+Code wraps the interesting stages of a request in `with metrics.phase('name'):`
+(app.py does this for the pool checkout, every cursor call, aggregation, chart
+requests and template rendering). At the end of the request the phases are
+
+  * sent back as a Server-Timing header, so the browser's network panel shows
+    where the time went, and
+  * added to in-process histograms, exposed together with request counts and
+    latency percentiles in Prometheus text format on /metrics.
+
+When slow-request profiling is on, a background thread samples the stack of
+every thread that is handling a request; requests slower than the threshold
+keep their most common stacks for /stats/slow-requests and the log.
+"""
+
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict, deque
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.9, 0.99)
+# Recent samples kept per route for the latency quantiles
+WINDOW = 1024
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=WINDOW)
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+
+    def quantile(self, q):
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{str(value)}"' for name, value in labels.items())
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter()                    # (route, method, status) -> count
+        self.latency = defaultdict(Histogram)        # route -> request duration
+        self.phases = defaultdict(Histogram)         # (route, phase) -> duration
+        self.renders = defaultdict(Histogram)        # chart type -> background render duration
+
+    def record_request(self, route, method, status, seconds, phases):
+        with self._lock:
+            self.requests[(route, method, status)] += 1
+            self.latency[route].observe(seconds)
+            for name, duration in phases.items():
+                self.phases[(route, name)].observe(duration)
+
+    def record_render(self, chart, seconds):
+        with self._lock:
+            self.renders[chart].observe(seconds)
+
+    def render_text(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines.append("# HELP expense_requests_total Requests handled, by route, method and status.")
+            lines.append("# TYPE expense_requests_total counter")
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f"expense_requests_total{{{_labels(route=route, method=method, status=status)}}} {count}")
+
+            self._histogram_lines(lines, 'expense_request_duration_seconds', "Request latency by route.",
+                                  {(route,): h for route, h in self.latency.items()}, ('route',))
+            lines.append("# HELP expense_request_duration_quantile_seconds Latency quantiles over the last requests per route.")
+            lines.append("# TYPE expense_request_duration_quantile_seconds gauge")
+            for route, histogram in sorted(self.latency.items()):
+                for q in QUANTILES:
+                    lines.append(f"expense_request_duration_quantile_seconds{{{_labels(route=route, quantile=q)}}} "
+                                 f"{histogram.quantile(q):.6f}")
+
+            self._histogram_lines(lines, 'expense_request_phase_seconds',
+                                  "Time spent per request phase (db, db_connect, aggregate, charts, template).",
+                                  self.phases, ('route', 'phase'))
+            self._histogram_lines(lines, 'expense_chart_render_seconds', "Chart render time in the render workers.",
+                                  {(chart,): h for chart, h in self.renders.items()}, ('chart',))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _histogram_lines(lines, name, help_text, histograms, label_names):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for key, histogram in sorted(histograms.items()):
+            labels = _labels(**dict(zip(label_names, key)))
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.total}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.sum:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.total}")
+
+
+registry = Registry()
+
+
+class phase:
+    """
+    Context manager adding the time spent inside it to the current request's
+    phase `name`. Phases nest: time spent in an inner phase (a query inside
+    'aggregate') counts towards the inner one only, so the phases of a request
+    add up to at most its total.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.tracked = has_request_context() and 'metrics_stack' in g
+        if self.tracked:
+            g.metrics_stack.append(0.0)  # time spent in inner phases
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        if self.tracked:
+            inner = g.metrics_stack.pop()
+            g.metrics_stack[-1] += elapsed
+            g.metrics_phases[self.name] += elapsed - inner
+        return False
+
+
+class TimedCursor:
+    """Cursor wrapper counting execute/fetch time towards the 'db' phase"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _timed(self, method, *args):
+        with phase('db'):
+            return method(*args)
+
+    def execute(self, *args):
+        self._timed(self._cursor.execute, *args)
+        return self
+
+    def executemany(self, *args):
+        self._timed(self._cursor.executemany, *args)
+        return self
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TimedConnection:
+    """Connection wrapper handing out TimedCursors; commits count as 'db' time too"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return TimedCursor(self._conn.cursor())
+
+    def commit(self):
+        with phase('db'):
+            self._conn.commit()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class SlowRequestProfiler:
+    """
+    Samples the stacks of request threads every `interval` seconds; requests
+    taking longer than `threshold` keep their most frequent stacks.
+    """
+
+    def __init__(self, threshold, interval=0.005, keep=20, logger=None):
+        self.threshold = threshold
+        self.interval = interval
+        self.logger = logger
+        self.slow = deque(maxlen=keep)
+        self._active = {}  # thread id -> Counter of stacks
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stack = traceback.extract_stack(frame, limit=12)
+                        samples[' <- '.join(f"{f.name} ({f.filename.rsplit('/', 1)[-1]}:{f.lineno})"
+                                            for f in reversed(stack))] += 1
+
+    def start_request(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+                self._thread.start()
+            self._active[threading.get_ident()] = Counter()
+
+    def finish_request(self, route, seconds):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if samples is None or seconds < self.threshold:
+            return
+        report = {
+            'route': route,
+            'path': request.full_path.rstrip('?') if has_request_context() else None,
+            'seconds': round(seconds, 4),
+            'samples': sum(samples.values()),
+            'top_stacks': [{'count': count, 'stack': stack} for stack, count in samples.most_common(5)],
+        }
+        self.slow.append(report)
+        if self.logger is not None:
+            top = report['top_stacks'][0]['stack'] if report['top_stacks'] else 'no samples'
+            self.logger.warning("Slow request %s took %.0f ms; hottest stack: %s", report['path'], seconds * 1000, top)
+
+
+def init_app(app, profiler=None):
+    """Time every request of `app`, add Server-Timing headers and feed the registry"""
+
+    @app.before_request
+    def start_timing():
+        g.metrics_start = time.perf_counter()
+        g.metrics_phases = defaultdict(float)
+        g.metrics_stack = [0.0]  # time in top-level phases, which nothing subtracts
+        if profiler is not None:
+            profiler.start_request()
+
+    def template_started(sender, template, context, **extra):
+        if has_request_context() and 'metrics_stack' in g:
+            g.metrics_template = phase('template').__enter__()
+
+    def template_finished(sender, template, context, **extra):
+        if has_request_context() and 'metrics_template' in g:
+            g.pop('metrics_template').__exit__(None, None, None)
+
+    before_render_template.connect(template_started, app, weak=False)
+    template_rendered.connect(template_finished, app, weak=False)
+
+    @app.after_request
+    def finish_timing(response):
+        if 'metrics_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_start
+        route = request.endpoint or 'unknown'
+        phases = dict(g.metrics_phases)
+        timings = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in phases.items()]
+        timings.append(f"total;dur={elapsed * 1000:.2f}")
+        response.headers['Server-Timing'] = ', '.join(timings)
+        registry.record_request(route, request.method, response.status_code, elapsed, phases)
+        if profiler is not None:
+            profiler.finish_request(route, elapsed)
+        return response
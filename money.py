@@ -0,0 +1,50 @@
+"""
+Money amounts as integer fils.
+
+BHD has three decimal places, so amounts are stored and summed as integer
+thousandths of a dinar (fils): totals are exact, SQL SUM() stays an integer
+and NumPy can add them as int64. Amounts are converted once on the way in
+(forms, CSV import) and formatted only at the edges: templates through the
+|fils filter, and the JSON, CSV and chart output.
+"""
+
+from decimal import Decimal, DecimalException, InvalidOperation, ROUND_HALF_UP
+
+FILS_PER_DINAR = 1000
+# Largest amount accepted, in fils (a trillion dinars): far below 2**63, so
+# sums of many of them still fit the int64 columns and SQL integers
+MAX_FILS = 10 ** 15
+
+
+def parse_amount(text):
+    """
+    Fils for user input such as '12.345'; ValueError unless it is a finite
+    number of at most MAX_FILS fils either way
+    """
+    try:
+        value = Decimal(str(text).strip())
+    except InvalidOperation:
+        raise ValueError(f"invalid amount '{text}'")
+    if not value.is_finite():
+        raise ValueError(f"invalid amount '{text}'")
+    # copy_abs and the comparison are exact; abs() or multiplying first could
+    # overflow the decimal context for exponents like 1e999999999
+    if value.copy_abs() > Decimal(MAX_FILS) / FILS_PER_DINAR:
+        raise ValueError(f"amount '{text}' is too large")
+    try:
+        return int((value * FILS_PER_DINAR).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except DecimalException:
+        # e.g. InvalidOperation from quantize
+        raise ValueError(f"invalid amount '{text}'")
+
+
+def to_dinars(fils):
+    """Float dinars for JSON and charts"""
+    return fils / FILS_PER_DINAR
+
+
+def format_fils(fils):
+    """'12.345' for 12345, exact for any size (unlike '%.3f' of a float)"""
+    sign = '-' if fils < 0 else ''
+    dinars, rest = divmod(abs(int(fils)), FILS_PER_DINAR)
+    return f"{sign}{dinars}.{rest:03d}"
@@ -0,0 +1,90 @@
+"""
+Keyset (cursor) pagination for the expense list.
+
+Pages are ordered by (expense_date, id) and continue from the last row of the
+previous page instead of using OFFSET, so every page costs the same no matter
+how deep the user scrolls. Together with the optional category and date
+filters the queries are served by the (user_id, expense_date) and
+(user_id, category, expense_date) indexes.
+"""
+
+from datetime import date
+
+import analytics
+
+
+def encode_cursor(expense_date, expense_id):
+    return f"{expense_date.isoformat()}_{expense_id}"
+
+
+def decode_cursor(token):
+    """(date, id) from a cursor token, or None if it is malformed"""
+    try:
+        day, expense_id = token.split('_', 1)
+        return date.fromisoformat(day), int(expense_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def parse_filters(args):
+    """Category / date range / order filters from the query string"""
+    filters = {
+        'category': args.get('category') or None,
+        'start_date': None,
+        'end_date': None,
+        'order': 'asc' if args.get('order') == 'asc' else 'desc',
+    }
+    for name in ('start_date', 'end_date'):
+        try:
+            filters[name] = date.fromisoformat(args.get(name, ''))
+        except (TypeError, ValueError):
+            pass
+    return filters
+
+
+def filter_clause(user_id, filters):
+    """WHERE conditions and parameters selecting the user's expenses matching `filters`"""
+    where = ["user_id = ?"]
+    params = [user_id]
+    if filters['category']:
+        where.append("category = ?")
+        params.append(filters['category'])
+    if filters['start_date']:
+        where.append("expense_date >= ?")
+        params.append(filters['start_date'])
+    if filters['end_date']:
+        where.append("expense_date <= ?")
+        params.append(filters['end_date'])
+    return where, params
+
+
+def fetch_page(cursor, backend, user_id, filters, after=None, page_size=50):
+    """
+    One page of the user's expenses as (rows, next_cursor). Rows are
+    (id, expense_date, category, amount); next_cursor is None on the last page.
+    """
+    where, params = filter_clause(user_id, filters)
+
+    descending = filters['order'] == 'desc'
+    position = decode_cursor(after) if after else None
+    if position:
+        op = '<' if descending else '>'
+        where.append(f"(expense_date {op} ? OR (expense_date = ? AND id {op} ?))")
+        params.extend([position[0], position[0], position[1]])
+
+    direction = 'DESC' if descending else 'ASC'
+    sql = (
+        "SELECT id, expense_date, category, amount FROM expenses "
+        f"WHERE {' AND '.join(where)} "
+        f"ORDER BY expense_date {direction}, id {direction}"
+    )
+    # Fetch one extra row to know whether another page follows
+    cursor.execute(backend.limit_query(sql, page_size + 1), params)
+    rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(analytics.parse_expense_date(last[1]), last[0])
+    return rows, next_cursor
@@ -0,0 +1,137 @@
+"""
+Bounded, thread-safe database connection pool.
+
+Opening an ODBC connection to Access (and, to a lesser extent, a SQLite file)
+costs more than the queries a route runs, so connections are opened once and
+handed out again. app.py checks one out per request and returns it when the
+app context is torn down.
+"""
+
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the pool timeout"""
+
+
+class ConnectionPool:
+    def __init__(self, connect, size=5, timeout=10.0, health_check=None):
+        """
+        connect: callable that opens a new connection
+        size: maximum number of open connections
+        timeout: seconds to wait for a free connection before PoolTimeout
+        health_check: callable(conn) that raises if the connection is unusable
+        """
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self._health_check = health_check
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'hits': 0,          # checkouts served by an idle connection
+            'misses': 0,        # checkouts that had to open a new connection
+            'waits': 0,         # checkouts that had to wait for a release
+            'timeouts': 0,      # checkouts that gave up waiting
+            'wait_seconds': 0.0,
+            'discarded': 0,     # connections dropped after failing a health check
+        }
+
+    def acquire(self):
+        """Check out a connection, opening or waiting for one as needed"""
+        deadline = None
+        waited_since = None
+        with self._cond:
+            while True:
+                while self._idle:
+                    conn = self._idle.pop()
+                    if self._is_healthy(conn):
+                        self._stats['hits'] += 1
+                        self._record_wait(waited_since)
+                        return conn
+                    self._discard(conn)
+
+                if self._open < self.size:
+                    # Reserve the slot before connecting outside the lock
+                    self._open += 1
+                    self._stats['misses'] += 1
+                    self._record_wait(waited_since)
+                    break
+
+                if deadline is None:
+                    waited_since = time.perf_counter()
+                    deadline = waited_since + self.timeout
+                    self._stats['waits'] += 1
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    self._record_wait(waited_since)
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                self._cond.wait(remaining)
+
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back anything left uncommitted"""
+        try:
+            conn.rollback()
+        except Exception:
+            with self._cond:
+                self._discard(conn)
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def close_all(self):
+        """Close every idle connection, e.g. on shutdown"""
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop(), failed=False)
+            self._cond.notify_all()
+
+    def stats(self):
+        """Snapshot of hit/miss/wait counters and current occupancy"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._open
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._open - len(self._idle)
+        return stats
+
+    def _is_healthy(self, conn):
+        if self._health_check is None:
+            return True
+        try:
+            self._health_check(conn)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn, failed=True):
+        # Caller holds the lock
+        self._open -= 1
+        if failed:
+            self._stats['discarded'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _record_wait(self, waited_since):
+        # Caller holds the lock
+        if waited_since is not None:
+            self._stats['wait_seconds'] += time.perf_counter() - waited_since
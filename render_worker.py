@@ -0,0 +1,217 @@
+"""
+Background chart rendering.
+
+/analyze no longer waits for matplotlib: it asks the RenderQueue for each
+chart and gets either a cached filename straight away or nothing, in which
+case the chart is rendered by a pool of worker processes and the page polls
+/analyze/charts/<key> until the image is ready. Requests for a key that is
+already being rendered share the same job.
+
+A worker process that dies breaks its whole ProcessPoolExecutor. The queue
+then starts a fresh pool and submits the job again (once); if that fails
+as well the chart is rendered on the requesting thread.
+
+The queue also remembers the render job of the most recent `max_jobs`
+keys. A chart that has since been evicted from the cache (a page revalidated
+with 304 still links to it) is then rendered again when it is polled for or
+its image is requested. generation(owner) counts the jobs of one owner (a
+user) forgotten so far; app.py puts the requesting user's count in the ETag of
+/analyze so a cached page never outlives its jobs, without one busy user
+invalidating everyone else's pages.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+def _render_job(render, tmp_path, args):
+    # Runs in a worker process; returns the render time in seconds
+    start = time.perf_counter()
+    render(tmp_path, *args)
+    return time.perf_counter() - start
+
+
+class RenderQueue:
+    def __init__(self, cache, workers=2, on_render=None, max_jobs=1024):
+        """
+        cache: ChartCache the finished images are moved into
+        workers: number of render processes; 0 renders on the calling thread
+        on_render: optional on_render(render function name, seconds) after each render
+        max_jobs: render jobs remembered for rendering evicted charts again
+        """
+        self.cache = cache
+        self.workers = workers
+        self.on_render = on_render
+        self.max_jobs = max_jobs
+        self._generations = {}  # owner -> jobs of that owner forgotten so far
+        self._executor = None
+        self._pending = {}  # key -> Event set once the image is in the cache (or failed)
+        self._jobs = OrderedDict()  # key -> (render, args, owner), least recently used first
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'merged': 0, 'failed': 0, 'restarts': 0, 'forgotten': 0}
+
+    def _get_executor(self):
+        # Caller holds the lock; processes are only started once a chart is needed
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _discard_executor(self, executor):
+        # Caller holds the lock; a pool that lost a worker cannot take jobs any more
+        if executor is not None and self._executor is executor:
+            self._executor = None
+            self._stats['restarts'] += 1
+            executor.shutdown(wait=False)
+
+    def _submit(self, render, tmp_path, args):
+        # Caller holds the lock; returns (executor, future), retrying once on a fresh pool
+        for attempt in (1, 2):
+            executor = self._get_executor()
+            try:
+                return executor, executor.submit(_render_job, render, tmp_path, args)
+            except BrokenProcessPool:
+                self._discard_executor(executor)
+                if attempt == 2:
+                    raise
+
+    def _watch(self, key, render, tmp_path, args, submitted, retry=True):
+        # Outside the lock: the callback runs at once if the job has already finished
+        executor, future = submitted
+        future.add_done_callback(lambda f: self._finish(key, render, tmp_path, args, executor, f, retry))
+
+    def remember(self, key, render, *args, owner=None):
+        """Record how to render `key` for `owner` without queueing it (see status())"""
+        with self._lock:
+            self._jobs[key] = (render, args, owner)
+            self._jobs.move_to_end(key)
+            while len(self._jobs) > self.max_jobs:
+                _, (_, _, forgotten) = self._jobs.popitem(last=False)
+                self._generations[forgotten] = self._generations.get(forgotten, 0) + 1
+                self._stats['forgotten'] += 1
+
+    def generation(self, owner=None):
+        """How many of `owner`'s render jobs have been forgotten so far"""
+        with self._lock:
+            return self._generations.get(owner, 0)
+
+    def request(self, key, render, *args, owner=None):
+        """
+        Return the cached filename for `key`, or None after making sure a
+        render(path, *args) job for it is queued.
+        """
+        self.remember(key, render, *args, owner=owner)
+        name = self.cache.get(key)
+        if name:
+            return name
+        if self.workers <= 0:
+            return self._render_inline(key, render, args)
+
+        with self._lock:
+            if key in self._pending:
+                self._stats['merged'] += 1
+                return None
+            tmp_path = self.cache.temp_path(key)
+            self._pending[key] = threading.Event()
+            self._stats['submitted'] += 1
+            try:
+                submitted = self._submit(render, tmp_path, args)
+            except BrokenProcessPool:
+                # Not even a fresh pool works; draw it here instead
+                self._pending.pop(key).set()
+                submitted = None
+        if submitted is None:
+            return self._render_inline(key, render, args)
+        self._watch(key, render, tmp_path, args, submitted)
+        return None
+
+    def _render_inline(self, key, render, args):
+        return self.cache.put(key, lambda path: self._report(render, _render_job(render, path, args)))
+
+    def _report(self, render, seconds):
+        if self.on_render is not None:
+            self.on_render(render.__name__, seconds)
+
+    def _finish(self, key, render, tmp_path, args, executor, future, retry):
+        resubmitted = None
+        try:
+            self._report(render, future.result())
+            self.cache.adopt(key, tmp_path)
+        except BrokenProcessPool as e:
+            with self._lock:
+                self._discard_executor(executor)
+                if retry:
+                    try:
+                        # The key stays pending while the job runs again on a new pool
+                        resubmitted = self._submit(render, tmp_path, args)
+                    except BrokenProcessPool:
+                        pass
+                if resubmitted is None:
+                    self._stats['failed'] += 1
+            if resubmitted is None:
+                print(f"Chart render failed for {key}: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        except Exception as e:
+            print(f"Chart render failed for {key}: {e}")
+            with self._lock:
+                self._stats['failed'] += 1
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        finally:
+            if resubmitted is not None:
+                self._watch(key, render, tmp_path, args, resubmitted, retry=False)
+            else:
+                with self._lock:
+                    done = self._pending.pop(key, None)
+                if done is not None:
+                    done.set()
+
+    def status(self, key, wait=0):
+        """
+        ('ready', filename), ('pending', None) or ('missing', None). With
+        wait > 0 a pending job is waited on for up to that many seconds. A
+        key that is neither cached nor pending is queued again from its
+        remembered job; 'missing' means there is none (or it failed).
+        """
+        with self._lock:
+            done = self._pending.get(key)
+        if done is None:
+            name = self.cache.get(key)
+            if name:
+                return 'ready', name
+            with self._lock:
+                job = self._jobs.get(key)
+            if job is None:
+                return 'missing', None
+            render, args, owner = job
+            name = self.request(key, render, *args, owner=owner)
+            if name:
+                return 'ready', name
+            with self._lock:
+                done = self._pending.get(key)
+        if done is not None:
+            if not done.wait(wait):
+                return 'pending', None
+
+        name = self.cache.get(key)
+        if name:
+            return 'ready', name
+        return 'missing', None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+            stats['jobs'] = len(self._jobs)
+            stats['workers'] = self.workers
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
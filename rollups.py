@@ -0,0 +1,116 @@
+"""
+Per-user, per-month, per-category expense totals.
+
+monthly_rollups(user_id, year, month, category, total, count) is updated by
+ledger.py in the same transaction as every expense write, so /analyze can read
+a few dozen summary rows instead of the user's whole history. rebuild() and
+diff() recompute the table from the raw expenses (flask rebuild-rollups).
+
+Totals are integer fils (see money.py), so they add up exactly.
+
+year, month and count are reserved words in Access SQL, hence the brackets
+(SQLite accepts the same quoting).
+"""
+
+from collections import defaultdict
+
+import analytics
+
+
+def new_deltas():
+    """Accumulator of (year, month, category) -> [total, count] changes"""
+    return defaultdict(lambda: [0, 0])
+
+
+def add_delta(deltas, expense_date, category, amount, sign=1):
+    """Record one expense being added (sign=1) or removed (sign=-1)"""
+    d = analytics.parse_expense_date(expense_date)
+    if d is None:
+        return
+    delta = deltas[(d.year, d.month, category)]
+    delta[0] += sign * amount
+    delta[1] += sign
+
+
+def apply(cursor, user_id, deltas):
+    """Apply accumulated deltas for one user; the caller commits"""
+    for (year, month, category), (total, count) in deltas.items():
+        if not count and not total:
+            continue
+        cursor.execute(
+            "UPDATE monthly_rollups SET total = total + ?, [count] = [count] + ? "
+            "WHERE user_id = ? AND [year] = ? AND [month] = ? AND category = ?",
+            (total, count, user_id, year, month, category)
+        )
+        if cursor.rowcount == 0:
+            cursor.execute(
+                "INSERT INTO monthly_rollups (user_id, [year], [month], category, total, [count]) VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, year, month, category, total, count)
+            )
+    # Drop buckets whose last expense was removed or moved away
+    cursor.execute("DELETE FROM monthly_rollups WHERE user_id = ? AND [count] <= 0", (user_id,))
+
+
+def fetch(cursor, user_id):
+    """All (year, month, category, total) rows for the user"""
+    cursor.execute("SELECT [year], [month], category, total FROM monthly_rollups WHERE user_id = ?", (user_id,))
+    return cursor.fetchall()
+
+
+def compute_from_expenses(cursor):
+    """Recompute every user's rollups from the raw expenses table"""
+    cursor.execute(
+        "SELECT user_id, expense_date, category, SUM(amount), COUNT(*) FROM expenses "
+        "GROUP BY user_id, expense_date, category"
+    )
+    computed = defaultdict(lambda: [0, 0])
+    for user_id, expense_date, category, total, count in cursor.fetchall():
+        d = analytics.parse_expense_date(expense_date)
+        if d is None:
+            continue
+        bucket = computed[(user_id, d.year, d.month, category)]
+        bucket[0] += total
+        bucket[1] += count
+    return computed
+
+
+def diff(cursor):
+    """
+    Compare the stored rollups with a fresh computation. Returns a list of
+    (key, stored, expected) where key is (user_id, year, month, category) and
+    stored/expected are (total, count) or None.
+    """
+    expected = compute_from_expenses(cursor)
+    cursor.execute("SELECT user_id, [year], [month], category, total, [count] FROM monthly_rollups")
+    stored = {(r[0], r[1], r[2], r[3]): (r[4], r[5]) for r in cursor.fetchall()}
+
+    drift = []
+    for key in sorted(set(stored) | set(expected), key=lambda k: tuple(str(part) for part in k)):
+        have = stored.get(key)
+        want = tuple(expected[key]) if key in expected else None
+        if have is None or want is None or have != want:
+            drift.append((key, have, want))
+    return drift
+
+
+def rebuild(conn):
+    """Replace the rollups with a fresh computation in one transaction"""
+    cursor = conn.cursor()
+    computed = compute_from_expenses(cursor)
+    cursor.execute("DELETE FROM monthly_rollups")
+    cursor.executemany(
+        "INSERT INTO monthly_rollups (user_id, [year], [month], category, total, [count]) VALUES (?, ?, ?, ?, ?, ?)",
+        [(user_id, year, month, category, total, count)
+         for (user_id, year, month, category), (total, count) in computed.items()]
+    )
+    conn.commit()
+    return len(computed)
+
+
+def needs_rebuild(cursor):
+    """True when there are expenses but no rollups yet (e.g. an upgraded database)"""
+    cursor.execute("SELECT COUNT(*) FROM monthly_rollups")
+    if cursor.fetchone()[0]:
+        return False
+    cursor.execute("SELECT COUNT(*) FROM expenses")
+    return cursor.fetchone()[0] > 0
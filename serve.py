@@ -0,0 +1,108 @@
+"""
+Production entry point for Expense Tracker.
+
+Serves the app with a multi-threaded WSGI server instead of Flask's
+development server:
+
+    python serve.py [--host 127.0.0.1] [--port 5000] [--threads 8] [--processes 1]
+
+Threads are served by waitress when it is installed (it also runs on
+Windows), otherwise by werkzeug's threaded server. --processes above 1 forks
+that many werkzeug server processes (not available on Windows). The defaults
+come from EXPENSE_SERVER_THREADS and EXPENSE_SERVER_PROCESSES.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+
+
+class Server:
+    """A WSGI server bound to host/port; run() blocks until close() is called"""
+
+    def __init__(self, app, host='127.0.0.1', port=5000, threads=8, processes=1):
+        self.kind = None
+        self._running = False
+        self._stopped = threading.Event()
+        if processes > 1:
+            if sys.platform == 'win32':
+                raise ValueError("--processes is not supported on Windows; use --threads instead")
+            from werkzeug.serving import make_server
+            self._server = make_server(host, port, app, processes=processes)
+            self.kind = f'werkzeug ({processes} processes)'
+            self.port = self._server.server_port
+            return
+
+        try:
+            import waitress
+        except ImportError:
+            waitress = None
+        if waitress is not None:
+            self._server = waitress.create_server(app, host=host, port=port, threads=threads)
+            self.kind = f'waitress ({threads} threads)'
+            self.port = self._server.effective_port
+        else:
+            from werkzeug.serving import make_server
+            self._server = make_server(host, port, app, threaded=True)
+            self.kind = 'werkzeug (thread per request)'
+            self.port = self._server.server_port
+
+    def run(self):
+        self._running = True
+        try:
+            if hasattr(self._server, 'serve_forever'):
+                self._server.serve_forever()
+            else:
+                self._server.run()
+        finally:
+            self._stopped.set()
+
+    def close(self):
+        if hasattr(self._server, 'shutdown'):
+            self._server.shutdown()
+            return
+        # waitress: let the requests in progress finish first, then close the
+        # sockets on the server's own loop so that neither the loop nor a task
+        # thread touches a closed descriptor; run() returns once none are left
+        self._server.task_dispatcher.shutdown()
+        if not self._running:
+            self._server.close()
+            return
+        self._server.trigger.pull_trigger(self._close_sockets)
+        self._stopped.wait()
+
+    def _close_sockets(self):
+        # Runs on the waitress loop thread
+        for dispatcher in list(self._server._map.values()):
+            dispatcher.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Expense Tracker with a production WSGI server.")
+    parser.add_argument('--host', default=os.environ.get('EXPENSE_SERVER_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('EXPENSE_SERVER_PORT', 5000)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('EXPENSE_SERVER_THREADS', 8)))
+    parser.add_argument('--processes', type=int, default=int(os.environ.get('EXPENSE_SERVER_PROCESSES', 1)))
+    args = parser.parse_args()
+
+    # app.py sizes the bcrypt queue from the thread count
+    os.environ['EXPENSE_SERVER_THREADS'] = str(args.threads)
+    from app import app, render_queue, write_queue
+    server = Server(app, args.host, args.port, threads=args.threads, processes=args.processes)
+    print(f"Expense Tracker serving on http://{args.host}:{server.port} with {server.kind}")
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        render_queue.shutdown()
+        if write_queue is not None:
+            write_queue.close()
+
+
+if __name__ == '__main__':
+    # Render worker processes re-launch the executable; let them start up properly
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,382 @@
+"""
+Optional per-user sharding (EXPENSE_SHARDS).
+
+Without it every user's expenses share the one database file at DB_PATH, and
+every write queues for that file's lock. EXPENSE_SHARDS=N spreads users over
+N shard files by user_id; EXPENSE_SHARDS=user gives every user a file of
+their own. The shard files live in a 'shards' folder next to DB_PATH and hold
+the usual schema (see storage.py).
+
+DB_PATH stays the directory: it keeps the users table (logins and signups
+always go there) and user_shards(user_id, shard), which says where each
+user's expenses are. 'home' is DB_PATH itself, so users who had data before
+sharding was turned on keep it where it is until they are moved. New users
+are placed on first use: shard-(user_id % N), or user-<id>.
+
+ShardRouter sits under get_db_connection(): it looks the session's user up in
+the directory and hands out a connection from that shard's pool, so the
+routes run the same SQL as before against a smaller database. Lookups are
+cached for `cache_ttl` seconds; moves made by this process drop the entry at
+once, and a write that hits a MOVED tombstone should call forget() (app.py
+does) so its retry is routed afresh. A move made by another process (the
+CLI) can therefore leave reads on the old shard for at most `cache_ttl`.
+
+move_user() moves one user's rows to another shard while the app is running
+(flask --app app move-user / rebalance-shards). It takes the source's write
+lock for the user (bumping their data version), copies their rows into the
+target and commits there, points the directory at the target, then deletes
+the rows from the source and leaves a MOVED tombstone (see data_versions.py)
+so a write still routed to the old shard fails instead of being lost.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import data_versions
+import pool
+
+HOME = 'home'
+
+# Tables holding one user's expenses and everything ledger.py derives from them
+USER_TABLES = [
+    ('expenses', ['id', 'expense_date', 'category', 'amount']),
+    ('monthly_rollups', ['[year]', '[month]', 'category', 'total', '[count]']),
+    ('daily_rollups', ['expense_date', 'category', 'total', '[count]']),
+    ('categories', ['category', 'usage_count']),
+]
+
+COPY_CHUNK = 1000
+
+
+def parse_mode(value):
+    """EXPENSE_SHARDS: 0 (off), a number of shards or 'user' for one database per user"""
+    value = (value or '0').strip().lower()
+    if value == 'user':
+        return value
+    try:
+        count = int(value)
+    except ValueError:
+        raise ValueError(f"EXPENSE_SHARDS must be a number or 'user', not '{value}'")
+    if count < 0:
+        raise ValueError("EXPENSE_SHARDS cannot be negative")
+    return count
+
+
+def placement(user_id, mode):
+    """The shard a user belongs on"""
+    if mode == 'user':
+        return f'user-{user_id}'
+    return f'shard-{user_id % mode}'
+
+
+def check_target(shard, mode, user_id):
+    """ValueError unless `user_id` can be moved to `shard` under `mode`"""
+    if shard == HOME:
+        return
+    if mode == 'user':
+        if shard != f'user-{user_id}':
+            raise ValueError(f"SHARD must be '{HOME}' or 'user-{user_id}' with EXPENSE_SHARDS=user")
+        return
+    prefix, _, number = shard.partition('-')
+    # str(int(...)) rules out 'shard-01' and other spellings of the same file
+    if prefix != 'shard' or not number.isdigit() or str(int(number)) != number or int(number) >= mode:
+        raise ValueError(f"SHARD must be '{HOME}' or shard-0 to shard-{mode - 1} with EXPENSE_SHARDS={mode}")
+
+
+def pin_existing_users(conn):
+    """Record users who already have expenses in the home database, but no shard, as living there"""
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO user_shards (user_id, shard) "
+        "SELECT id, ? FROM users WHERE id NOT IN (SELECT user_id FROM user_shards) "
+        "AND EXISTS (SELECT 1 FROM expenses WHERE expenses.user_id = users.id)",
+        (HOME,)
+    )
+    conn.commit()
+    return cursor.rowcount
+
+
+def stranded_users(cursor):
+    """Users whose expenses are in a shard (invisible while sharding is off)"""
+    cursor.execute("SELECT COUNT(*) FROM user_shards WHERE shard <> ?", (HOME,))
+    return cursor.fetchone()[0]
+
+
+class ShardRouter:
+    def __init__(self, directory, directory_pool, mode, prepare, pool_size=3, pool_timeout=10.0, max_open=64,
+                 cache_ttl=2.0, max_cached=4096):
+        """
+        directory: backend of the home database (users, user_shards)
+        directory_pool: its connection pool
+        mode: number of shards or 'user'
+        prepare: prepare(backend) creates/upgrades a shard's schema before first use
+        pool_size, pool_timeout: for each shard's connection pool
+        max_open: shard pools allowed to keep idle connections open
+        cache_ttl: seconds a user's shard is trusted without asking the directory
+        max_cached: users whose shard is cached before the least recently used is dropped
+        """
+        self.directory = directory
+        self.directory_pool = directory_pool
+        self.mode = mode
+        self.folder = os.path.join(os.path.dirname(os.path.abspath(directory.db_path)), 'shards')
+        self._prepare = prepare
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self.max_open = max_open
+        self.cache_ttl = cache_ttl
+        self.max_cached = max_cached
+        self._backends = {HOME: directory}
+        self._pools = OrderedDict()  # shard -> ConnectionPool, least recently used first
+        self._shards = OrderedDict()  # user_id -> (looked up at, shard), least recently used first
+        self._generation = 0  # bumped by forget()
+        self._lock = threading.Lock()
+        self._stats = {'lookups': 0, 'cached': 0, 'placed': 0, 'moves': 0, 'rows_moved': 0}
+
+    def backend(self, shard):
+        """Backend of `shard`, creating its database file on first use"""
+        with self._lock:
+            backend = self._backends.get(shard)
+            if backend is None:
+                _, ext = os.path.splitext(self.directory.db_path)
+                backend = self.directory.at_path(os.path.join(self.folder, shard + ext))
+                self._prepare(backend)
+                self._backends[shard] = backend
+        return backend
+
+    def pool(self, shard):
+        """Connection pool of `shard`; the home database uses the directory pool"""
+        if shard == HOME:
+            return self.directory_pool
+        backend = self.backend(shard)
+        with self._lock:
+            shard_pool = self._pools.get(shard)
+            if shard_pool is None:
+                shard_pool = pool.ConnectionPool(backend.connect, size=self.pool_size,
+                                                 timeout=self.pool_timeout, health_check=backend.ping)
+                self._pools[shard] = shard_pool
+            self._pools.move_to_end(shard)
+            # Per-user databases would otherwise keep a file open for every user seen
+            idle = list(self._pools.values())[:-self.max_open] if len(self._pools) > self.max_open else []
+        for stale in idle:
+            stale.close_all()
+        return shard_pool
+
+    def pool_for(self, user_id):
+        """Pool holding `user_id`'s expenses (the directory when there is no user)"""
+        if user_id is None:
+            return self.directory_pool
+        return self.pool(self.shard_of(user_id))
+
+    def shard_of(self, user_id):
+        """The shard `user_id` lives on, placing new users"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._shards.get(user_id)
+            if entry and now - entry[0] < self.cache_ttl:
+                self._shards.move_to_end(user_id)
+                self._stats['cached'] += 1
+                return entry[1]
+            self._stats['lookups'] += 1
+            generation = self._generation
+
+        conn = self.directory_pool.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT shard FROM user_shards WHERE user_id = ?", (user_id,))
+            row = cursor.fetchone()
+            shard = row[0] if row is not None else self._place(conn, user_id)
+        finally:
+            self.directory_pool.release(conn)
+
+        with self._lock:
+            # A move finished while looking up may not be in `shard`; don't keep it
+            if generation == self._generation:
+                self._shards[user_id] = (now, shard)
+                self._shards.move_to_end(user_id)
+                while len(self._shards) > self.max_cached:
+                    self._shards.popitem(last=False)
+        return shard
+
+    def forget(self, user_id):
+        """Drop the cached shard of `user_id`, e.g. after a write found them moved"""
+        with self._lock:
+            self._shards.pop(user_id, None)
+            self._generation += 1
+
+    def _place(self, conn, user_id):
+        shard = placement(user_id, self.mode)
+        cursor = conn.cursor()
+        cursor.execute("SELECT username FROM users WHERE id = ?", (user_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise LookupError(f"no user {user_id}")
+        self._add_user(shard, user_id, row[0])
+        try:
+            cursor.execute("INSERT INTO user_shards (user_id, shard) VALUES (?, ?)", (user_id, shard))
+            conn.commit()
+        except self.directory.IntegrityError:
+            # Placed by another request in the meantime
+            conn.rollback()
+            cursor.execute("SELECT shard FROM user_shards WHERE user_id = ?", (user_id,))
+            return cursor.fetchone()[0]
+        with self._lock:
+            self._stats['placed'] += 1
+        return shard
+
+    def _add_user(self, shard, user_id, username):
+        # Shards keep a password-less copy of the user row for the expenses foreign key
+        if shard == HOME:
+            return
+        conn = self.backend(shard).connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM users WHERE id = ?", (user_id,))
+            if cursor.fetchone() is None:
+                cursor.execute("INSERT INTO users (id, username, password) VALUES (?, ?, ?)", (user_id, username, ''))
+                conn.commit()
+        finally:
+            conn.close()
+
+    def shards(self):
+        """{shard: number of users} from the directory, home included"""
+        conn = self.directory_pool.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT shard, COUNT(*) FROM user_shards GROUP BY shard")
+            counts = {HOME: 0}
+            counts.update({shard: count for shard, count in cursor.fetchall()})
+            return counts
+        finally:
+            self.directory_pool.release(conn)
+
+    def misplaced(self, target=None):
+        """[(user_id, username, current shard, wanted shard)] for users not on their placement (or `target`)"""
+        conn = self.directory_pool.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT u.id, u.username, s.shard FROM users u INNER JOIN user_shards s ON s.user_id = u.id ORDER BY u.id"
+            )
+            moves = []
+            for user_id, username, shard in cursor.fetchall():
+                wanted = target or placement(user_id, self.mode)
+                if shard != wanted:
+                    moves.append((user_id, username, shard, wanted))
+            return moves
+        finally:
+            self.directory_pool.release(conn)
+
+    def move_user(self, user_id, target):
+        """
+        Move `user_id`'s rows to `target` while the app keeps serving; returns
+        the expenses moved. ValueError when `target` is not a valid shard.
+        """
+        check_target(target, self.mode, user_id)
+        self.forget(user_id)
+        source = self.shard_of(user_id)
+        if source == target:
+            return 0
+        conn = self.directory_pool.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT username FROM users WHERE id = ?", (user_id,))
+            username = cursor.fetchone()[0]
+        finally:
+            self.directory_pool.release(conn)
+        self._add_user(target, user_id, username)
+
+        src = self.backend(source).connect()
+        dst = self.backend(target).connect()
+        try:
+            src_cursor = src.cursor()
+            # Taking the user's version row locks out their writes until the source commits
+            data_versions.bump(src_cursor, user_id)
+            version = data_versions.fetch(src_cursor, user_id)
+
+            dst_cursor = dst.cursor()
+            moved = self._copy(src_cursor, dst_cursor, user_id)
+            dst_cursor.execute("DELETE FROM data_versions WHERE user_id = ?", (user_id,))
+            dst_cursor.execute("INSERT INTO data_versions (user_id, version) VALUES (?, ?)", (user_id, version))
+            # The directory is the home database: when that is one side of the
+            # move, repoint the user in that side's transaction (a second
+            # connection would wait for the lock this one holds)
+            if target == HOME:
+                self._repoint(dst_cursor, user_id, target)
+            dst.commit()
+            if HOME not in (source, target):
+                conn = self.directory_pool.acquire()
+                try:
+                    self._repoint(conn.cursor(), user_id, target)
+                    conn.commit()
+                finally:
+                    self.directory_pool.release(conn)
+
+            for table, _ in USER_TABLES:
+                src_cursor.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+            src_cursor.execute("UPDATE data_versions SET version = ? WHERE user_id = ?", (data_versions.MOVED, user_id))
+            if source == HOME:
+                self._repoint(src_cursor, user_id, target)
+            src.commit()
+        except Exception:
+            src.rollback()
+            dst.rollback()
+            raise
+        finally:
+            src.close()
+            dst.close()
+            self.forget(user_id)
+
+        with self._lock:
+            self._stats['moves'] += 1
+            self._stats['rows_moved'] += moved
+        return moved
+
+    def _repoint(self, cursor, user_id, shard):
+        cursor.execute("UPDATE user_shards SET shard = ? WHERE user_id = ?", (shard, user_id))
+
+    def _copy(self, src_cursor, dst_cursor, user_id):
+        # Leftovers of an earlier move that stopped before updating the directory
+        for table, _ in USER_TABLES:
+            dst_cursor.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+
+        # Expense ids only have to be unique within a database; keep them unless
+        # the target has already used some of them
+        src_cursor.execute("SELECT MIN(id), MAX(id) FROM expenses WHERE user_id = ?", (user_id,))
+        low, high = src_cursor.fetchone()
+        keep_ids = True
+        if low is not None:
+            dst_cursor.execute("SELECT COUNT(*) FROM expenses WHERE id BETWEEN ? AND ?", (low, high))
+            keep_ids = dst_cursor.fetchone()[0] == 0
+
+        moved = 0
+        for table, columns in USER_TABLES:
+            if table == 'expenses' and not keep_ids:
+                columns = columns[1:]
+            column_list = ', '.join(columns)
+            insert = (f"INSERT INTO {table} (user_id, {column_list}) "
+                      f"VALUES (?, {', '.join('?' for _ in columns)})")
+            src_cursor.execute(f"SELECT {column_list} FROM {table} WHERE user_id = ?", (user_id,))
+            while True:
+                rows = src_cursor.fetchmany(COPY_CHUNK)
+                if not rows:
+                    break
+                dst_cursor.executemany(insert, [(user_id,) + tuple(row) for row in rows])
+                if table == 'expenses':
+                    moved += len(rows)
+        return moved
+
+    def close_all(self):
+        with self._lock:
+            pools = list(self._pools.values())
+        for shard_pool in pools:
+            shard_pool.close_all()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['mode'] = self.mode
+            stats['cached_users'] = len(self._shards)
+            stats['pools'] = {shard: shard_pool.stats() for shard, shard_pool in self._pools.items()}
+        return stats
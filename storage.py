@@ -0,0 +1,497 @@
+"""
+Storage backends for Expense Tracker.
+
+Every route reaches the database through get_db_connection() in app.py; this
+module decides which engine sits behind that call.
+
+- SQLite (default on Mac/Linux): a single file in WAL mode, so readers keep
+  working while a write is in progress. The schema is created on first run.
+- Microsoft Access (default on Windows): the original expenses.accdb file,
+  reached through the Access ODBC driver. pyodbc is only imported when this
+  backend is selected.
+
+Both drivers use the '?' parameter style, so the SQL in app.py is shared.
+expense_date is a native DATE column on both engines; older databases that
+still hold DD-MM-YYYY strings are converted with `flask migrate-dates`
+(see migrate_expense_dates below). Amounts and totals are integer fils
+(see money.py); databases that still hold floating point dinars are
+converted on startup by migrate_amounts_to_fils. With sharding on, every
+shard file is a database of the same kind created from the same schema.
+"""
+
+import os
+import shutil
+import sqlite3
+from datetime import date
+
+DEFAULT_BACKEND = 'access' if os.name == 'nt' else 'sqlite'
+
+# Tables and indexes created on first run of the SQLite backend
+SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS expenses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+        expense_date DATE NOT NULL,
+        category TEXT NOT NULL,
+        amount INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS monthly_rollups (
+        user_id INTEGER NOT NULL,
+        [year] INTEGER NOT NULL,
+        [month] INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        total INTEGER NOT NULL,
+        [count] INTEGER NOT NULL,
+        PRIMARY KEY (user_id, [year], [month], category)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS categories (
+        user_id INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        usage_count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, category)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS daily_rollups (
+        user_id INTEGER NOT NULL,
+        expense_date DATE NOT NULL,
+        category TEXT NOT NULL,
+        total INTEGER NOT NULL,
+        [count] INTEGER NOT NULL,
+        PRIMARY KEY (user_id, expense_date, category)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS data_versions (
+        user_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_shards (
+        user_id INTEGER PRIMARY KEY,
+        shard TEXT NOT NULL
+    )
+    """,
+]
+
+# Indexes backing the date filters and keyset pagination on /view
+ACCESS_INDEXES = {
+    'idx_expenses_user_date': "CREATE INDEX idx_expenses_user_date ON expenses (user_id, expense_date, id)",
+    'idx_expenses_user_category_date': "CREATE INDEX idx_expenses_user_category_date ON expenses (user_id, category, expense_date)",
+}
+
+# Tables added after the original expenses.accdb was shipped; created on
+# startup when missing
+ACCESS_TABLES = {
+    'monthly_rollups': """
+        CREATE TABLE monthly_rollups (
+            user_id LONG NOT NULL,
+            [year] INTEGER NOT NULL,
+            [month] INTEGER NOT NULL,
+            category TEXT(255) NOT NULL,
+            total LONG NOT NULL,
+            [count] LONG NOT NULL,
+            CONSTRAINT pk_monthly_rollups PRIMARY KEY (user_id, [year], [month], category)
+        )
+    """,
+    'categories': """
+        CREATE TABLE categories (
+            user_id LONG NOT NULL,
+            category TEXT(255) NOT NULL,
+            usage_count LONG NOT NULL,
+            CONSTRAINT pk_categories PRIMARY KEY (user_id, category)
+        )
+    """,
+    'daily_rollups': """
+        CREATE TABLE daily_rollups (
+            user_id LONG NOT NULL,
+            expense_date DATETIME NOT NULL,
+            category TEXT(255) NOT NULL,
+            total LONG NOT NULL,
+            [count] LONG NOT NULL,
+            CONSTRAINT pk_daily_rollups PRIMARY KEY (user_id, expense_date, category)
+        )
+    """,
+    'data_versions': """
+        CREATE TABLE data_versions (
+            user_id LONG NOT NULL,
+            version LONG NOT NULL,
+            CONSTRAINT pk_data_versions PRIMARY KEY (user_id)
+        )
+    """,
+    'user_shards': """
+        CREATE TABLE user_shards (
+            user_id LONG NOT NULL,
+            shard TEXT(255) NOT NULL,
+            CONSTRAINT pk_user_shards PRIMARY KEY (user_id)
+        )
+    """,
+}
+
+SQLITE_EXPENSE_INDEXES = [
+    # Date range filters (WHERE user_id = ? AND expense_date BETWEEN ? AND ?) and
+    # the /view keyset order; SQLite appends the rowid, giving (user_id, expense_date, id)
+    "CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses (user_id, expense_date)",
+    # /view filtered by category
+    "CREATE INDEX IF NOT EXISTS idx_expenses_user_category_date ON expenses (user_id, category, expense_date)",
+    # Superseded by idx_expenses_user_category_date
+    "DROP INDEX IF EXISTS idx_expenses_user_category",
+]
+
+# Rows the date migration could not parse are parked here instead of being dropped
+REJECTED_TABLE = 'expenses_rejected'
+
+
+def _convert_sqlite_date(value):
+    # DATE columns hold ISO strings; anything else is passed through untouched
+    # so a stray legacy value cannot break a whole query
+    text = value.decode('utf-8')
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        return text
+
+
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_converter('DATE', _convert_sqlite_date)
+
+
+class SQLiteBackend:
+    """Embedded SQLite database running in WAL mode"""
+
+    name = 'sqlite'
+    filename = 'expenses.db'
+    IntegrityError = sqlite3.IntegrityError
+
+    def __init__(self, db_path, busy_timeout=30):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+
+    def at_path(self, db_path):
+        """The same kind of database in another file (shards, see sharding.py)"""
+        return SQLiteBackend(db_path, busy_timeout=self.busy_timeout)
+
+    def initialize(self):
+        """Create the database file, switch it to WAL and create the schema"""
+        folder = os.path.dirname(self.db_path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        conn = self.connect()
+        try:
+            # WAL is stored in the file itself, so this only has to happen once
+            conn.execute("PRAGMA journal_mode = WAL")
+            for statement in SQLITE_SCHEMA:
+                conn.execute(statement)
+            if self.has_native_dates(conn):
+                for statement in SQLITE_EXPENSE_INDEXES:
+                    conn.execute(statement)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def connect(self):
+        # check_same_thread is off so a connection can be handed between threads;
+        # it is never used by two threads at the same time
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+        )
+        conn.execute("PRAGMA foreign_keys = ON")
+        # NORMAL is durable across application crashes in WAL mode and avoids
+        # an fsync on every commit
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def ping(self, conn):
+        """Raise if `conn` can no longer run queries"""
+        conn.execute("SELECT 1").fetchone()
+
+    def limit_query(self, sql, limit):
+        """Restrict a SELECT to its first `limit` rows"""
+        return f"{sql} LIMIT {int(limit)}"
+
+    def has_native_dates(self, conn):
+        """True once expenses.expense_date is a DATE column"""
+        for column in conn.execute("PRAGMA table_info(expenses)"):
+            if column[1] == 'expense_date':
+                return column[2].upper() == 'DATE'
+        return False
+
+    def has_integer_amounts(self, conn):
+        """True once expenses.amount holds integer fils"""
+        for column in conn.execute("PRAGMA table_info(expenses)"):
+            if column[1] == 'amount':
+                return column[2].upper() == 'INTEGER'
+        return False
+
+    def migrate_amounts_to_fils(self, conn):
+        """
+        Convert expenses.amount from REAL dinars to INTEGER fils through a
+        temporary column, and recreate the rollup tables (empty, with integer
+        totals) for the caller to rebuild. Returns the number of expenses.
+        """
+        try:
+            conn.execute("BEGIN")
+            conn.execute("ALTER TABLE expenses ADD COLUMN amount_fils INTEGER")
+            conn.execute("UPDATE expenses SET amount_fils = CAST(ROUND(amount * 1000) AS INTEGER)")
+            conn.execute("ALTER TABLE expenses DROP COLUMN amount")
+            conn.execute("ALTER TABLE expenses RENAME COLUMN amount_fils TO amount")
+            for table in ('monthly_rollups', 'daily_rollups'):
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            for statement in SQLITE_SCHEMA:
+                conn.execute(statement)
+            count = conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return count
+
+    def migrate_expense_dates(self, conn, parse):
+        """
+        Rebuild the expenses table with a DATE column, converting each value
+        with `parse` (returns a date or None). SQLite cannot change a column
+        type in place, so rows are copied into a new table inside one
+        transaction. Returns (converted_count, rejected_rows).
+        """
+        rows = conn.execute("SELECT id, user_id, expense_date, category, amount FROM expenses").fetchall()
+        converted, rejected = [], []
+        for row in rows:
+            parsed = parse(row[2])
+            if parsed is None:
+                rejected.append(row)
+            else:
+                converted.append((row[0], row[1], parsed, row[3], row[4]))
+
+        conn.execute("PRAGMA foreign_keys = OFF")
+        try:
+            conn.execute("BEGIN")
+            conn.execute(SQLITE_SCHEMA[1].replace('EXISTS expenses', 'EXISTS expenses_migrated'))
+            conn.executemany(
+                "INSERT INTO expenses_migrated (id, user_id, expense_date, category, amount) VALUES (?, ?, ?, ?, ?)",
+                converted,
+            )
+            if rejected:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {REJECTED_TABLE} "
+                    "(id INTEGER, user_id INTEGER, expense_date TEXT, category TEXT, amount REAL)"
+                )
+                conn.executemany(
+                    f"INSERT INTO {REJECTED_TABLE} (id, user_id, expense_date, category, amount) VALUES (?, ?, ?, ?, ?)",
+                    [(r[0], r[1], str(r[2]), r[3], r[4]) for r in rejected],
+                )
+            conn.execute("DROP TABLE expenses")
+            conn.execute("ALTER TABLE expenses_migrated RENAME TO expenses")
+            for statement in SQLITE_EXPENSE_INDEXES:
+                conn.execute(statement)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("PRAGMA foreign_keys = ON")
+        return len(converted), rejected
+
+
+class AccessBackend:
+    """Microsoft Access database reached through the Access ODBC driver"""
+
+    name = 'access'
+    filename = 'expenses.accdb'
+
+    def __init__(self, db_path, password='password', template_path=None):
+        self.db_path = db_path
+        self.password = password
+        self.template_path = template_path
+
+    def at_path(self, db_path):
+        """
+        The same kind of database in another file (shards, see sharding.py).
+        New files are copied from the template, so this needs the frozen build.
+        """
+        return AccessBackend(db_path, password=self.password, template_path=self.template_path)
+
+    @property
+    def IntegrityError(self):
+        import pyodbc
+        return pyodbc.IntegrityError
+
+    def initialize(self):
+        """
+        Copy the template database into place on first run (frozen executable)
+        and create any tables the template predates.
+        """
+        if self.template_path and not os.path.exists(self.db_path):
+            if os.path.exists(self.template_path):
+                print(f"First run detected. Creating database at: {self.db_path}")
+                shutil.copy2(self.template_path, self.db_path)
+                print("Database initialized successfully!")
+            else:
+                raise FileNotFoundError("Template database not found in executable!")
+
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            existing = {row.table_name.lower() for row in cursor.tables(tableType='TABLE').fetchall()}
+            for table, statement in ACCESS_TABLES.items():
+                if table not in existing:
+                    cursor.execute(statement)
+            # Date indexes are added by migrate_expense_dates on older databases,
+            # since Access cannot drop a column that is part of an index
+            if self.has_native_dates(conn):
+                indexes = {row.index_name.lower() for row in cursor.statistics('expenses').fetchall() if row.index_name}
+                for index, statement in ACCESS_INDEXES.items():
+                    if index not in indexes:
+                        cursor.execute(statement)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def connect(self):
+        import pyodbc
+        conn_str = (
+            r"DRIVER={Microsoft Access Driver (*.mdb, *.accdb)};"
+            f"DBQ={self.db_path};"
+            f"PWD={self.password};"
+        )
+        return pyodbc.connect(conn_str)
+
+    def ping(self, conn):
+        """Raise if `conn` can no longer run queries"""
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+        cursor.close()
+
+    def limit_query(self, sql, limit):
+        """Restrict a SELECT to its first `limit` rows (Access has TOP, not LIMIT)"""
+        return sql.replace("SELECT", f"SELECT TOP {int(limit)}", 1)
+
+    def has_native_dates(self, conn):
+        """True once expenses.expense_date is a Date/Time column"""
+        cursor = conn.cursor()
+        columns = cursor.columns(table='expenses', column='expense_date').fetchall()
+        cursor.close()
+        return bool(columns) and columns[0].type_name.upper() == 'DATETIME'
+
+    def has_integer_amounts(self, conn):
+        """True once expenses.amount is a Long Integer column of fils"""
+        cursor = conn.cursor()
+        columns = cursor.columns(table='expenses', column='amount').fetchall()
+        cursor.close()
+        return bool(columns) and columns[0].type_name.upper() in ('INTEGER', 'LONG')
+
+    def migrate_amounts_to_fils(self, conn):
+        """
+        Convert expenses.amount from Double dinars to Long Integer fils through
+        a temporary column (Access cannot rename columns), and recreate the
+        rollup tables, empty, for the caller to rebuild. Returns the number of
+        expenses.
+        """
+        cursor = conn.cursor()
+        try:
+            cursor.execute("ALTER TABLE expenses ADD COLUMN amount_fils LONG")
+            cursor.execute("UPDATE expenses SET amount_fils = CLng(amount * 1000)")
+            cursor.execute("ALTER TABLE expenses DROP COLUMN amount")
+            cursor.execute("ALTER TABLE expenses ADD COLUMN amount LONG")
+            cursor.execute("UPDATE expenses SET amount = amount_fils")
+            cursor.execute("ALTER TABLE expenses DROP COLUMN amount_fils")
+            for table in ('monthly_rollups', 'daily_rollups'):
+                cursor.execute(f"DROP TABLE {table}")
+                cursor.execute(ACCESS_TABLES[table])
+            cursor.execute("SELECT COUNT(*) FROM expenses")
+            count = cursor.fetchone()[0]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        return count
+
+    def migrate_expense_dates(self, conn, parse):
+        """
+        Replace the text expense_date column with a Date/Time one, converting
+        each value with `parse` (returns a date or None). Access can add and
+        drop columns but not rename them, so values go through a temporary
+        column. Unparseable rows are copied to expenses_rejected and removed.
+        Returns (converted_count, rejected_rows).
+        """
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, user_id, expense_date, category, amount FROM expenses")
+        converted, rejected = [], []
+        for row in cursor.fetchall():
+            parsed = parse(row[2])
+            if parsed is None:
+                rejected.append(tuple(row))
+            else:
+                converted.append((parsed, row[0]))
+
+        try:
+            cursor.execute("ALTER TABLE expenses ADD COLUMN expense_date_new DATETIME")
+            cursor.executemany("UPDATE expenses SET expense_date_new = ? WHERE id = ?", converted)
+            if rejected:
+                cursor.execute(
+                    f"CREATE TABLE {REJECTED_TABLE} "
+                    "(id LONG, user_id LONG, expense_date TEXT(255), category TEXT(255), amount DOUBLE)"
+                )
+                cursor.executemany(
+                    f"INSERT INTO {REJECTED_TABLE} (id, user_id, expense_date, category, amount) VALUES (?, ?, ?, ?, ?)",
+                    [(r[0], r[1], str(r[2]), r[3], r[4]) for r in rejected],
+                )
+                cursor.execute("DELETE FROM expenses WHERE expense_date_new IS NULL")
+            cursor.execute("ALTER TABLE expenses DROP COLUMN expense_date")
+            cursor.execute("ALTER TABLE expenses ADD COLUMN expense_date DATETIME")
+            cursor.execute("UPDATE expenses SET expense_date = expense_date_new")
+            cursor.execute("ALTER TABLE expenses DROP COLUMN expense_date_new")
+            for statement in ACCESS_INDEXES.values():
+                cursor.execute(statement)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        return len(converted), rejected
+
+
+BACKENDS = {
+    SQLiteBackend.name: SQLiteBackend,
+    AccessBackend.name: AccessBackend,
+}
+
+
+def create_backend(name, data_dir, db_path=None, template_dir=None):
+    """
+    Build the backend called `name` with its database file inside `data_dir`.
+    `db_path` overrides the file location; `template_dir` is where the frozen
+    executable keeps its bundled template database.
+    """
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown database backend '{name}' (expected one of: {', '.join(BACKENDS)})")
+
+    if db_path is None:
+        db_path = os.path.join(data_dir, backend_class.filename)
+
+    if backend_class is AccessBackend:
+        template_path = os.path.join(template_dir, AccessBackend.filename) if template_dir else None
+        return AccessBackend(db_path, template_path=template_path)
+    return backend_class(db_path)
@@ -0,0 +1,57 @@
+"""
+Shared fixtures. app.py reads its EXPENSE_ settings when it is imported, so
+they are set here first: a throwaway SQLite database, charts rendered on the
+request thread and a cheap bcrypt cost.
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP = tempfile.mkdtemp(prefix='expense-tests-')
+os.environ['EXPENSE_DB_BACKEND'] = 'sqlite'
+os.environ['EXPENSE_DB_PATH'] = os.path.join(TMP, 'expenses.db')
+os.environ['EXPENSE_RENDER_WORKERS'] = '0'
+os.environ['EXPENSE_BCRYPT_ROUNDS'] = '4'
+os.environ.pop('EXPENSE_SHARDS', None)
+os.environ.pop('EXPENSE_WRITE_BEHIND', None)
+sys.path.insert(0, ROOT)
+
+_usernames = (f'user{n}' for n in itertools.count())
+
+
+@pytest.fixture(scope='session')
+def expense_app():
+    import app
+    app.app.config['TESTING'] = True
+    yield app
+    app.render_queue.shutdown()
+
+
+@pytest.fixture
+def client(expense_app):
+    """A test client logged in as a new user"""
+    client = expense_app.app.test_client()
+    username = next(_usernames)
+    client.post('/signup', data={'username': username, 'password': 'pw'})
+    client.post('/login', data={'username': username, 'password': 'pw'})
+    with client.session_transaction() as session:
+        client.user_id = session['user_id']
+    return client
+
+
+@pytest.fixture
+def backend(tmp_path):
+    """A fresh SQLite database with one user (id 1)"""
+    import storage
+    backend = storage.SQLiteBackend(str(tmp_path / 'expenses.db'))
+    backend.initialize()
+    conn = backend.connect()
+    conn.execute("INSERT INTO users (id, username, password) VALUES (1, 'alice', '')")
+    conn.commit()
+    conn.close()
+    return backend
@@ -0,0 +1,53 @@
+from datetime import date
+
+import pytest
+
+import ledger
+
+columnar = pytest.importorskip('columnar')
+
+
+def totals(columns):
+    return columns.category_totals()
+
+
+def write(conn, rows):
+    """Insert rows in their own transaction; returns the version it committed at"""
+    cursor = conn.cursor()
+    ledger.insert_expenses(cursor, 1, rows)
+    version = cursor.execute("SELECT version FROM data_versions WHERE user_id = 1").fetchone()[0]
+    conn.commit()
+    return version
+
+
+def test_apply_keeps_columns_in_step(backend):
+    conn = backend.connect()
+    write(conn, [(date(2026, 1, 1), 'Food', 100)])
+    store = columnar.ColumnarStore()
+    assert store.query(conn.cursor(), 1, totals) == {'Food': 100}
+
+    version = write(conn, [(date(2026, 1, 2), 'Rent', 50)])
+    store.apply(1, version, added=[(date(2026, 1, 2), 'Rent', 50)])
+    assert store.query(conn.cursor(), 1, totals) == {'Food': 100, 'Rent': 50}
+    assert store.stats()['loads'] == 1
+    assert store.stats()['hits'] == 1
+    conn.close()
+
+
+def test_out_of_order_apply_drops_the_user(backend):
+    conn = backend.connect()
+    write(conn, [(date(2026, 1, 1), 'Food', 100)])
+    store = columnar.ColumnarStore()
+    store.query(conn.cursor(), 1, totals)
+
+    # Two writes commit; only the second one's callback arrives
+    write(conn, [(date(2026, 1, 2), 'Rent', 50)])
+    version = write(conn, [(date(2026, 1, 3), 'Fuel', 7)])
+    store.apply(1, version, added=[(date(2026, 1, 3), 'Fuel', 7)])
+    assert store.stats()['dropped'] == 1
+    assert store.query(conn.cursor(), 1, totals) == {'Food': 100, 'Rent': 50, 'Fuel': 7}
+
+    # A late callback for a write the columns already contain changes nothing
+    store.apply(1, version, added=[(date(2026, 1, 3), 'Fuel', 7)])
+    assert store.query(conn.cursor(), 1, totals) == {'Food': 100, 'Rent': 50, 'Fuel': 7}
+    conn.close()
@@ -0,0 +1,56 @@
+import threading
+
+WRITERS = 4
+WRITES = 15
+AMOUNT = 2.5
+PERIOD = '/api/analyze?range=custom&start_date=2026-01-01&end_date=2026-12-31'
+
+
+def as_user(expense_app, user_id):
+    client = expense_app.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+    return client
+
+
+def test_writes_while_analyze_reads(expense_app, client):
+    errors, totals = [], []
+    writing = threading.Event()
+    writing.set()
+
+    def writer(n):
+        own = as_user(expense_app, client.user_id)
+        for i in range(WRITES):
+            response = own.post('/add', data={'date': f'2026-{1 + (n + i) % 12:02d}-15',
+                                              'category': 'add_new', 'new_category': f'C{i % 3}',
+                                              'amount': str(AMOUNT)})
+            if response.status_code != 302:
+                errors.append(f'/add answered {response.status_code}')
+
+    def reader():
+        own = as_user(expense_app, client.user_id)
+        while writing.is_set():
+            if own.get('/analyze').status_code != 200:
+                errors.append('/analyze failed')
+            body = own.get(PERIOD).get_json()
+            totals.append((body['period']['total'], sum(body['period']['categories'].values())))
+
+    readers = [threading.Thread(target=reader) for _ in range(2)]
+    writers = [threading.Thread(target=writer, args=(n,)) for n in range(WRITERS)]
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    writing.clear()
+    for thread in readers:
+        thread.join()
+
+    assert errors == []
+    assert totals
+    for total, by_category in totals:
+        # Every snapshot is a whole number of writes and agrees with itself
+        assert total == by_category
+        assert (total / AMOUNT).is_integer() and 0 <= total <= WRITERS * WRITES * AMOUNT
+    final = client.get(PERIOD).get_json()['period']
+    assert final['total'] == WRITERS * WRITES * AMOUNT
+    assert final['categories'] == {f'C{i}': WRITERS * WRITES / 3 * AMOUNT for i in range(3)}
@@ -0,0 +1,88 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import analytics
+import daily_index
+import ledger
+
+CATEGORIES = ['Food', 'Rent', 'Fuel', 'Fun']
+
+
+def random_rows(rng, count):
+    start = date(2024, 1, 1)
+    return [(start + timedelta(days=rng.randrange(900)), rng.choice(CATEGORIES), rng.randrange(-500, 50000))
+            for _ in range(count)]
+
+
+def brute_total(rows, start, end, category=None):
+    return sum(amount for day, cat, amount in rows
+               if start <= day <= end and (category is None or cat == category))
+
+
+def test_range_totals_match_brute_force():
+    rng = random.Random(7)
+    rows = random_rows(rng, 2000)
+    sums = daily_index.UserPrefixSums(rows, version=1)
+    for _ in range(300):
+        a, b = sorted(date(2023, 12, 1) + timedelta(days=rng.randrange(960)) for _ in range(2))
+        category = rng.choice(CATEGORIES + [None, 'Missing'])
+        assert sums.total(a, b, category) == brute_total(rows, a, b, category)
+        expected = {c: brute_total(rows, a, b, c) for c in CATEGORIES}
+        assert sums.category_totals(a, b) == {c: t for c, t in expected.items() if t}
+
+
+def test_size_follows_active_days():
+    # Two expenses two centuries apart take a few dozen bytes, not one slot per day
+    rows = [(analytics.EARLIEST_EXPENSE_DATE, 'Food', 1), (analytics.LATEST_EXPENSE_DATE, 'Food', 2)]
+    sums = daily_index.UserPrefixSums(rows, version=1)
+    assert sums.nbytes < 200
+    assert sums.total(analytics.EARLIEST_EXPENSE_DATE, analytics.LATEST_EXPENSE_DATE) == 3
+    assert sums.total(date(1950, 1, 1), date(2050, 1, 1)) == 0
+
+
+def test_index_follows_writes(backend):
+    rng = random.Random(3)
+    rows = random_rows(rng, 200)
+    conn = backend.connect()
+    cursor = conn.cursor()
+    ledger.insert_expenses(cursor, 1, rows)
+    conn.commit()
+
+    index = daily_index.PrefixIndex()
+    first = index.get(cursor, 1)
+    assert index.get(cursor, 1) is first
+    assert first.total(date(2024, 1, 1), date(2026, 12, 31)) == sum(amount for _, _, amount in rows)
+
+    ledger.insert_expense(cursor, 1, date(2025, 5, 5), 'Food', 1234)
+    conn.commit()
+    second = index.get(cursor, 1)
+    assert second is not first
+    assert second.total(date(2025, 5, 5), date(2025, 5, 5), 'Food') == \
+        brute_total(rows, date(2025, 5, 5), date(2025, 5, 5), 'Food') + 1234
+    conn.close()
+
+
+def test_index_is_bounded_by_bytes(backend):
+    conn = backend.connect()
+    cursor = conn.cursor()
+    for user_id in (2, 3, 4):
+        cursor.execute("INSERT INTO users (id, username, password) VALUES (?, ?, '')", (user_id, f'u{user_id}'))
+        ledger.insert_expenses(cursor, user_id, random_rows(random.Random(user_id), 300))
+    conn.commit()
+
+    one_user = daily_index.PrefixIndex().get(cursor, 2).nbytes
+    index = daily_index.PrefixIndex(max_bytes=one_user * 2)
+    for user_id in (2, 3, 4):
+        index.get(cursor, user_id)
+    stats = index.stats()
+    assert stats['bytes'] <= one_user * 2
+    assert stats['evictions'] >= 1
+    conn.close()
+
+
+@pytest.mark.parametrize('day', [date(1899, 12, 31), date(2101, 1, 1), date(1, 1, 1)])
+def test_dates_outside_the_range_are_rejected(day):
+    with pytest.raises(ValueError):
+        analytics.check_expense_date(day)
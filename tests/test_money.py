@@ -0,0 +1,30 @@
+import pytest
+
+import money
+
+
+@pytest.mark.parametrize('text, fils', [
+    ('12.345', 12345),
+    ('0.0005', 1),      # half up
+    ('0.0004', 0),
+    ('-2.5', -2500),
+    (' 7 ', 7000),
+    ('1e3', 1000000),
+    ('1000000000000', money.MAX_FILS),
+    ('1e-999999999', 0),
+])
+def test_parse_amount(text, fils):
+    assert money.parse_amount(text) == fils
+
+
+@pytest.mark.parametrize('text', ['', 'abc', 'NaN', 'sNaN', 'Infinity', '-inf', '1e30', '-1e30',
+                                  '1000000000000.001', '1e999999999'])
+def test_parse_amount_rejects(text):
+    with pytest.raises(ValueError):
+        money.parse_amount(text)
+
+
+def test_format_fils():
+    assert money.format_fils(12345) == '12.345'
+    assert money.format_fils(-5) == '-0.005'
+    assert money.format_fils(money.MAX_FILS) == '1000000000000.000'
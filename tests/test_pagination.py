@@ -0,0 +1,54 @@
+from datetime import date, datetime
+
+import pagination
+
+
+def add(client, day, category, amount):
+    response = client.post('/add', data={'date': day, 'category': 'add_new', 'new_category': category,
+                                         'amount': amount})
+    assert response.status_code == 302
+
+
+def all_pages(client, query=''):
+    """Every expense from /api/expenses, following next_cursor, and the number of pages"""
+    expenses, pages, after = [], 0, None
+    while True:
+        url = '/api/expenses' + query + (('&' if query else '?') + f'after={after}' if after else '')
+        body = client.get(url).get_json()
+        expenses.extend(body['expenses'])
+        pages += 1
+        after = body['next_cursor']
+        if after is None:
+            return expenses, pages
+
+
+def test_cursor_round_trip():
+    assert pagination.decode_cursor(pagination.encode_cursor(date(2026, 3, 1), 42)) == (date(2026, 3, 1), 42)
+    for token in ['', 'junk', '2026-13-01_1', '2026-03-01_x', None]:
+        assert pagination.decode_cursor(token) is None
+
+
+def test_pages_cover_every_expense_once(expense_app, client, monkeypatch):
+    monkeypatch.setitem(expense_app.app.config, 'VIEW_PAGE_SIZE', 4)
+    # Several expenses share a date, so the id has to break ties
+    for n in range(11):
+        add(client, f'2026-01-{1 + n // 3:02d}', 'Food' if n % 2 else 'Rent', str(n + 1))
+
+    expenses, pages = all_pages(client)
+    assert pages == 3
+    assert sorted(e['amount'] for e in expenses) == sorted(f'{n + 1}.000' for n in range(11))
+    keys = [(datetime.strptime(e['date'], '%d-%m-%Y'), e['id']) for e in expenses]
+    assert keys == sorted(keys, reverse=True)
+
+    ascending, _ = all_pages(client, '?order=asc')
+    assert [e['id'] for e in ascending] == [e['id'] for e in reversed(expenses)]
+
+    food, _ = all_pages(client, '?category=Food&start_date=2026-01-02')
+    assert {e['category'] for e in food} == {'Food'}
+    assert len(food) == len([n for n in range(11) if n % 2 and n >= 3])
+
+
+def test_malformed_cursor_starts_over(client):
+    add(client, '2026-02-01', 'Food', '1')
+    body = client.get('/api/expenses?after=nonsense').get_json()
+    assert len(body['expenses']) == 1
@@ -0,0 +1,117 @@
+import threading
+from datetime import date
+
+import pytest
+
+import data_versions
+import ledger
+import pool
+import sharding
+
+
+@pytest.fixture
+def router(backend):
+    directory_pool = pool.ConnectionPool(backend.connect, size=4)
+    router = sharding.ShardRouter(backend, directory_pool, 4, lambda shard: shard.initialize(), cache_ttl=60)
+    yield router
+    router.close_all()
+    directory_pool.close_all()
+
+
+def expense_count(router, shard, user_id=1):
+    conn = router.backend(shard).connect()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM expenses WHERE user_id = ?", (user_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def add_expenses(router, count):
+    shard_pool = router.pool_for(1)
+    conn = shard_pool.acquire()
+    try:
+        ledger.insert_expenses(conn.cursor(), 1, [(date(2026, 1, 1), 'Food', 100)] * count)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        shard_pool.release(conn)
+
+
+@pytest.mark.parametrize('mode, shard, ok', [
+    (4, 'home', True),
+    (4, 'shard-3', True),
+    (4, 'shard-4', False),
+    (4, 'shard-01', False),
+    (4, 'shard--1', False),
+    (4, 'user-1', False),
+    (4, '../shard-1', False),
+    ('user', 'user-1', True),
+    ('user', 'user-2', False),
+    ('user', 'shard-1', False),
+])
+def test_check_target(mode, shard, ok):
+    if ok:
+        sharding.check_target(shard, mode, 1)
+    else:
+        with pytest.raises(ValueError):
+            sharding.check_target(shard, mode, 1)
+
+
+def test_new_users_are_placed_by_id(router):
+    assert router.shard_of(1) == 'shard-1'
+    add_expenses(router, 3)
+    assert expense_count(router, 'shard-1') == 3
+
+
+def test_move_user_takes_every_row(router):
+    add_expenses(router, 25)
+    assert router.move_user(1, 'shard-2') == 25
+    assert router.shard_of(1) == 'shard-2'
+    assert expense_count(router, 'shard-2') == 25
+    assert expense_count(router, 'shard-1') == 0
+    assert router.move_user(1, 'shard-2') == 0
+
+    assert router.move_user(1, 'home') == 25
+    assert expense_count(router, 'home') == 25
+    with pytest.raises(ValueError):
+        router.move_user(1, 'shard-9')
+
+
+def test_writes_to_the_old_shard_fail_after_a_move(router):
+    add_expenses(router, 1)
+    old_pool = router.pool_for(1)
+    router.move_user(1, 'shard-0')
+    conn = old_pool.acquire()
+    try:
+        with pytest.raises(data_versions.UserMoved):
+            ledger.insert_expense(conn.cursor(), 1, date(2026, 1, 2), 'Food', 100)
+        conn.rollback()
+    finally:
+        old_pool.release(conn)
+
+
+def test_moves_lose_no_concurrent_writes(router):
+    add_expenses(router, 1)
+    written = [1]
+    stop = threading.Event()
+
+    def writer():
+        while not stop.is_set():
+            try:
+                add_expenses(router, 1)
+            except data_versions.UserMoved:
+                router.forget(1)
+                continue
+            written[0] += 1
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    for target in ['shard-2', 'home', 'shard-3', 'shard-1']:
+        router.move_user(1, target)
+    stop.set()
+    thread.join()
+
+    assert router.shard_of(1) == 'shard-1'
+    assert expense_count(router, 'shard-1') == written[0]
@@ -0,0 +1,97 @@
+import threading
+from datetime import date
+
+import pytest
+
+import write_behind
+
+
+def count_expenses(backend):
+    conn = backend.connect()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM expenses WHERE user_id = 1").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_rows_are_committed_in_groups(backend):
+    commits = []
+    queue = write_behind.WriteBehindQueue(backend.connect, window=0.05,
+                                          on_commit=lambda user_id, rows, version: commits.append((rows, version)))
+    threads = [threading.Thread(target=queue.insert, args=(1, date(2026, 1, n + 1), 'Food', 100)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    queue.close()
+
+    assert count_expenses(backend) == 8
+    assert sum(len(rows) for rows, _ in commits) == 8
+    assert queue.stats()['batches'] < 8
+    versions = [version for _, version in commits]
+    assert versions == sorted(versions)
+
+
+def test_a_bad_row_does_not_fail_the_batch(backend):
+    queue = write_behind.WriteBehindQueue(backend.connect, window=0.05)
+    errors = []
+
+    def insert(user_id):
+        try:
+            queue.insert(user_id, date(2026, 1, 1), 'Food', 100)
+        except Exception as e:
+            errors.append(e)
+
+    # User 99 does not exist, so its row breaks the foreign key
+    threads = [threading.Thread(target=insert, args=(user_id,)) for user_id in (1, 99, 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    queue.insert(1, date(2026, 1, 2), 'Food', 100)
+    queue.close()
+
+    assert len(errors) == 1
+    assert count_expenses(backend) == 3
+
+
+def test_timed_out_rows_are_withdrawn(backend):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_connect():
+        started.set()
+        release.wait()
+        return backend.connect()
+
+    queue = write_behind.WriteBehindQueue(slow_connect, window=0, max_batch=1, timeout=0.2)
+    results = []
+
+    def insert(day):
+        try:
+            queue.insert(1, day, 'Food', 100)
+            results.append('stored')
+        except write_behind.WriteBehindBusy:
+            results.append('busy')
+        except write_behind.WriteBehindPending:
+            results.append('pending')
+
+    first = threading.Thread(target=insert, args=(date(2026, 1, 1),))
+    first.start()
+    started.wait()
+    # The writer is stuck opening its connection: the first row is in progress,
+    # the second is still queued and can be withdrawn
+    insert(date(2026, 1, 2))
+    first.join()
+    release.set()
+    queue.close()
+
+    assert sorted(results) == ['busy', 'pending']
+    assert count_expenses(backend) == 1
+    assert queue.stats()['cancelled'] == 1
+
+
+def test_closed_queue_rejects_rows(backend):
+    queue = write_behind.WriteBehindQueue(backend.connect)
+    queue.close()
+    with pytest.raises(write_behind.WriteBehindBusy):
+        queue.insert(1, date(2026, 1, 1), 'Food', 100)
@@ -0,0 +1,255 @@
+"""
+Group commit for expense inserts (opt-in, EXPENSE_WRITE_BEHIND=1).
+
+With synchronous writes every /add pays for its own transaction and commit,
+which is what limits automated clients posting many expenses. WriteBehindQueue
+instead hands each insert to a single writer thread. The writer collects
+inserts for up to `window` seconds or `max_batch` rows, writes them through
+ledger.insert_expenses (one executemany per user, rollups included) and
+commits them all at once.
+
+Each request still waits for its own acknowledgement: insert() returns only
+after the transaction holding its row has committed, so a redirect after
+/add means the expense is durable, exactly as before. A row not written
+within `timeout` is withdrawn (WriteBehindBusy, safe to retry) unless the
+writer has already started on it (WriteBehindPending: it may yet be stored). If a grouped commit
+fails, its rows are retried one transaction each so a single bad row cannot
+fail the others. Should the connection itself fail, the rows of that batch
+get the error, the connection is reopened and the writer carries on with the
+next batch. close() stops accepting rows and flushes whatever is queued.
+
+With sharding (see sharding.py) rows go to the database of their user: the
+writer keeps a connection per shard and commits each shard's part of a batch
+separately.
+"""
+
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, TimeoutError
+
+import data_versions
+import ledger
+
+
+class WriteBehindBusy(Exception):
+    """Raised when the queue is full, or a row was withdrawn after not being written in time"""
+
+
+class WriteBehindPending(Exception):
+    """Raised when a row was already being written when its wait ran out; it may yet be stored"""
+
+
+class WriteBehindQueue:
+    def __init__(self, connect, window=0.01, max_batch=100, max_pending=1000, timeout=30, on_commit=None,
+                 route=None, max_connections=16):
+        """
+        connect: opens the writer thread's own connection; connect(shard) with `route`
+        window: seconds the writer waits for more rows after the first one
+        max_batch: rows per transaction at most
+        max_pending: queued rows before insert() raises WriteBehindBusy
+        timeout: seconds insert() waits for its commit
+        on_commit: on_commit(user_id, rows, version) after each committed group of a
+                   user's rows, with the data version it committed at
+        route: route(user_id) names the shard a user's rows are written to
+        max_connections: shard connections the writer keeps open
+        """
+        self._connect = connect
+        self.route = route
+        self.max_connections = max_connections
+        self._conns = {}  # shard -> connection, least recently used first
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.on_commit = on_commit
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {'rows': 0, 'batches': 0, 'largest_batch': 0, 'retried': 0,
+                       'failed': 0, 'rejected': 0, 'cancelled': 0, 'commit_seconds': 0.0}
+
+    def _start(self):
+        # Caller holds the lock; the writer only starts once something is written
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def insert(self, user_id, expense_date, category, amount):
+        """Queue one expense and block until it has been committed"""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise WriteBehindBusy("write queue is closed")
+            self._start()
+        try:
+            self._queue.put_nowait((user_id, (expense_date, category, amount), future))
+        except queue.Full:
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise WriteBehindBusy("write queue is full")
+        try:
+            future.result(self.timeout)
+        except TimeoutError:
+            # Withdraw the row so a retry cannot store it twice; that only works
+            # while the writer has not picked it up
+            if future.cancel():
+                with self._lock:
+                    self._stats['cancelled'] += 1
+                raise WriteBehindBusy("write was not acknowledged in time")
+            try:
+                future.result(self.timeout)
+            except TimeoutError:
+                raise WriteBehindPending("write is still in progress")
+
+    def _collect(self):
+        """The next batch of queued items, or None once closed and drained"""
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Closing: finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        try:
+            while True:
+                batch = self._collect()
+                if batch is None:
+                    break
+                # Rows whose insert() gave up waiting are skipped; the rest can
+                # no longer be cancelled
+                batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+                if not batch:
+                    continue
+                if self.route is None:
+                    self._write_batch(None, batch)
+                    continue
+                by_shard = defaultdict(list)
+                for item in batch:
+                    try:
+                        by_shard[self.route(item[0])].append(item)
+                    except Exception as e:
+                        item[2].set_exception(e)
+                for shard, items in by_shard.items():
+                    self._write_batch(shard, items)
+        finally:
+            for conn in self._conns.values():
+                conn.close()
+
+    def _write_batch(self, shard, batch):
+        # Anything unexpected (a failed connect, commit or rollback) fails only
+        # this batch; its connection is dropped and reopened for the next one
+        try:
+            self._write(self._conn(shard), batch)
+        except Exception as e:
+            futures = [future for _, _, future in batch if not future.done()]
+            with self._lock:
+                self._stats['failed'] += len(futures)
+            for future in futures:
+                future.set_exception(e)
+            conn = self._conns.pop(shard, None)
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    def _conn(self, shard):
+        # Only the writer thread touches the connections
+        conn = self._conns.pop(shard, None)
+        if conn is None:
+            conn = self._connect(shard) if self.route is not None else self._connect()
+            if len(self._conns) >= self.max_connections:
+                self._conns.pop(next(iter(self._conns))).close()
+        self._conns[shard] = conn
+        return conn
+
+    def _write(self, conn, batch):
+        by_user = defaultdict(list)
+        for user_id, row, future in batch:
+            by_user[user_id].append((row, future))
+
+        start = time.perf_counter()
+        cursor = conn.cursor()
+        versions = {}
+        try:
+            for user_id, items in by_user.items():
+                ledger.insert_expenses(cursor, user_id, [row for row, _ in items])
+                versions[user_id] = data_versions.fetch(cursor, user_id)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            with self._lock:
+                self._stats['retried'] += 1
+            for user_id, items in by_user.items():
+                for row, future in items:
+                    self._write_one(conn, user_id, row, future)
+            return
+
+        with self._lock:
+            self._stats['rows'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+            self._stats['commit_seconds'] += time.perf_counter() - start
+        for user_id, items in by_user.items():
+            self._committed(user_id, [row for row, _ in items], versions[user_id])
+            for _, future in items:
+                future.set_result(True)
+
+    def _write_one(self, conn, user_id, row, future):
+        try:
+            cursor = conn.cursor()
+            ledger.insert_expenses(cursor, user_id, [row])
+            version = data_versions.fetch(cursor, user_id)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            with self._lock:
+                self._stats['failed'] += 1
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._stats['rows'] += 1
+            self._stats['batches'] += 1
+        self._committed(user_id, [row], version)
+        future.set_result(True)
+
+    def _committed(self, user_id, rows, version):
+        if self.on_commit is not None:
+            try:
+                self.on_commit(user_id, rows, version)
+            except Exception as e:
+                print(f"Write-behind commit callback failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = self._queue.qsize()
+            stats['window_ms'] = self.window * 1000
+            stats['max_batch'] = self.max_batch
+            stats['mean_batch'] = stats['rows'] / stats['batches'] if stats['batches'] else 0
+        return stats
+
+    def close(self):
+        """Stop accepting rows, commit everything already queued and stop the writer"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()